@@ -1,19 +1,77 @@
-from typing import Callable, Union, Optional, Tuple, List, Literal
+from typing import (
+    Callable,
+    Dict,
+    Union,
+    Optional,
+    Tuple,
+    List,
+    Literal,
+    NamedTuple,
+)
 from agent_dingo.agent.parser import parse
 from agent_dingo.agent.helpers import get_required_args, construct_json_repr
 from agent_dingo.agent.docgen import generate_docstring
 from agent_dingo.agent.function_descriptor import FunctionDescriptor
 from agent_dingo.core.blocks import BaseLLM, BaseAgent, Context, ChatPrompt, KVData
+from agent_dingo.core.blocks import _llm_kwargs, _bounded_gather
+from agent_dingo.core.executor import get_executor
+from agent_dingo.core.semaphore import ConcurrencyLimit
+from agent_dingo.core.state import Store
+from agent_dingo.core.tracing import optional_span
+from agent_dingo.core.loop import run_sync
 from agent_dingo.core.message import UserMessage
 from agent_dingo.agent.chat_context import ChatContext
 from agent_dingo.agent.registry import Registry as _Registry
+from agent_dingo.agent.tool_cache import ToolCache
+from agent_dingo.agent.tool_pools import ToolPools, get_tool_pools
+from agent_dingo.llm.cache import BaseCache
 import json
 import os
 import inspect
-from asyncio import run as asyncio_run, to_thread
+import asyncio
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from functools import partial
 import warnings
 
 
+class _ToolCall(NamedTuple):
+    id: str
+    name: str
+    f: Callable
+    args: dict
+    concurrent: bool
+    limit: Optional[ConcurrencyLimit]
+    cache: Optional[ToolCache]
+    timeout: Optional[float]
+    executor: Optional[str]
+
+    @property
+    def options(self) -> tuple:
+        """The execution options passed to `_call_function`."""
+        return self.limit, self.cache, self.timeout, self.executor
+
+
+_TIMEOUT_ERRORS = (FutureTimeoutError, asyncio.TimeoutError, TimeoutError)
+
+
+def _timeout_message(name: str, timeout: float) -> str:
+    # a structured error lets the model decide whether to retry or to proceed without the result
+    return json.dumps(
+        {
+            "error": "timeout",
+            "function": name,
+            "message": f"The function did not complete within {timeout} seconds.",
+        }
+    )
+
+
+def _get_wait_timeout(timeout: Optional[float], store: Store) -> Optional[float]:
+    if store.deadline is None:
+        return timeout
+    remaining = store.deadline.remaining()
+    return remaining if timeout is None else min(timeout, remaining)
+
+
 class Agent(BaseAgent):
 
     def __init__(
@@ -24,6 +82,8 @@ class Agent(BaseAgent):
         allow_codegen: Union[bool, Literal["env"]] = "env",
         name="agent",
         description: str = "A helpful agent",
+        parallel_tool_calls: bool = True,
+        max_concurrent_tool_calls: Optional[int] = None,
     ):
         """The agent that can be used to register functions and chat with the LLM.
 
@@ -41,6 +101,11 @@ class Agent(BaseAgent):
             name of the agent, by default "agent"
         description : str, optional
             description of the agent (needed when used as a sub-agent), by default "A helpful agent"
+        parallel_tool_calls : bool, optional
+            whether the function calls requested in a single response are executed concurrently, by default True;
+            the results are always appended in the order of the calls
+        max_concurrent_tool_calls : Optional[int], optional
+            maximum number of function calls of a single response executed at the same time, by default None (executor default)
         """
         if not isinstance(allow_codegen, bool) and allow_codegen != "env":
             raise ValueError(
@@ -57,6 +122,8 @@ class Agent(BaseAgent):
         self.before_function_call = before_function_call
         self.name = name
         self.description = description
+        self.parallel_tool_calls = parallel_tool_calls
+        self.max_concurrent_tool_calls = max_concurrent_tool_calls
         self._registered = False
 
     def _is_codegen_allowed(self) -> bool:
@@ -91,10 +158,22 @@ class Agent(BaseAgent):
             json_repr=descriptor.json_repr,
             requires_context=descriptor.requires_context,
             required_context_keys=descriptor.required_context_keys,
+            concurrent=descriptor.concurrent,
+            max_concurrency=descriptor.max_concurrency,
+            cache=descriptor.cache,
+            timeout=descriptor.timeout,
+            executor=descriptor.executor,
         )
 
     def register_function(
-        self, func: Callable, required_context_keys: Optional[List[str]] = None
+        self,
+        func: Callable,
+        required_context_keys: Optional[List[str]] = None,
+        concurrent: bool = True,
+        max_concurrency: Optional[int] = None,
+        cache: Optional[Union[Literal["run"], BaseCache]] = None,
+        timeout: Optional[float] = None,
+        executor: Optional[Literal["inline", "thread", "process"]] = None,
     ) -> None:
         """Registers a function with the agent.
 
@@ -102,6 +181,27 @@ class Agent(BaseAgent):
         ----------
         func : Callable
             The function to register.
+        required_context_keys : Optional[List[str]], optional
+            The keys that are required in the chat context, by default None.
+        concurrent : bool, optional
+            Whether the function can be executed concurrently with the other calls of the same response, by default True.
+            Functions with side effects should set it to False; they are executed after all the preceding calls complete
+            and before the following ones start.
+        max_concurrency : Optional[int], optional
+            The maximum number of concurrent executions of the function, by default None (unlimited).
+        cache : Optional[Union[Literal["run"], BaseCache]], optional
+            The cache of the results of a deterministic function, keyed by the canonicalized JSON arguments, by default None (no caching).
+            "run" caches the results for the duration of a single pipeline run;
+            a cache instance (e.g. `InMemoryCache(max_size, ttl)`) is shared by all the runs.
+        timeout : Optional[float], optional
+            The maximum execution time of a single call in seconds, by default None (no timeout).
+            A call that times out returns a JSON error message to the model; a sync function cannot be interrupted,
+            so it keeps running in its pool and occupies its max_concurrency slot until it completes.
+        executor : Optional[Literal["inline", "thread", "process"]], optional
+            Where the sync function is executed, by default None (inline in sync agents and in the tool thread pool in async agents,
+            or in the tool thread pool if a timeout is set). "inline" runs the function in the calling thread (on the event loop in async agents),
+            "thread" in the shared tool thread pool and "process" in the shared tool process pool,
+            which suits CPU-bound functions but requires a picklable (module-level) function and arguments.
 
         Raises
         ------
@@ -129,7 +229,16 @@ class Agent(BaseAgent):
             func.__name__, body["description"], body["properties"], required_args
         )
         self._registry.add(
-            func.__name__, func, json_repr, requires_context, required_context_keys
+            func.__name__,
+            func,
+            json_repr,
+            requires_context,
+            required_context_keys,
+            concurrent=concurrent,
+            max_concurrency=max_concurrency,
+            cache=cache,
+            timeout=timeout,
+            executor=executor,
         )
 
     def _call_from_agent(self, query: str, chat_context: ChatContext) -> str:
@@ -200,11 +309,9 @@ class Agent(BaseAgent):
             The function.
         """
 
-        def outer(required_context_keys):
+        def outer(**options):
             def register_decorator(func):
-                self.register_function(
-                    func, required_context_keys=required_context_keys
-                )
+                self.register_function(func, **options)
                 return func
 
             return register_decorator
@@ -214,12 +321,283 @@ class Agent(BaseAgent):
             self.register_function(func)
             return func
         else:
-            return outer(kwargs.get("required_context_keys", None))
+            return outer(
+                required_context_keys=kwargs.get("required_context_keys", None),
+                concurrent=kwargs.get("concurrent", True),
+                max_concurrency=kwargs.get("max_concurrency", None),
+                cache=kwargs.get("cache", None),
+                timeout=kwargs.get("timeout", None),
+                executor=kwargs.get("executor", None),
+            )
+
+    def get_tool_cache_stats(self) -> Dict[str, dict]:
+        """Returns the cache hits, misses and hit rate of the functions with a result cache.
+
+        Returns
+        -------
+        Dict[str, dict]
+            The cache statistics by function name.
+        """
+        return self._registry.get_cache_stats()
 
     def get_required_context_keys(self) -> List[str]:
         # this allows to handle the case where the user registers a function after registering the agent
         return self._registry.get_required_context_keys()
 
+    def _send_message(
+        self, messages: List[dict], functions: Optional[List], store: Store
+    ):
+        # the remaining time of the run is passed to the llm as a request timeout
+        kwargs = _llm_kwargs(store)
+        if store.tracer is None:
+            return self.model.send_message(
+                messages, functions=functions, usage_meter=store.usage_meter, **kwargs
+            )
+        with store.tracer.llm_span(
+            type(self.model).__name__, store.usage_meter
+        ) as usage_meter:
+            return self.model.send_message(
+                messages, functions=functions, usage_meter=usage_meter, **kwargs
+            )
+
+    async def _async_send_message(
+        self, messages: List[dict], functions: Optional[List], store: Store
+    ):
+        # the remaining time of the run is passed to the llm as a request timeout
+        kwargs = _llm_kwargs(store)
+        if store.tracer is None:
+            return await self.model.async_send_message(
+                messages, functions=functions, usage_meter=store.usage_meter, **kwargs
+            )
+        with store.tracer.llm_span(
+            type(self.model).__name__, store.usage_meter
+        ) as usage_meter:
+            return await self.model.async_send_message(
+                messages, functions=functions, usage_meter=usage_meter, **kwargs
+            )
+
+    def _call_function(
+        self,
+        name: str,
+        f: Callable,
+        args: dict,
+        store: Store,
+        pools: ToolPools,
+        limit: Optional[ConcurrencyLimit] = None,
+        cache: Optional[ToolCache] = None,
+        timeout: Optional[float] = None,
+        executor: Optional[str] = None,
+    ) -> str:
+        if store.deadline is not None:
+            store.deadline.check()
+        if cache is not None:
+            key = cache.get_key(args)
+            result = cache.get(key, store)
+            if result is not None:
+                return result
+        if limit is not None:
+            limit.acquire()
+        future = None
+        try:
+            with optional_span(store.tracer, name, "tool"):
+                try:
+                    if inspect.iscoroutinefunction(f):
+                        warnings.warn("Async function is called from a sync agent.")
+                        result = run_sync(
+                            asyncio.wait_for(f(**args), timeout), store.deadline
+                        )
+                    elif executor == "inline" or (executor is None and timeout is None):
+                        result = f(**args)
+                    else:
+                        future = pools.submit(executor or "thread", f, args)
+                        result = future.result(_get_wait_timeout(timeout, store))
+                except Exception as e:
+                    if isinstance(e, _TIMEOUT_ERRORS):
+                        # the deadline of the run takes precedence over the timeout of the function
+                        if store.deadline is not None:
+                            store.deadline.check()
+                        if timeout is not None:
+                            return _timeout_message(name, timeout)
+                    print(e)
+                    return "An error occurred while executing the function."
+        finally:
+            if limit is not None:
+                self._release_limit(limit, future)
+        if cache is not None:
+            cache.set(key, result, store)
+        return result
+
+    async def _async_call_function(
+        self,
+        name: str,
+        f: Callable,
+        args: dict,
+        store: Store,
+        pools: ToolPools,
+        limit: Optional[ConcurrencyLimit] = None,
+        cache: Optional[ToolCache] = None,
+        timeout: Optional[float] = None,
+        executor: Optional[str] = None,
+    ) -> str:
+        if store.deadline is not None:
+            store.deadline.check()
+        if cache is not None:
+            key = cache.get_key(args)
+            result = cache.get(key, store)
+            if result is not None:
+                return result
+        if limit is not None:
+            await limit.async_acquire()
+        future = None
+        try:
+            with optional_span(store.tracer, name, "tool"):
+                try:
+                    if inspect.iscoroutinefunction(f):
+                        result = await asyncio.wait_for(f(**args), timeout)
+                    elif executor == "inline":
+                        result = f(**args)
+                    else:
+                        warnings.warn("Sync function is called from an async agent.")
+                        # the shared bounded pool keeps slow functions from exhausting the default executor of the loop
+                        future = pools.submit(executor or "thread", f, args)
+                        result = await asyncio.wait_for(
+                            asyncio.wrap_future(future), timeout
+                        )
+                except Exception as e:
+                    if isinstance(e, _TIMEOUT_ERRORS):
+                        # the deadline of the run takes precedence over the timeout of the function
+                        if store.deadline is not None:
+                            store.deadline.check()
+                        if timeout is not None:
+                            return _timeout_message(name, timeout)
+                    print(e)
+                    return "An error occurred while executing the function."
+        finally:
+            if limit is not None:
+                self._release_limit(limit, future)
+        if cache is not None:
+            cache.set(key, result, store)
+        return result
+
+    @staticmethod
+    def _release_limit(limit: ConcurrencyLimit, future: Optional[Future]) -> None:
+        if future is not None and not future.done():
+            # a timed out function keeps running, so its slot is released only once it completes
+            future.add_done_callback(lambda _: limit.release())
+        else:
+            limit.release()
+
+    def _prepare_calls(
+        self, tool_calls: List[dict], chat_context: ChatContext
+    ) -> List[_ToolCall]:
+        calls = []
+        for function in tool_calls:
+            function_name = function["function"]["name"]
+            function_args = json.loads(function["function"]["arguments"])
+            f, requires_context = self._registry.get_function(function_name)
+            if requires_context:
+                function_args["chat_context"] = chat_context
+            if self.before_function_call:
+                f, function_args = self.before_function_call(
+                    function_name, f, function_args
+                )
+            calls.append(
+                _ToolCall(
+                    function["id"],
+                    function_name,
+                    f,
+                    function_args,
+                    *self._registry.get_call_options(function_name),
+                )
+            )
+        return calls
+
+    def _get_batches(self, calls: List[_ToolCall]) -> List[List[_ToolCall]]:
+        # consecutive concurrent calls are executed together, the other calls are executed alone in their original position
+        batches = []
+        for call in calls:
+            if (
+                self.parallel_tool_calls
+                and call.concurrent
+                and batches
+                and batches[-1][-1].concurrent
+            ):
+                batches[-1].append(call)
+            else:
+                batches.append([call])
+        return batches
+
+    def _call_functions(self, calls: List[_ToolCall], store: Store) -> List[str]:
+        results = []
+        # the turn keeps using its pools even if they are replaced in the meantime
+        with get_tool_pools().running() as pools:
+            for batch in self._get_batches(calls):
+                if len(batch) == 1:
+                    call = batch[0]
+                    results.append(
+                        self._call_function(
+                            call.name, call.f, call.args, store, pools, *call.options
+                        )
+                    )
+                    continue
+                results.extend(
+                    get_executor().run_all(
+                        [
+                            partial(
+                                self._call_function,
+                                call.name,
+                                call.f,
+                                call.args,
+                                store,
+                                pools,
+                                *call.options,
+                            )
+                            for call in batch
+                        ],
+                        max_concurrency=self.max_concurrent_tool_calls,
+                        deadline=store.deadline,
+                    )
+                )
+        return results
+
+    async def _async_call_functions(
+        self, calls: List[_ToolCall], store: Store
+    ) -> List[str]:
+        results = []
+        # the turn keeps using its pools even if they are replaced in the meantime
+        with get_tool_pools().running() as pools:
+            for batch in self._get_batches(calls):
+                results.extend(
+                    await _bounded_gather(
+                        [
+                            self._async_call_function(
+                                call.name,
+                                call.f,
+                                call.args,
+                                store,
+                                pools,
+                                *call.options,
+                            )
+                            for call in batch
+                        ],
+                        self.max_concurrent_tool_calls,
+                    )
+                )
+        return results
+
+    @staticmethod
+    def _append_results(
+        messages: List[dict], calls: List[_ToolCall], results: List[str]
+    ) -> None:
+        for call, result in zip(calls, results):
+            messages.append(
+                {
+                    "role": "tool",
+                    "tool_call_id": call.id,
+                    "content": result,
+                }
+            )
+
     def forward(
         self, state: ChatPrompt, context: Context, store: KVData
     ) -> Tuple[str, List[dict]]:
@@ -244,40 +622,13 @@ class Agent(BaseAgent):
             available_functions_i = (
                 available_functions if n_calls < self.max_function_calls else None
             )
-            response = self.model.send_message(
-                messages,
-                functions=available_functions_i,
-                usage_meter=store.usage_meter,
-            )
+            response = self._send_message(messages, available_functions_i, store)
             if response.get("tool_calls"):
                 messages.append(response)
-                for function in response["tool_calls"]:
-                    function_name = function["function"]["name"]
-                    function_args = json.loads(function["function"]["arguments"])
-                    f, requires_context = self._registry.get_function(function_name)
-                    if requires_context:
-                        function_args["chat_context"] = chat_context
-                    if self.before_function_call:
-                        f, function_args = self.before_function_call(
-                            function_name, f, function_args
-                        )
-                    try:
-                        if inspect.iscoroutinefunction(f):
-                            warnings.warn("Async function is called from a sync agent.")
-                            result = asyncio_run(f(**function_args))
-                        else:
-                            result = f(**function_args)
-                    except Exception as e:
-                        print(e)
-                        result = "An error occurred while executing the function."
-                    messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": function["id"],
-                            "content": result,
-                        }
-                    )
-                    n_calls += 1
+                calls = self._prepare_calls(response["tool_calls"], chat_context)
+                results = self._call_functions(calls, store)
+                self._append_results(messages, calls, results)
+                n_calls += len(calls)
             else:
                 messages.append(response)
                 return KVData(_out_0=response["content"])
@@ -306,42 +657,15 @@ class Agent(BaseAgent):
             available_functions_i = (
                 available_functions if n_calls < self.max_function_calls else None
             )
-            response = await self.model.async_send_message(
-                messages,
-                functions=available_functions_i,
-                usage_meter=store.usage_meter,
+            response = await self._async_send_message(
+                messages, available_functions_i, store
             )
             if response.get("tool_calls"):
                 messages.append(response)
-                for function in response["tool_calls"]:
-                    function_name = function["function"]["name"]
-                    function_args = json.loads(function["function"]["arguments"])
-                    f, requires_context = self._registry.get_function(function_name)
-                    if requires_context:
-                        function_args["chat_context"] = chat_context
-                    if self.before_function_call:
-                        f, function_args = self.before_function_call(
-                            function_name, f, function_args
-                        )
-                    try:
-                        if inspect.iscoroutinefunction(f):
-                            result = await f(**function_args)
-                        else:
-                            warnings.warn(
-                                "Sync function is called from an async agent."
-                            )
-                            result = await to_thread(f, **function_args)
-                    except Exception as e:
-                        print(e)
-                        result = "An error occurred while executing the function."
-                    messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": function["id"],
-                            "content": result,
-                        }
-                    )
-                    n_calls += 1
+                calls = self._prepare_calls(response["tool_calls"], chat_context)
+                results = await self._async_call_functions(calls, store)
+                self._append_results(messages, calls, results)
+                n_calls += len(calls)
             else:
                 messages.append(response)
                 return KVData(_out_0=response["content"])
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Callable, Optional, List
+from typing import Callable, Optional, List, Union
+from agent_dingo.llm.cache import BaseCache
 
 
 @dataclass
@@ -9,3 +10,8 @@ class FunctionDescriptor:
     json_repr: dict
     requires_context: bool
     required_context_keys: Optional[List[str]] = None
+    concurrent: bool = True
+    max_concurrency: Optional[int] = None
+    cache: Optional[Union[str, BaseCache]] = None
+    timeout: Optional[float] = None
+    executor: Optional[str] = None
@@ -1,4 +1,9 @@
-from typing import Callable, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from agent_dingo.core.semaphore import ConcurrencyLimit
+from agent_dingo.agent.tool_cache import ToolCache
+from agent_dingo.agent.tool_pools import EXECUTION_TARGETS
+from agent_dingo.llm.cache import BaseCache
+import inspect
 
 
 class Registry:
@@ -15,6 +20,11 @@ class Registry:
         json_repr: dict,
         requires_context: bool,
         required_context_keys: Optional[List[str]] = None,
+        concurrent: bool = True,
+        max_concurrency: Optional[int] = None,
+        cache: Optional[Union[str, BaseCache]] = None,
+        timeout: Optional[float] = None,
+        executor: Optional[str] = None,
     ) -> None:
         """Adds a function to the registry.
 
@@ -28,16 +38,55 @@ class Registry:
             The JSON representation of the function to be provided to the LLM.
         requires_context : bool
             Indicates whether the function requires a ChatContext object as one of its arguments.
+        required_context_keys : Optional[List[str]], optional
+            The keys that are required in the ChatContext object, by default None.
+        concurrent : bool, optional
+            Indicates whether the function can be executed concurrently with the other calls of the same turn, by default True.
+        max_concurrency : Optional[int], optional
+            The maximum number of concurrent executions of the function, by default None (unlimited).
+        cache : Optional[Union[str, BaseCache]], optional
+            The cache policy of the function results: None (no caching), "run" (per pipeline run) or a cache shared by all the runs, by default None.
+        timeout : Optional[float], optional
+            The maximum execution time of a single call in seconds, by default None (no timeout).
+        executor : Optional[str], optional
+            Where the sync function is executed: "inline" (the calling thread), "thread" (the shared tool thread pool) or "process" (the shared tool process pool),
+            by default None (inline in sync agents and the tool thread pool in async agents, or the thread pool if a timeout is set).
         """
         if requires_context and required_context_keys is None:
             raise ValueError(
                 "If requires_context is True, required_context_keys must be provided"
             )
+        if requires_context and cache is not None and cache != "run":
+            raise ValueError(
+                "The results of the functions that require the chat context can only be cached per run"
+            )
+        if executor is not None and executor not in EXECUTION_TARGETS:
+            raise ValueError(f"executor must be one of {EXECUTION_TARGETS}")
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be a positive number")
+        is_async = inspect.iscoroutinefunction(func)
+        if executor == "process" and (requires_context or is_async):
+            raise ValueError(
+                "Only sync functions that do not require the chat context can be executed in a process pool"
+            )
+        if executor == "inline" and timeout is not None and not is_async:
+            raise ValueError(
+                "A timeout cannot be enforced for sync functions executed inline"
+            )
         self.__functions[name] = {
             "func": func,
             "json_repr": json_repr,
             "requires_context": requires_context,
             "required_context_keys": required_context_keys or [],
+            "concurrent": concurrent,
+            "limit": (
+                ConcurrencyLimit(max_concurrency)
+                if max_concurrency is not None
+                else None
+            ),
+            "cache": ToolCache(name, cache) if cache is not None else None,
+            "timeout": timeout,
+            "executor": executor,
         }
 
     def get_function(self, name: str) -> Tuple[Callable, bool]:
@@ -66,6 +115,45 @@ class Registry:
                 False,
             )
 
+    def get_call_options(self, name: str) -> Tuple[
+        bool,
+        Optional[ConcurrencyLimit],
+        Optional[ToolCache],
+        Optional[float],
+        Optional[str],
+    ]:
+        """Retrieves the execution options of a function.
+
+        Parameters
+        ----------
+        name : str
+            The name of the function.
+
+        Returns
+        -------
+        Tuple[bool, Optional[ConcurrencyLimit], Optional[ToolCache], Optional[float], Optional[str]]
+            A tuple containing a boolean indicating whether the function can be executed concurrently with other functions,
+            its concurrency limit, its result cache, its timeout and its executor (if any).
+        """
+        if name not in self.__functions:
+            return True, None, None, None, None
+        f = self.__functions[name]
+        return f["concurrent"], f["limit"], f["cache"], f["timeout"], f["executor"]
+
+    def get_cache_stats(self) -> Dict[str, dict]:
+        """Returns the cache hits and misses of the functions with a result cache.
+
+        Returns
+        -------
+        Dict[str, dict]
+            The cache statistics by function name.
+        """
+        return {
+            name: f["cache"].get_stats()
+            for name, f in self.__functions.items()
+            if f["cache"] is not None
+        }
+
     def get_available_functions(self) -> List[dict]:
         """Returns a list of JSON representations of the functions in the registry.
 
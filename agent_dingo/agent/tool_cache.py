@@ -0,0 +1,80 @@
+from typing import Any, Optional, Union
+from threading import Lock
+from agent_dingo.core.state import Store
+from agent_dingo.llm.cache import BaseCache
+import hashlib
+import json
+
+
+class ToolCache:
+    def __init__(self, name: str, policy: Union[str, BaseCache]):
+        """
+        Memoizes the results of a deterministic function by its canonicalized JSON arguments.
+
+        Parameters
+        ----------
+        name : str
+            name of the function
+        policy : Union[str, BaseCache]
+            "run" to cache the results for the duration of a single pipeline run (in the store),
+            or a cache shared by all the runs (e.g. `InMemoryCache(max_size, ttl)` for an LRU cache with a TTL)
+        """
+        if policy != "run" and not isinstance(policy, BaseCache):
+            raise ValueError('cache must be either "run" or a BaseCache instance')
+        self.name = name
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self._store_key = f"_tool_cache:{name}:{id(self)}"
+        self._lock = Lock()
+
+    @property
+    def is_per_run(self) -> bool:
+        return self.policy == "run"
+
+    def get_key(self, args: dict) -> str:
+        # the chat context is not a part of the arguments generated by the model
+        args = {k: v for k, v in args.items() if k != "chat_context"}
+        data = json.dumps(
+            args, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+        )
+        return f"tool:{self.name}:" + hashlib.sha256(data.encode()).hexdigest()
+
+    def _get_run_cache(self, store: Store) -> dict:
+        with self._lock:
+            try:
+                return store.get_misc(self._store_key)
+            except KeyError:
+                cache = {}
+                store.update(self._store_key, cache)
+                return cache
+
+    def get(self, key: str, store: Store) -> Optional[Any]:
+        """Returns the cached result or None and updates the hit/miss counters."""
+        if self.is_per_run:
+            value = self._get_run_cache(store).get(key)
+        else:
+            value = self.policy.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, store: Store) -> None:
+        if value is None:
+            return
+        if self.is_per_run:
+            self._get_run_cache(store)[key] = value
+        else:
+            self.policy.set(key, value)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,152 @@
+from typing import Callable, Iterator, Optional
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import copy_context
+from threading import Lock
+import atexit
+import os
+
+EXECUTION_TARGETS = ("inline", "thread", "process")
+
+_DEFAULT_MAX_THREADS = int(os.environ.get("DINGO_TOOL_THREADS", 16))
+_DEFAULT_MAX_PROCESSES = int(
+    os.environ.get("DINGO_TOOL_PROCESSES", min(os.cpu_count() or 1, 4))
+)
+
+
+class ToolPools:
+    def __init__(
+        self,
+        max_threads: int = _DEFAULT_MAX_THREADS,
+        max_processes: int = _DEFAULT_MAX_PROCESSES,
+    ):
+        """
+        Bounded pools shared by all the agents to execute the functions outside of the agent loop.
+        The pools are created on first use.
+
+        Parameters
+        ----------
+        max_threads : int, optional
+            maximum number of threads for I/O-bound functions, by default 16 (can be overridden with the DINGO_TOOL_THREADS environment variable)
+        max_processes : int, optional
+            maximum number of processes for CPU-bound functions, by default min(cpu count, 4) (can be overridden with the DINGO_TOOL_PROCESSES environment variable)
+        """
+        if max_threads < 1 or max_processes < 1:
+            raise ValueError("max_threads and max_processes must be positive integers")
+        self.max_threads = max_threads
+        self.max_processes = max_processes
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+        self._callers = 0
+        self._is_retired = False
+        self._is_shutdown = False
+
+    @contextmanager
+    def running(self) -> Iterator["ToolPools"]:
+        """Marks a caller (e.g. an agent turn) that submits functions. If the pools are retired, they are shut down once all the callers exit."""
+        with self._lock:
+            if self._is_shutdown:
+                raise RuntimeError("Cannot submit functions after the pools shutdown.")
+            self._callers += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._callers -= 1
+                drained = self._is_retired and self._callers == 0
+            if drained:
+                self.shutdown(wait=False)
+
+    def get_pool(self, target: str) -> Executor:
+        """Returns the pool of the execution target ("thread" or "process")."""
+        with self._lock:
+            if self._is_shutdown:
+                raise RuntimeError("Cannot submit functions after the pools shutdown.")
+            if target == "thread":
+                if self._threads is None:
+                    self._threads = ThreadPoolExecutor(
+                        max_workers=self.max_threads, thread_name_prefix="dingo-tool"
+                    )
+                return self._threads
+            if target == "process":
+                if self._processes is None:
+                    self._processes = ProcessPoolExecutor(
+                        max_workers=self.max_processes
+                    )
+                return self._processes
+        raise ValueError(f"Unknown execution target {target}")
+
+    def submit(self, target: str, f: Callable, args: dict) -> Future:
+        if target == "thread":
+            # the context (e.g. the nesting of the background loop) is propagated to the thread
+            return self.get_pool(target).submit(copy_context().run, f, **args)
+        return self.get_pool(target).submit(f, **args)
+
+    def retire(self) -> None:
+        """Shuts down the pools once the running callers exit. Until then, they can still submit functions."""
+        with self._lock:
+            self._is_retired = True
+            drained = self._callers == 0
+        if drained:
+            self.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            self._is_shutdown = True
+            pools = [p for p in (self._threads, self._processes) if p is not None]
+        for pool in pools:
+            pool.shutdown(wait=wait)
+
+
+_tool_pools: Optional[ToolPools] = None
+_tool_pools_lock = Lock()
+
+
+def get_tool_pools() -> ToolPools:
+    """Returns the process-wide tool pools, creating them with the default configuration if needed."""
+    global _tool_pools
+    with _tool_pools_lock:
+        if _tool_pools is None:
+            _tool_pools = ToolPools()
+        return _tool_pools
+
+
+def configure_tool_pools(
+    max_threads: int = _DEFAULT_MAX_THREADS,
+    max_processes: int = _DEFAULT_MAX_PROCESSES,
+) -> ToolPools:
+    """Replaces the process-wide tool pools. The previous pools (if any) are shut down once the agent turns running on them complete.
+
+    Parameters
+    ----------
+    max_threads : int, optional
+        maximum number of threads, by default 16
+    max_processes : int, optional
+        maximum number of processes, by default min(cpu count, 4)
+
+    Returns
+    -------
+    ToolPools
+        the new pools
+    """
+    global _tool_pools
+    with _tool_pools_lock:
+        previous = _tool_pools
+        _tool_pools = ToolPools(max_threads=max_threads, max_processes=max_processes)
+    if previous is not None:
+        previous.retire()
+    return _tool_pools
+
+
+def shutdown_tool_pools(wait: bool = True) -> None:
+    """Shuts down the process-wide tool pools. New ones are created on the next use."""
+    global _tool_pools
+    with _tool_pools_lock:
+        previous = _tool_pools
+        _tool_pools = None
+    if previous is not None:
+        previous.shutdown(wait=wait)
+
+
+atexit.register(shutdown_tool_pools)
@@ -0,0 +1,124 @@
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import asyncio
+
+BatchInput = Tuple[Optional[Any], Dict[str, str]]
+
+
+@dataclass
+class BatchItemResult:
+    index: int
+    output: Optional[str]
+    usage: dict
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _check_concurrency(max_concurrency: int) -> None:
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be a positive integer")
+
+
+def _reorder(
+    results: Iterable[BatchItemResult], ordered: bool, buffer: dict, state: list
+):
+    # yields the results either as they come or in the input order
+    for result in results:
+        if not ordered:
+            yield result
+            continue
+        buffer[result.index] = result
+        while state[0] in buffer:
+            yield buffer.pop(state[0])
+            state[0] += 1
+
+
+def iter_batch(
+    run_item: Callable[[int, BatchInput], BatchItemResult],
+    inputs: Iterable[BatchInput],
+    max_concurrency: int,
+    ordered: bool,
+) -> Iterator[BatchItemResult]:
+    """Runs `run_item` over the inputs in a bounded thread pool and yields the results.
+
+    Parameters
+    ----------
+    run_item : Callable[[int, BatchInput], BatchItemResult]
+        function that processes a single (index, input) pair
+    inputs : Iterable[BatchInput]
+        inputs to process; consumed lazily
+    max_concurrency : int
+        maximum number of items processed at the same time
+    ordered : bool
+        whether to yield the results in the input order (otherwise in the completion order)
+    """
+    _check_concurrency(max_concurrency)
+    items = enumerate(inputs)
+    buffer, state = {}, [0]
+    with ThreadPoolExecutor(
+        max_workers=max_concurrency, thread_name_prefix="dingo-batch"
+    ) as pool:
+        futures = {}
+
+        def fill():
+            for index, item in items:
+                futures[pool.submit(run_item, index, item)] = index
+                if len(futures) >= max_concurrency:
+                    break
+
+        try:
+            fill()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for f in done:
+                    del futures[f]
+                fill()
+                yield from _reorder([f.result() for f in done], ordered, buffer, state)
+        finally:
+            for f in futures:
+                f.cancel()
+
+
+async def async_iter_batch(
+    run_item: Callable[[int, BatchInput], Awaitable[BatchItemResult]],
+    inputs: Iterable[BatchInput],
+    max_concurrency: int,
+    ordered: bool,
+) -> AsyncIterator[BatchItemResult]:
+    """Async counterpart of `iter_batch` that runs the items as tasks in the current event loop."""
+    _check_concurrency(max_concurrency)
+    items = enumerate(inputs)
+    buffer, state = {}, [0]
+    tasks = set()
+
+    def fill():
+        for index, item in items:
+            tasks.add(asyncio.ensure_future(run_item(index, item)))
+            if len(tasks) >= max_concurrency:
+                break
+
+    try:
+        fill()
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            tasks.difference_update(done)
+            fill()
+            for result in _reorder([t.result() for t in done], ordered, buffer, state):
+                yield result
+    finally:
+        for t in tasks:
+            t.cancel()
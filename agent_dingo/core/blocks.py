@@ -1,13 +1,43 @@
 from __future__ import annotations
-from typing import Any, Coroutine, Optional, Union, List, Dict
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Hashable,
+    Iterable,
+    Iterator,
+    Optional,
+    Union,
+    List,
+    Dict,
+    TYPE_CHECKING,
+)
 from abc import ABC, abstractmethod
 from agent_dingo.core.message import Message
 from agent_dingo.core.state import State, ChatPrompt, KVData, Context, Store, UsageMeter
 from agent_dingo.core.output_parser import BaseOutputParser, DefaultOutputParser
-import re
-import joblib
+from agent_dingo.core.executor import get_executor
+from agent_dingo.core.loop import run_sync
+from agent_dingo.core.tracing import Tracer
+from agent_dingo.core.template import CompiledTemplate
+from agent_dingo.core.deadline import Deadline, DeadlineExceededError, remaining_time
+from agent_dingo.core.checkpoint import BaseCheckpointer, CheckpointSession
+from agent_dingo.core.batch import (
+    BatchInput,
+    BatchItemResult,
+    iter_batch,
+    async_iter_batch,
+)
 import inspect
+import hashlib
+import json
+from functools import partial
 import warnings
+from threading import Lock
+
+if TYPE_CHECKING:
+    from agent_dingo.llm.cache import BaseCache
 
 
 import os
@@ -19,11 +49,104 @@ if os.environ.get("DINGO_ALLOW_NESTED_ASYNCIO", False):
 
 from asyncio import (
     to_thread,
+    ensure_future,
+    wait,
+    FIRST_COMPLETED,
     gather,
-    run as asyncio_run,
+    wait_for,
+    Semaphore,
+    TimeoutError as AsyncioTimeoutError,
 )
 
 
+async def _bounded_gather(coros, limit: Optional[int] = None):
+    if limit is None:
+        return await gather(*coros)
+    semaphore = Semaphore(limit)
+
+    async def _run(coro):
+        async with semaphore:
+            return await coro
+
+    return await gather(*[_run(c) for c in coros])
+
+
+class _RaisedTimeout(Exception):
+    """Carries a timeout raised by the awaited coroutine itself, so it is not mistaken for the expiration of the deadline."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def _wrap_timeouts(coro):
+    try:
+        return await coro
+    except AsyncioTimeoutError as e:
+        raise _RaisedTimeout(e) from None
+
+
+async def _wait_for_deadline(coro, deadline: Optional[Deadline]):
+    # cancels the coroutine (and all its child tasks) once the deadline passes
+    if deadline is None:
+        return await coro
+    try:
+        return await wait_for(_wrap_timeouts(coro), timeout=remaining_time(deadline))
+    except _RaisedTimeout as e:
+        raise e.error
+    except AsyncioTimeoutError as e:
+        raise DeadlineExceededError(
+            f"The run did not complete within {deadline.timeout} seconds."
+        ) from e
+
+
+async def _stream_until_deadline(
+    chunks: AsyncIterator[str], deadline: Optional[Deadline]
+) -> AsyncIterator[str]:
+    # the deadline also bounds the wait for each chunk, so a stalled stream fails instead of hanging
+    if deadline is None:
+        async for chunk in chunks:
+            yield chunk
+        return
+    try:
+        while True:
+            try:
+                chunk = await _wait_for_deadline(chunks.__anext__(), deadline)
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        await chunks.aclose()
+
+
+def _llm_kwargs(store: Store) -> dict:
+    # per-call timeout derived from the remaining time of the run
+    timeout = remaining_time(store.deadline)
+    return {} if timeout is None else {"timeout": timeout}
+
+
+def _forward_block(
+    block: Block, state: Optional[State], context: Context, store: Store
+) -> State:
+    if store.deadline is not None:
+        store.deadline.check()
+    # the tracer check is the only overhead when tracing is disabled
+    if store.tracer is None:
+        return block.forward(state=state, context=context, store=store)
+    with store.tracer.span(type(block).__name__, "block"):
+        return block.forward(state=state, context=context, store=store)
+
+
+async def _async_forward_block(
+    block: Block, state: Optional[State], context: Context, store: Store
+) -> State:
+    if store.deadline is not None:
+        store.deadline.check()
+    if store.tracer is None:
+        return await block.async_forward(state=state, context=context, store=store)
+    with store.tracer.span(type(block).__name__, "block"):
+        return await block.async_forward(state=state, context=context, store=store)
+
+
 class Block(ABC):
     """Base building block of a pipeline"""
 
@@ -92,16 +215,36 @@ class BaseLLM(BaseReasoner):
     def forward(self, state: ChatPrompt, context: Context, store: Store) -> KVData:
         if not isinstance(state, ChatPrompt):
             raise TypeError(f"State must be a ChatPrompt, got {type(state)}")
+        kwargs = _llm_kwargs(store)
+        if store.tracer is not None:
+            with store.tracer.llm_span(
+                type(self).__name__, store.usage_meter
+            ) as usage_meter:
+                return KVData(
+                    _out_0=self.process_prompt(state, usage_meter=usage_meter, **kwargs)
+                )
         new_state = KVData(
-            _out_0=self.process_prompt(state, usage_meter=store.usage_meter)
+            _out_0=self.process_prompt(state, usage_meter=store.usage_meter, **kwargs)
         )
         return new_state
 
     async def async_forward(self, state: State | None, context: Context, store: Store):
         if not isinstance(state, ChatPrompt):
             raise TypeError(f"State must be a ChatPrompt, got {type(state)}")
+        kwargs = _llm_kwargs(store)
+        if store.tracer is not None:
+            with store.tracer.llm_span(
+                type(self).__name__, store.usage_meter
+            ) as usage_meter:
+                return KVData(
+                    _out_0=await self.async_process_prompt(
+                        state, usage_meter=usage_meter, **kwargs
+                    )
+                )
         new_state = KVData(
-            _out_0=await self.async_process_prompt(state, usage_meter=store.usage_meter)
+            _out_0=await self.async_process_prompt(
+                state, usage_meter=store.usage_meter, **kwargs
+            )
         )
         return new_state
 
@@ -114,14 +257,40 @@ class BaseLLM(BaseReasoner):
     def process_prompt(
         self, prompt: ChatPrompt, usage_meter: Optional[UsageMeter] = None, **kwargs
     ):
-        return self.send_message(prompt.dict, None, usage_meter)["content"]
+        return self.send_message(prompt.dict, None, usage_meter, **kwargs)["content"]
 
     async def async_process_prompt(
         self, prompt: ChatPrompt, usage_meter: Optional[UsageMeter] = None, **kwargs
     ):
-        return (await self.async_send_message(prompt.dict, None, usage_meter))[
-            "content"
-        ]
+        return (
+            await self.async_send_message(prompt.dict, None, usage_meter, **kwargs)
+        )["content"]
+
+    async def async_stream_message(
+        self, messages, usage_meter: UsageMeter = None, **kwargs
+    ) -> AsyncIterator[str]:
+        """Sends messages to the LLM and yields the content of the response as it is generated.
+        LLMs that do not support streaming return the whole response as a single chunk.
+
+        Parameters
+        ----------
+        messages : list
+            messages to send
+        usage_meter : UsageMeter, optional
+            usage meter to update once the response is complete, by default None
+
+        Yields
+        ------
+        str
+            content delta
+        """
+        response = await self.async_send_message(messages, None, usage_meter, **kwargs)
+        yield response["content"]
+
+    def async_stream_prompt(
+        self, prompt: ChatPrompt, usage_meter: Optional[UsageMeter] = None, **kwargs
+    ) -> AsyncIterator[str]:
+        return self.async_stream_message(prompt.dict, usage_meter, **kwargs)
 
 
 class BaseAgent(BaseReasoner):
@@ -226,38 +395,50 @@ class PromptBuilder(BasePromptBuilder):
                 f"from_store must be a list or dict, got {type(from_store)}"
             )
 
-        self._placeholder_names = self._get_placeholder_names()
+        # the templates are compiled once; static messages are built upfront
+        self._compiled = []
+        self._placeholder_names = set()
+        for m in self.messages:
+            template = CompiledTemplate(m.content)
+            self._placeholder_names.update(template.names)
+            if template.is_static:
+                self._compiled.append((type(m)(template.render({})), None, None))
+            else:
+                self._compiled.append((None, type(m), template))
+        self._accessors = [
+            (n, self._get_accessor(n)) for n in sorted(self._placeholder_names)
+        ]
+
+    def _get_accessor(self, name: str) -> Callable[[KVData, Context, Store], Any]:
+        if name in self._from_state.keys():
+            key = self._from_state[name]
+            return lambda state, context, store: state[key]
+        if name in self._from_store.keys():
+            keys = self._from_store[name].split(".")
+            if len(keys) != 2:
+                raise ValueError(
+                    "Store key must be formatted as <outer_key>.<inner_key>"
+                )
+            outer, inner = keys
 
-    def _get_placeholder_names(self) -> set:
-        placeholder_pattern = r"\{(\w+)\}"
-        placeholder_names = set()
+            return lambda state, context, store: store.get_data(outer)[inner]
 
-        for message in self.messages:
-            found_placeholders = re.findall(placeholder_pattern, message.content)
-            placeholder_names.update(found_placeholders)
+        def from_context(state, context, store):
+            try:
+                return context[name]
+            except KeyError:
+                raise KeyError(f"Could not find value for placeholder {name}") from None
 
-        return placeholder_names
+        return from_context
 
     def forward(
         self, state: Optional[KVData], context: Context, store: Store
     ) -> ChatPrompt:
-        values = {}
-        for n in self._placeholder_names:
-            if n in self._from_state.keys():
-                values[n] = state[self._from_state[n]]
-            elif n in self._from_store.keys():
-                if "." in self._from_store[n]:
-                    outer, inner = self._from_store[n].split(".")
-                    values[n] = store.get_data(outer)[inner]
-                else:
-                    raise ValueError(
-                        "Store key must be formatted as <outer_key>.<inner_key>"
-                    )
-            elif n in context.keys():
-                values[n] = context[n]
-            else:
-                raise KeyError(f"Could not find value for placeholder {n}")
-        updated_messages = [type(m)(m.content.format(**values)) for m in self.messages]
+        values = {n: get(state, context, store) for n, get in self._accessors}
+        updated_messages = [
+            message if template is None else cls(template.render(values))
+            for message, cls, template in self._compiled
+        ]
         return ChatPrompt(updated_messages)
 
     async def async_forward(self, state: KVData, context: Context, store: Store):
@@ -313,24 +494,115 @@ class Pipeline(Block):
         self._blocks.append(block)
 
     def forward(self, state: Optional[State], context: Context, store: Store) -> State:
+        session = store.checkpoint
+        if session is not None and session.pipeline is self:
+            return self._checkpointed_forward(state, context, store, session)
         running_state = state
         for block in self._blocks:
-            running_state = block.forward(
-                state=running_state, context=context, store=store
-            )
+            running_state = _forward_block(block, running_state, context, store)
         return running_state
 
     async def async_forward(
         self, state: Optional[State], context: Context, store: Store
     ) -> State:
+        session = store.checkpoint
+        if session is not None and session.pipeline is self:
+            return await self._async_checkpointed_forward(
+                state, context, store, session
+            )
         running_state = state
         for block in self._blocks:
-            running_state = await block.async_forward(
-                state=running_state, context=context, store=store
+            running_state = await _async_forward_block(
+                block, running_state, context, store
             )
         return running_state
 
-    def run(self, _state: Optional[State] = None, **kwargs: Dict[str, str]):
+    def _checkpointed_forward(
+        self,
+        state: Optional[State],
+        context: Context,
+        store: Store,
+        session: CheckpointSession,
+    ) -> State:
+        running_state = state
+        n_blocks = len(self._blocks)
+        for step in range(session.start_step, n_blocks):
+            running_state = _forward_block(
+                self._blocks[step], running_state, context, store
+            )
+            session.save(step + 1, n_blocks, running_state, store)
+        return running_state
+
+    async def _async_checkpointed_forward(
+        self,
+        state: Optional[State],
+        context: Context,
+        store: Store,
+        session: CheckpointSession,
+    ) -> State:
+        running_state = state
+        n_blocks = len(self._blocks)
+        for step in range(session.start_step, n_blocks):
+            running_state = await _async_forward_block(
+                self._blocks[step], running_state, context, store
+            )
+            session.save(step + 1, n_blocks, running_state, store)
+        return running_state
+
+    def _start_run(
+        self,
+        state: Optional[State],
+        tracer: Optional[Tracer],
+        timeout: Optional[float],
+        checkpointer: Optional[BaseCheckpointer],
+        run_id: Optional[str],
+        kwargs: Dict[str, str],
+    ) -> Store:
+        store = Store(tracer=tracer, deadline=Deadline.from_timeout(timeout))
+        if checkpointer is not None:
+            if run_id is None:
+                raise ValueError("A run id is required to checkpoint the run.")
+            store.checkpoint = CheckpointSession(checkpointer, run_id, self, kwargs)
+            # the inputs are persisted as well, so that the run can be resumed even if the first block fails
+            store.checkpoint.save(0, len(self._blocks), state, store)
+        return store
+
+    def _resume_run(
+        self,
+        run_id: str,
+        checkpointer: BaseCheckpointer,
+        tracer: Optional[Tracer],
+        timeout: Optional[float],
+    ):
+        checkpoint = checkpointer.load(run_id)
+        if checkpoint is None:
+            raise KeyError(f"No checkpoint found for run {run_id}")
+        if checkpoint.n_blocks != len(self._blocks):
+            raise ValueError(
+                f"Checkpoint of run {run_id} was created by a pipeline with {checkpoint.n_blocks} blocks, got {len(self._blocks)}"
+            )
+        store = Store(tracer=tracer, deadline=Deadline.from_timeout(timeout))
+        store.restore(checkpoint.store)
+        store.checkpoint = CheckpointSession(
+            checkpointer, run_id, self, checkpoint.context, checkpoint.step
+        )
+        return checkpoint.state, Context(**checkpoint.context), store
+
+    def _finish_run(self, out: State, store: Store):
+        output = self.output_parser.parse(out)
+        if store.checkpoint is not None:
+            store.checkpoint.checkpointer.delete(store.checkpoint.run_id)
+        return output, store.usage_meter.get_usage()
+
+    def run(
+        self,
+        _state: Optional[State] = None,
+        _tracer: Optional[Tracer] = None,
+        _timeout: Optional[float] = None,
+        _checkpointer: Optional[BaseCheckpointer] = None,
+        _run_id: Optional[str] = None,
+        **kwargs: Dict[str, str],
+    ):
         """
         Runs the pipeline with the given state and context (populated with kwargs).
         Each run initializes a new empty store.
@@ -340,19 +612,277 @@ class Pipeline(Block):
         ----------
         _state : Optional[State], optional
             initial state, by default None
+        _tracer : Optional[Tracer], optional
+            tracer that records the execution spans of the run, by default None
+        _timeout : Optional[float], optional
+            maximum duration of the run in seconds, by default None;
+            the blocks check the deadline cooperatively and DeadlineExceededError is raised once it passes
+        _checkpointer : Optional[BaseCheckpointer], optional
+            checkpointer that persists the state, store and usage after each block of the pipeline, by default None;
+            a failed run can be continued with `resume`, the checkpoint of a successful run is deleted
+        _run_id : Optional[str], optional
+            id of the run, required for checkpointing, by default None
+
+        Raises
+        ------
+        DeadlineExceededError
+            the run did not complete within `_timeout` seconds
         """
         context = Context(**kwargs)
-        store = Store()
-        out = self.forward(state=_state, context=context, store=store)
-        return self.output_parser.parse(out), store.usage_meter.get_usage()
+        store = self._start_run(
+            _state, _tracer, _timeout, _checkpointer, _run_id, kwargs
+        )
+        out = _forward_block(self, _state, context, store)
+        return self._finish_run(out, store)
 
     async def async_run(
-        self, _state: Optional[State] = None, **kwargs: Dict[str, str]
+        self,
+        _state: Optional[State] = None,
+        _tracer: Optional[Tracer] = None,
+        _timeout: Optional[float] = None,
+        _checkpointer: Optional[BaseCheckpointer] = None,
+        _run_id: Optional[str] = None,
+        **kwargs: Dict[str, str],
     ) -> str:
         context = Context(**kwargs)
-        store = Store()
-        out = await self.async_forward(state=_state, context=context, store=store)
-        return self.output_parser.parse(out), store.usage_meter.get_usage()
+        store = self._start_run(
+            _state, _tracer, _timeout, _checkpointer, _run_id, kwargs
+        )
+        out = await _wait_for_deadline(
+            _async_forward_block(self, _state, context, store), store.deadline
+        )
+        return self._finish_run(out, store)
+
+    def resume(
+        self,
+        run_id: str,
+        checkpointer: BaseCheckpointer,
+        _tracer: Optional[Tracer] = None,
+        _timeout: Optional[float] = None,
+    ):
+        """
+        Resumes a checkpointed run from its last completed block.
+        The state, store, usage and context of the run are restored from the checkpoint.
+
+        Parameters
+        ----------
+        run_id : str
+            id of the run
+        checkpointer : BaseCheckpointer
+            checkpointer the run was checkpointed with
+        _tracer : Optional[Tracer], optional
+            tracer that records the execution spans of the resumed run, by default None
+        _timeout : Optional[float], optional
+            maximum duration of the resumed run in seconds, by default None
+
+        Raises
+        ------
+        KeyError
+            there is no checkpoint of the run
+        ValueError
+            the checkpoint was created by a pipeline with a different number of blocks
+        """
+        state, context, store = self._resume_run(
+            run_id, checkpointer, _tracer, _timeout
+        )
+        out = _forward_block(self, state, context, store)
+        return self._finish_run(out, store)
+
+    async def async_resume(
+        self,
+        run_id: str,
+        checkpointer: BaseCheckpointer,
+        _tracer: Optional[Tracer] = None,
+        _timeout: Optional[float] = None,
+    ):
+        state, context, store = self._resume_run(
+            run_id, checkpointer, _tracer, _timeout
+        )
+        out = await _wait_for_deadline(
+            _async_forward_block(self, state, context, store), store.deadline
+        )
+        return self._finish_run(out, store)
+
+    def async_stream(
+        self,
+        _state: Optional[State] = None,
+        _tracer: Optional[Tracer] = None,
+        _timeout: Optional[float] = None,
+        **kwargs: Dict[str, str],
+    ) -> PipelineStream:
+        """
+        Runs the pipeline and streams the output of the last block.
+        The output is only streamed token-by-token when the last block is an LLM (or a pipeline that ends with an LLM)
+        and the default output parser is used; otherwise, the parsed output is returned as a single chunk.
+
+        Parameters
+        ----------
+        _state : Optional[State], optional
+            initial state, by default None
+        _tracer : Optional[Tracer], optional
+            tracer that records the execution spans of the run, by default None
+        _timeout : Optional[float], optional
+            maximum duration of the run in seconds, by default None; once it passes, the iteration raises DeadlineExceededError
+
+        Returns
+        -------
+        PipelineStream
+            async iterator over the output chunks; the usage is available once the iteration is complete
+        """
+        context = Context(**kwargs)
+        store = Store(tracer=_tracer, deadline=Deadline.from_timeout(_timeout))
+        chunks = self._async_stream_forward(_state, context, store)
+        return PipelineStream(_stream_until_deadline(chunks, store.deadline), store)
+
+    def _is_streamable(self) -> bool:
+        if not self._blocks or not isinstance(self.output_parser, DefaultOutputParser):
+            return False
+        last = self._blocks[-1]
+        return isinstance(last, BaseLLM) or (
+            isinstance(last, Pipeline) and last._is_streamable()
+        )
+
+    async def _async_stream_forward(
+        self, state: Optional[State], context: Context, store: Store
+    ) -> AsyncIterator[str]:
+        if not self._is_streamable():
+            out = await self.async_forward(state=state, context=context, store=store)
+            yield self.output_parser.parse(out)
+            return
+        running_state = state
+        for block in self._blocks[:-1]:
+            running_state = await _async_forward_block(
+                block, running_state, context, store
+            )
+        last = self._blocks[-1]
+        if isinstance(last, Pipeline):
+            async for chunk in last._async_stream_forward(
+                running_state, context, store
+            ):
+                yield chunk
+            return
+        if not isinstance(running_state, ChatPrompt):
+            raise TypeError(f"State must be a ChatPrompt, got {type(running_state)}")
+        kwargs = _llm_kwargs(store)
+        if store.tracer is None:
+            async for chunk in last.async_stream_prompt(
+                running_state, usage_meter=store.usage_meter, **kwargs
+            ):
+                yield chunk
+            return
+        with store.tracer.llm_span(
+            type(last).__name__, store.usage_meter, stream=True
+        ) as usage_meter:
+            async for chunk in last.async_stream_prompt(
+                running_state, usage_meter=usage_meter, **kwargs
+            ):
+                yield chunk
+
+    def _batch_item_result(
+        self,
+        index: int,
+        store: Store,
+        out: Optional[State] = None,
+        error: Optional[Exception] = None,
+        usage_meter: Optional[UsageMeter] = None,
+    ) -> BatchItemResult:
+        output = None
+        if error is None:
+            try:
+                output = self.output_parser.parse(out)
+            except Exception as e:
+                error = e
+        usage = store.usage_meter.get_usage()
+        if usage_meter is not None:
+            usage_meter.increment(usage["prompt_tokens"], usage["completion_tokens"])
+        return BatchItemResult(index=index, output=output, usage=usage, error=error)
+
+    def run_many(
+        self,
+        inputs: Iterable[BatchInput],
+        max_concurrency: int = 8,
+        ordered: bool = True,
+        usage_meter: Optional[UsageMeter] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[BatchItemResult]:
+        """
+        Runs the pipeline over a batch of inputs using a bounded number of threads.
+        Each item gets its own context and store; a failure of one item does not affect the others.
+
+        Parameters
+        ----------
+        inputs : Iterable[BatchInput]
+            iterable of (state, context kwargs) tuples; consumed lazily
+        max_concurrency : int, optional
+            maximum number of items processed at the same time, by default 8
+        ordered : bool, optional
+            whether to yield the results in the input order (otherwise in the completion order), by default True
+        usage_meter : Optional[UsageMeter], optional
+            usage meter that accumulates the usage of the whole batch, by default None
+        timeout : Optional[float], optional
+            maximum duration of each item in seconds, by default None
+
+        Yields
+        ------
+        BatchItemResult
+            the output, usage and error (if any) of each item
+        """
+
+        def run_item(index: int, item: BatchInput) -> BatchItemResult:
+            state, kwargs = item
+            store = Store(deadline=Deadline.from_timeout(timeout))
+            try:
+                out = self.forward(state=state, context=Context(**kwargs), store=store)
+            except Exception as e:
+                return self._batch_item_result(
+                    index, store, error=e, usage_meter=usage_meter
+                )
+            return self._batch_item_result(index, store, out, usage_meter=usage_meter)
+
+        return iter_batch(run_item, inputs, max_concurrency, ordered)
+
+    def async_run_many(
+        self,
+        inputs: Iterable[BatchInput],
+        max_concurrency: int = 8,
+        ordered: bool = True,
+        usage_meter: Optional[UsageMeter] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[BatchItemResult]:
+        """
+        Async counterpart of `run_many`; returns an async iterator over the results.
+
+        Parameters
+        ----------
+        inputs : Iterable[BatchInput]
+            iterable of (state, context kwargs) tuples; consumed lazily
+        max_concurrency : int, optional
+            maximum number of items processed at the same time, by default 8
+        ordered : bool, optional
+            whether to yield the results in the input order (otherwise in the completion order), by default True
+        usage_meter : Optional[UsageMeter], optional
+            usage meter that accumulates the usage of the whole batch, by default None
+        timeout : Optional[float], optional
+            maximum duration of each item in seconds, by default None
+        """
+
+        async def run_item(index: int, item: BatchInput) -> BatchItemResult:
+            state, kwargs = item
+            store = Store(deadline=Deadline.from_timeout(timeout))
+            try:
+                out = await _wait_for_deadline(
+                    self.async_forward(
+                        state=state, context=Context(**kwargs), store=store
+                    ),
+                    store.deadline,
+                )
+            except Exception as e:
+                return self._batch_item_result(
+                    index, store, error=e, usage_meter=usage_meter
+                )
+            return self._batch_item_result(index, store, out, usage_meter=usage_meter)
+
+        return async_iter_batch(run_item, inputs, max_concurrency, ordered)
 
     def __rshift__(self, other: Block) -> Pipeline:
         self.add_block(other)
@@ -365,12 +895,45 @@ class Pipeline(Block):
         return keys
 
 
+class PipelineStream:
+    def __init__(self, chunks: AsyncIterator[str], store: Store):
+        """
+        An async iterator over the output chunks of a streamed pipeline run.
+
+        Parameters
+        ----------
+        chunks : AsyncIterator[str]
+            output chunks
+        store : Store
+            store of the run
+        """
+        self._chunks = chunks
+        self._store = store
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._chunks.__aiter__()
+
+    @property
+    def usage(self) -> dict:
+        """Usage of the run; complete only after the iteration is finished."""
+        return self._store.usage_meter.get_usage()
+
+
 class Parallel(Block):
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None):
         """
         A parallel block executes multiple sub-blocks in parallel. The output of each block is stored as a separate key in the KVData object.
+        The sync branches are submitted to the process-wide executor (see `agent_dingo.core.executor`).
+
+        Parameters
+        ----------
+        max_concurrency : Optional[int], optional
+            maximum number of branches executed at the same time, by default None (executor default)
         """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer")
         self.blocks = []
+        self.max_concurrency = max_concurrency
 
     def add_block(self, block: Block):
         """
@@ -387,36 +950,34 @@ class Parallel(Block):
 
     def forward(self, state: Optional[State], context: Context, store: Store) -> State:
         # run all blocks in parallel
-        states = joblib.Parallel(n_jobs=len(self.blocks), backend="threading")(
-            joblib.delayed(block.forward)(state=state, context=context, store=store)
-            for block in self.blocks
+        states = get_executor().run_all(
+            [
+                partial(_forward_block, block, state, context, store)
+                for block in self.blocks
+            ],
+            max_concurrency=self.max_concurrency,
+            deadline=store.deadline,
         )
-        out = {}
-        for i, state in enumerate(states):
-            if i == 0 and isinstance(state, ChatPrompt):
-                # allow a special case where the first block returns a ChatPrompt
-                # the ouput of remaining branches will be ignored
-                return state
-            if not isinstance(state, KVData):
-                raise TypeError(
-                    f"Expected KVData, got {type(state)} from block {i} of {len(states)}"
-                )
-            if len(state.keys()) != 1:
-                raise ValueError(
-                    f"Expected KVData with one key `_out_0`, got {len(state.keys())} keys from block {i} of {len(states)}"
-                )
-            out[f"_out_{i}"] = state["_out_0"]
-        return KVData(**out)
+        return self._merge_states(states)
 
     async def async_forward(
         self, state: Optional[State], context: Context, store: Store
     ) -> State:
-        tasks = [block.async_forward(state, context, store) for block in self.blocks]
-        states = await gather(*tasks)
+        tasks = [
+            _async_forward_block(block, state, context, store) for block in self.blocks
+        ]
+        # once the deadline passes, all the branches are cancelled
+        states = await _wait_for_deadline(
+            _bounded_gather(tasks, self.max_concurrency), store.deadline
+        )
+        return self._merge_states(states)
 
+    def _merge_states(self, states: List[State]) -> State:
         out = {}
         for i, state in enumerate(states):
             if i == 0 and isinstance(state, ChatPrompt):
+                # allow a special case where the first block returns a ChatPrompt
+                # the ouput of remaining branches will be ignored
                 return state
             if not isinstance(state, KVData):
                 raise TypeError(
@@ -437,6 +998,446 @@ class Parallel(Block):
         keys = []
         for block in self.blocks:
             keys.extend(block.get_required_context_keys())
+        return keys
+
+
+class _RaceRound:
+    """Records the usage of the branches of a single race that were not selected."""
+
+    def __init__(self, discarded_usage: UsageMeter):
+        self.discarded_usage = discarded_usage
+        self.winners = None
+        self._finished = {}
+        self._lock = Lock()
+
+    def finish(self, index: int, usage: UsageMeter) -> None:
+        with self._lock:
+            if self.winners is None:
+                self._finished[index] = usage
+                return
+        if index not in self.winners:
+            self.discarded_usage.increment(usage.prompt_tokens, usage.completion_tokens)
+
+    def decide(self, winners: List[int]) -> None:
+        with self._lock:
+            self.winners = set(winners)
+            finished, self._finished = self._finished, {}
+        for index, usage in finished.items():
+            self.finish(index, usage)
+
+
+class Race(Parallel):
+    def __init__(
+        self,
+        n: int = 1,
+        validator: Optional[Callable[[State], bool]] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        """
+        A race block executes multiple sub-blocks in parallel and returns as soon as the first `n` of them complete successfully.
+        The remaining branches are cancelled (async) or skipped if they have not started yet (sync).
+
+        The usage of all the branches (including the cancelled ones, up to the point of cancellation) is recorded in the store;
+        the usage of the branches whose output was not selected is additionally recorded in `discarded_usage`.
+
+        Parameters
+        ----------
+        n : int, optional
+            number of branches to wait for, by default 1; if 1, the output of the first branch is returned as is,
+            otherwise the outputs are stored as separate keys in the KVData object in the completion order
+        validator : Optional[Callable[[State], bool]], optional
+            function that checks the output of a branch; the outputs that do not pass it are discarded, by default None
+        max_concurrency : Optional[int], optional
+            maximum number of branches executed at the same time, by default None (executor default)
+        """
+        super().__init__(max_concurrency=max_concurrency)
+        if n < 1:
+            raise ValueError("n must be a positive integer")
+        self.n = n
+        self.validator = validator
+        self.discarded_usage = UsageMeter()
+
+    def _check_output(self, index: int, out: State) -> State:
+        if self.validator is not None and not self.validator(out):
+            raise ValueError(
+                f"The output of branch {index} did not pass the validation"
+            )
+        return out
+
+    def _run_branch(
+        self,
+        index: int,
+        block: Block,
+        state: Optional[State],
+        context: Context,
+        store: Store,
+        round_: _RaceRound,
+    ) -> State:
+        branch_store = store.with_usage_meter(UsageMeter())
+        try:
+            out = _forward_block(block, state, context, branch_store)
+        finally:
+            self._finish_branch(index, store, branch_store, round_)
+        return self._check_output(index, out)
+
+    async def _async_run_branch(
+        self,
+        index: int,
+        block: Block,
+        state: Optional[State],
+        context: Context,
+        store: Store,
+        round_: _RaceRound,
+    ) -> State:
+        branch_store = store.with_usage_meter(UsageMeter())
+        try:
+            out = await _async_forward_block(block, state, context, branch_store)
+        finally:
+            self._finish_branch(index, store, branch_store, round_)
+        return self._check_output(index, out)
+
+    def _finish_branch(
+        self, index: int, store: Store, branch_store: Store, round_: _RaceRound
+    ) -> None:
+        usage = branch_store.usage_meter
+        store.usage_meter.increment(usage.prompt_tokens, usage.completion_tokens)
+        round_.finish(index, usage)
+
+    def _check_branches(self) -> None:
+        if self.n > len(self.blocks):
+            raise ValueError(
+                f"Race waits for {self.n} branches, but has only {len(self.blocks)}"
+            )
+
+    def _merge_race_states(self, states: List[State]) -> State:
+        return states[0] if self.n == 1 else self._merge_states(states)
+
+    def forward(self, state: Optional[State], context: Context, store: Store) -> State:
+        self._check_branches()
+        round_ = _RaceRound(self.discarded_usage)
+        winners = []
+        try:
+            winners = get_executor().run_first(
+                [
+                    partial(self._run_branch, i, block, state, context, store, round_)
+                    for i, block in enumerate(self.blocks)
+                ],
+                n=self.n,
+                max_concurrency=self.max_concurrency,
+                deadline=store.deadline,
+            )
+        finally:
+            round_.decide([i for i, _ in winners])
+        return self._merge_race_states([out for _, out in winners])
+
+    async def async_forward(
+        self, state: Optional[State], context: Context, store: Store
+    ) -> State:
+        self._check_branches()
+        return await _wait_for_deadline(
+            self._async_race(state, context, store), store.deadline
+        )
+
+    async def _async_race(
+        self, state: Optional[State], context: Context, store: Store
+    ) -> State:
+        round_ = _RaceRound(self.discarded_usage)
+        semaphore = (
+            Semaphore(self.max_concurrency)
+            if self.max_concurrency is not None
+            else None
+        )
+
+        async def run(index: int, block: Block) -> State:
+            if semaphore is None:
+                return await self._async_run_branch(
+                    index, block, state, context, store, round_
+                )
+            async with semaphore:
+                return await self._async_run_branch(
+                    index, block, state, context, store, round_
+                )
+
+        tasks = [ensure_future(run(i, block)) for i, block in enumerate(self.blocks)]
+        pending = set(tasks)
+        winners = []
+        errors = []
+        try:
+            while pending and len(winners) < self.n:
+                done, pending = await wait(pending, return_when=FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.index):
+                    if task.exception() is None:
+                        winners.append(task)
+                    else:
+                        errors.append(task.exception())
+        finally:
+            winners = winners[: self.n]
+            round_.decide([tasks.index(task) for task in winners])
+            for task in pending:
+                task.cancel()
+            # the cancelled branches record their usage before they exit
+            await gather(*pending, return_exceptions=True)
+        if len(winners) < self.n:
+            raise errors[0]
+        return self._merge_race_states([task.result() for task in winners])
+
+
+class Switch(Block):
+    def __init__(
+        self,
+        selector: Callable[[Optional[State], Context, Store], Hashable],
+        branches: Optional[Dict[Hashable, Block]] = None,
+        default: Optional[Block] = None,
+        required_context_keys: Optional[List[str]] = None,
+    ):
+        """
+        A switch block selects one of its branches with a (cheap) selector and executes only the selected branch.
+
+        Parameters
+        ----------
+        selector : Callable[[Optional[State], Context, Store], Hashable]
+            function that returns the key of the branch to execute
+        branches : Optional[Dict[Hashable, Block]], optional
+            branches by key, by default None
+        default : Optional[Block], optional
+            branch executed when the selector returns an unknown key, by default None (KeyError is raised)
+        required_context_keys : Optional[List[str]], optional
+            context keys required by the selector, by default None
+        """
+        self.selector = selector
+        self.branches: Dict[Hashable, Block] = {}
+        for key, block in (branches or {}).items():
+            self.add_branch(key, block)
+        if default is not None and not isinstance(default, Block):
+            raise TypeError(f"Expected a Block, got {type(default)}")
+        self.default = default
+        self._required_context_keys = required_context_keys or []
+
+    def add_branch(self, key: Hashable, block: Block):
+        """
+        Add a branch to the switch block.
+
+        Parameters
+        ----------
+        key : Hashable
+            key returned by the selector to execute the branch
+        block : Block
+            Block to add.
+        """
+        if not isinstance(block, Block):
+            raise TypeError(f"Expected a Block, got {type(block)}")
+        self.branches[key] = block
+
+    def select(self, state: Optional[State], context: Context, store: Store) -> Block:
+        key = self.selector(state, context, store)
+        block = self.branches.get(key, self.default)
+        if block is None:
+            raise KeyError(f"Switch has no branch {key!r} and no default branch")
+        return block
+
+    def forward(self, state: Optional[State], context: Context, store: Store) -> State:
+        block = self.select(state, context, store)
+        return _forward_block(block, state, context, store)
+
+    async def async_forward(
+        self, state: Optional[State], context: Context, store: Store
+    ) -> State:
+        block = self.select(state, context, store)
+        return await _async_forward_block(block, state, context, store)
+
+    def get_required_context_keys(self) -> List[str]:
+        # any of the branches can be selected at runtime
+        keys = list(self._required_context_keys)
+        for block in self.branches.values():
+            keys.extend(block.get_required_context_keys())
+        if self.default is not None:
+            keys.extend(self.default.get_required_context_keys())
+        return list(dict.fromkeys(keys))
+
+
+def _get_block_name(block: Block) -> str:
+    # a name that is stable across the processes, used to namespace the cache keys
+    if isinstance(block, Pipeline):
+        return ">>".join(_get_block_name(b) for b in block._blocks)
+    if isinstance(block, InlineBlock) and block.func is not None:
+        func = block.func
+    else:
+        func = type(block)
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+class _ElementError:
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class Map(Block):
+    def __init__(
+        self,
+        block: Block,
+        key: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        cache: Optional[BaseCache] = None,
+        on_error: str = "raise",
+        default: Optional[str] = None,
+        errors_key: Optional[str] = None,
+        cache_namespace: Optional[str] = None,
+    ):
+        """
+        A map block executes the sub-block for each element of a list and collects the outputs (in the input order)
+        as separate keys of a KVData object. The sub-block receives `KVData(_out_0=element)` and must return a KVData with the key `_out_0`.
+        The sync elements are submitted to the process-wide executor (see `agent_dingo.core.executor`).
+
+        Parameters
+        ----------
+        block : Block
+            block (or pipeline) to apply to each element
+        key : Optional[str], optional
+            key of the list-valued item of the input KVData, by default None (each value of the input KVData is an element)
+        max_concurrency : Optional[int], optional
+            maximum number of elements processed at the same time, by default None (executor default)
+        cache : Optional[BaseCache], optional
+            cache of the outputs by element and context (see `agent_dingo.llm.cache`), by default None
+        on_error : str, optional
+            how to handle the failed elements: "raise" the first error, "skip" the element or replace its output with the "default", by default "raise"
+        default : Optional[str], optional
+            output of the failed elements if `on_error` is "default", by default None
+        errors_key : Optional[str], optional
+            store key under which the errors of the failed elements are saved as a dict by element index, by default None
+        cache_namespace : Optional[str], optional
+            prefix of the cache keys that identifies the sub-block when the cache is shared, by default None (derived from the sub-block)
+        """
+        if not isinstance(block, Block):
+            raise TypeError(f"Expected a Block, got {type(block)}")
+        if on_error not in ("raise", "skip", "default"):
+            raise ValueError(f"Unknown on_error value {on_error}")
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer")
+        self.block = block
+        self.key = key
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.on_error = on_error
+        self.default = default
+        self.errors_key = errors_key
+        self.cache_namespace = cache_namespace or _get_block_name(block)
+
+    def _get_elements(self, state: Optional[State]) -> List[Any]:
+        if not isinstance(state, KVData):
+            raise TypeError(f"State must be a KVData, got {type(state)}")
+        if self.key is None:
+            return list(state.values())
+        value = state[self.key]
+        if not isinstance(value, (list, tuple)):
+            raise TypeError(f"Expected a list under key {self.key}, got {type(value)}")
+        return list(value)
+
+    def _get_cache_key(self, element: Any, context: Context) -> str:
+        data = json.dumps(
+            [self.cache_namespace, element, context.dict], sort_keys=True, default=str
+        )
+        return "map:" + hashlib.sha256(data.encode()).hexdigest()
+
+    def _get_output(self, out: State) -> Any:
+        if not isinstance(out, KVData) or "_out_0" not in out.keys():
+            raise TypeError(f"Expected KVData with the key `_out_0`, got {out}")
+        return out["_out_0"]
+
+    def _handle_error(self, error: Exception) -> _ElementError:
+        if self.on_error == "raise" or isinstance(error, DeadlineExceededError):
+            raise error
+        return _ElementError(error)
+
+    def _run_element(
+        self, element: Any, context: Context, store: Store, cache_key: Optional[str]
+    ) -> Any:
+        try:
+            out = _forward_block(self.block, KVData(_out_0=element), context, store)
+            output = self._get_output(out)
+        except Exception as e:
+            return self._handle_error(e)
+        if cache_key is not None:
+            self.cache.set(cache_key, output)
+        return output
+
+    async def _async_run_element(
+        self, element: Any, context: Context, store: Store, cache_key: Optional[str]
+    ) -> Any:
+        try:
+            out = await _async_forward_block(
+                self.block, KVData(_out_0=element), context, store
+            )
+            output = self._get_output(out)
+        except Exception as e:
+            return self._handle_error(e)
+        if cache_key is not None:
+            self.cache.set(cache_key, output)
+        return output
+
+    def _lookup(self, elements: List[Any], context: Context):
+        # returns the cached outputs and the (index, cache key) of the elements to process
+        outputs = [None] * len(elements)
+        todo = []
+        for i, element in enumerate(elements):
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self._get_cache_key(element, context)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    outputs[i] = cached
+                    continue
+            todo.append((i, cache_key))
+        return outputs, todo
+
+    def _collect(self, outputs: List[Any], store: Store) -> KVData:
+        values = []
+        errors = {}
+        for i, output in enumerate(outputs):
+            if isinstance(output, _ElementError):
+                errors[i] = output.error
+                if self.on_error == "skip":
+                    continue
+                output = self.default
+            values.append(output)
+        if self.errors_key is not None:
+            store.update(self.errors_key, errors)
+        return KVData(**{f"_out_{i}": v for i, v in enumerate(values)})
+
+    def forward(self, state: Optional[State], context: Context, store: Store) -> State:
+        elements = self._get_elements(state)
+        outputs, todo = self._lookup(elements, context)
+        results = get_executor().run_all(
+            [
+                partial(self._run_element, elements[i], context, store, cache_key)
+                for i, cache_key in todo
+            ],
+            max_concurrency=self.max_concurrency,
+            deadline=store.deadline,
+        )
+        for (i, _), output in zip(todo, results):
+            outputs[i] = output
+        return self._collect(outputs, store)
+
+    async def async_forward(
+        self, state: Optional[State], context: Context, store: Store
+    ) -> State:
+        elements = self._get_elements(state)
+        outputs, todo = self._lookup(elements, context)
+        tasks = [
+            self._async_run_element(elements[i], context, store, cache_key)
+            for i, cache_key in todo
+        ]
+        results = await _wait_for_deadline(
+            _bounded_gather(tasks, self.max_concurrency), store.deadline
+        )
+        for (i, _), output in zip(todo, results):
+            outputs[i] = output
+        return self._collect(outputs, store)
+
+    def get_required_context_keys(self) -> List[str]:
+        return self.block.get_required_context_keys()
 
 
 class Identity(Block):
@@ -545,7 +1546,7 @@ class InlineBlock(Block):
     def forward(self, state: State | None, context: Context, store: Store) -> State:
         if inspect.iscoroutinefunction(self.func):
             warnings.warn(f"Called forward on an async inline block.")
-            out = asyncio_run(self.func(state, context, store))
+            out = run_sync(self.func(state, context, store), store.deadline)
         else:
             out = self.func(state, context, store)
         return self._get_output(out)
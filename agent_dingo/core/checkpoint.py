@@ -0,0 +1,328 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional, TYPE_CHECKING
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Condition, Lock, Thread
+from urllib.parse import quote
+import atexit
+import os
+import pickle
+import sqlite3
+import time
+import warnings
+
+if TYPE_CHECKING:
+    from agent_dingo.core.state import State
+
+# marks a pending deletion in the write queue
+_DELETE = object()
+
+
+@dataclass
+class _PendingWrite:
+    step: int
+    payload: bytes
+
+
+@dataclass
+class Checkpoint:
+    """The progress of a pipeline run after `step` of its `n_blocks` top-level blocks have completed."""
+
+    run_id: str
+    step: int
+    n_blocks: int
+    state: Optional[State]
+    context: Dict[str, Any]
+    store: Dict[str, Any]
+    created_at: float = field(default_factory=time.time)
+
+
+def _serialize(checkpoint: Checkpoint) -> bytes:
+    try:
+        return pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        pass
+    # the misc items of the store can be arbitrary objects; the ones that cannot be pickled are not persisted
+    misc = {}
+    for key, item in checkpoint.store["misc"].items():
+        try:
+            pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            warnings.warn(
+                f"Store item {key} of run {checkpoint.run_id} cannot be pickled and is not checkpointed."
+            )
+            continue
+        misc[key] = item
+    checkpoint.store = {**checkpoint.store, "misc": misc}
+    return pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class BaseCheckpointer(ABC):
+    def __init__(self):
+        """
+        Persists the checkpoints of pipeline runs.
+
+        `save` pickles the checkpoint right away, so the later changes of the state and the store do not leak into it,
+        and only enqueues the write; the checkpoints are written by a background thread, so checkpointing does not add I/O latency to the run.
+        Only the latest pending checkpoint of each run is written.
+        """
+        self._pending: OrderedDict = OrderedDict()
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+        self._busy = False
+        self._closed = False
+        self.n_written = 0
+        self.n_errors = 0
+
+    @abstractmethod
+    def _write(self, run_id: str, step: int, payload: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def _read(self, run_id: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def _delete(self, run_id: str) -> None:
+        pass
+
+    def _enqueue(self, run_id: str, item: Any) -> None:
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(
+                    "Cannot checkpoint after the checkpointer is closed."
+                )
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._worker, name="dingo-checkpointer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+            # a newer checkpoint replaces the pending one
+            self._pending.pop(run_id, None)
+            self._pending[run_id] = item
+            self._condition.notify_all()
+
+    def _worker(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                run_id, item = self._pending.popitem(last=False)
+                self._busy = True
+            try:
+                if item is _DELETE:
+                    self._delete(run_id)
+                else:
+                    self._write(run_id, item.step, item.payload)
+                    self.n_written += 1
+            except Exception as e:
+                self.n_errors += 1
+                warnings.warn(f"Failed to checkpoint run {run_id}: {e}")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def save(self, checkpoint: Checkpoint) -> None:
+        """Schedules the checkpoint to be written.
+
+        Parameters
+        ----------
+        checkpoint : Checkpoint
+            checkpoint to write; it replaces the previous checkpoint of the same run
+        """
+        payload = _serialize(checkpoint)
+        self._enqueue(checkpoint.run_id, _PendingWrite(checkpoint.step, payload))
+
+    def delete(self, run_id: str) -> None:
+        """Schedules the checkpoint of the run to be deleted.
+
+        Parameters
+        ----------
+        run_id : str
+            id of the run
+        """
+        self._enqueue(run_id, _DELETE)
+
+    def load(self, run_id: str) -> Optional[Checkpoint]:
+        """Returns the latest checkpoint of the run (including a pending one) or None if there is none.
+
+        Parameters
+        ----------
+        run_id : str
+            id of the run
+        """
+        with self._condition:
+            if run_id in self._pending:
+                item = self._pending[run_id]
+                if item is _DELETE:
+                    return None
+                return pickle.loads(item.payload)
+            # the checkpoint of the run might be being written right now
+            while self._busy:
+                self._condition.wait()
+        payload = self._read(run_id)
+        return pickle.loads(payload) if payload is not None else None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until all the pending checkpoints are written.
+
+        Parameters
+        ----------
+        timeout : Optional[float], optional
+            maximum number of seconds to wait, by default None (no limit)
+
+        Returns
+        -------
+        bool
+            whether all the pending checkpoints were written
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._busy, timeout
+            )
+
+    def close(self) -> None:
+        """Writes the pending checkpoints and stops the background thread."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+
+class FileCheckpointer(BaseCheckpointer):
+    def __init__(self, directory: str):
+        """
+        Stores the latest checkpoint of every run as a separate file in a local directory.
+
+        Parameters
+        ----------
+        directory : str
+            directory of the checkpoint files; it is created if it does not exist
+        """
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, run_id: str) -> str:
+        return os.path.join(self.directory, quote(run_id, safe="") + ".ckpt")
+
+    def _write(self, run_id: str, step: int, payload: bytes) -> None:
+        path = self._path(run_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        # the previous checkpoint is replaced atomically
+        os.replace(tmp_path, path)
+
+    def _read(self, run_id: str) -> Optional[bytes]:
+        try:
+            with open(self._path(run_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _delete(self, run_id: str) -> None:
+        try:
+            os.remove(self._path(run_id))
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteCheckpointer(BaseCheckpointer):
+    def __init__(self, path: str):
+        """
+        Stores the latest checkpoint of every run in a SQLite database.
+
+        Parameters
+        ----------
+        path : str
+            path to the database file (or ":memory:")
+        """
+        super().__init__()
+        self.path = path
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints "
+                "(run_id TEXT PRIMARY KEY, step INTEGER, payload BLOB, updated_at REAL)"
+            )
+
+    def _write(self, run_id: str, step: int, payload: bytes) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+                (run_id, step, payload, time.time()),
+            )
+
+    def _read(self, run_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT payload FROM checkpoints WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _delete(self, run_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM checkpoints WHERE run_id = ?", (run_id,)
+            )
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            self._connection.close()
+
+
+class CheckpointSession:
+    def __init__(
+        self,
+        checkpointer: BaseCheckpointer,
+        run_id: str,
+        pipeline: Any,
+        context: Dict[str, Any],
+        start_step: int = 0,
+    ):
+        """
+        Checkpointing configuration of a single pipeline run. It is stored in the `Store` as `store.checkpoint`.
+
+        Parameters
+        ----------
+        checkpointer : BaseCheckpointer
+            checkpointer that persists the checkpoints
+        run_id : str
+            id of the run
+        pipeline : Pipeline
+            the top-level pipeline of the run; only its blocks are checkpointed
+        context : Dict[str, Any]
+            context of the run
+        start_step : int, optional
+            number of the blocks that were completed before the run was resumed, by default 0
+        """
+        self.checkpointer = checkpointer
+        self.run_id = run_id
+        self.pipeline = pipeline
+        self.context = context
+        self.start_step = start_step
+
+    def save(self, step: int, n_blocks: int, state: Optional[State], store) -> None:
+        # the checkpoint is pickled at the step boundary, only the write happens in the background
+        self.checkpointer.save(
+            Checkpoint(
+                run_id=self.run_id,
+                step=step,
+                n_blocks=n_blocks,
+                state=state,
+                context=self.context,
+                store=store.snapshot(),
+            )
+        )
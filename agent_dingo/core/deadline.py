@@ -0,0 +1,51 @@
+from typing import Optional
+import time
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a pipeline run does not complete within its deadline."""
+
+    pass
+
+
+class Deadline:
+    def __init__(self, timeout: float):
+        """
+        A point in time by which a pipeline run must complete. It is stored in the `Store` and checked by the blocks.
+
+        Parameters
+        ----------
+        timeout : float
+            number of seconds from now
+        """
+        if timeout <= 0:
+            raise ValueError("timeout must be positive")
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def from_timeout(cls, timeout: Optional[float]) -> Optional["Deadline"]:
+        return cls(timeout) if timeout is not None else None
+
+    def remaining(self) -> float:
+        """Returns the remaining time in seconds (never negative)."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self) -> None:
+        """Raises DeadlineExceededError if the deadline has passed."""
+        if self.expired:
+            raise DeadlineExceededError(
+                f"The run did not complete within {self.timeout} seconds."
+            )
+
+
+def remaining_time(deadline: Optional[Deadline]) -> Optional[float]:
+    """Returns the remaining time of the deadline, raising DeadlineExceededError if it has already passed."""
+    if deadline is None:
+        return None
+    deadline.check()
+    return deadline.remaining()
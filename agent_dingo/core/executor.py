@@ -0,0 +1,378 @@
+from typing import Any, Callable, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import deque
+from contextlib import contextmanager
+from contextvars import copy_context
+from functools import partial
+from threading import Lock
+from agent_dingo.core.deadline import Deadline, DeadlineExceededError
+import atexit
+import os
+
+_DEFAULT_MAX_WORKERS = int(os.environ.get("DINGO_MAX_WORKERS", 32))
+# how long `run_first` waits before checking whether the pool is saturated
+_HELP_DELAY = 0.01
+
+
+class _Task:
+    """A unit of work that is executed exactly once, either by a pool worker or by the thread waiting for it."""
+
+    __slots__ = ("fn", "future", "context", "_claimed", "_lock")
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+        # the task runs in the context of the thread that created it, whichever thread executes it
+        self.context = copy_context()
+        self.future = Future()
+        self._claimed = False
+        self._lock = Lock()
+
+    @property
+    def claimed(self) -> bool:
+        return self._claimed
+
+    def claim(self) -> bool:
+        with self._lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def run(self) -> None:
+        try:
+            result = self.context.run(self.fn)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class BlockExecutor:
+    def __init__(
+        self,
+        max_workers: int = _DEFAULT_MAX_WORKERS,
+        max_concurrency_per_block: Optional[int] = None,
+    ):
+        """
+        A bounded thread pool shared by all the blocks that execute their branches concurrently (e.g. Parallel).
+
+        A thread that waits for its branches also executes the branches that were not picked up by the pool yet.
+        This keeps nested parallel blocks deadlock-free even when all the workers are busy.
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            maximum number of worker threads, by default 32 (can be overridden with the DINGO_MAX_WORKERS environment variable)
+        max_concurrency_per_block : Optional[int], optional
+            default maximum number of branches of a single block that are executed at the same time, by default None (unbounded)
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive integer")
+        if max_concurrency_per_block is not None and max_concurrency_per_block < 1:
+            raise ValueError("max_concurrency_per_block must be a positive integer")
+        self.max_workers = max_workers
+        self.max_concurrency_per_block = max_concurrency_per_block
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dingo"
+        )
+        self._lock = Lock()
+        self._queued = 0
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._max_queued = 0
+        self._callers = 0
+        self._is_retired = False
+        self._is_shutdown = False
+
+    def _execute(self, task: _Task, from_pool: bool) -> None:
+        if not task.claim():
+            # the task was already executed by the waiting thread
+            if from_pool:
+                with self._lock:
+                    self._queued -= 1
+            return
+        with self._lock:
+            if from_pool:
+                self._queued -= 1
+            self._active += 1
+        try:
+            task.run()
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+
+    def _submit(self, task: _Task) -> None:
+        with self._lock:
+            if self._is_shutdown:
+                raise RuntimeError("Cannot submit tasks after the executor shutdown.")
+            self._queued += 1
+            self._submitted += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        self._pool.submit(self._execute, task, True)
+
+    @contextmanager
+    def _running(self):
+        with self._lock:
+            if self._is_shutdown:
+                raise RuntimeError("Cannot submit tasks after the executor shutdown.")
+            self._callers += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callers -= 1
+                drained = self._is_retired and self._callers == 0
+            if drained:
+                self.shutdown(wait=False)
+
+    def run_all(
+        self,
+        fns: List[Callable[[], Any]],
+        max_concurrency: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Any]:
+        """Executes the callables concurrently and returns their results in order.
+
+        Parameters
+        ----------
+        fns : List[Callable[[], Any]]
+            callables without arguments to execute
+        max_concurrency : Optional[int], optional
+            maximum number of callables executed at the same time, by default the executor-wide `max_concurrency_per_block`
+        deadline : Optional[Deadline], optional
+            once the deadline passes, the callables that have not started yet are skipped and the remaining ones are no longer awaited, by default None
+
+        Returns
+        -------
+        List[Any]
+            results of the callables in the same order
+
+        Raises
+        ------
+        DeadlineExceededError
+            the deadline passed before all the callables completed
+        Exception
+            the exception raised by the first (in order) failed callable
+        """
+        with self._running():
+            return self._run_all(fns, max_concurrency, deadline)
+
+    def _run_all(
+        self,
+        fns: List[Callable[[], Any]],
+        max_concurrency: Optional[int],
+        deadline: Optional[Deadline],
+    ) -> List[Any]:
+        limit = max_concurrency or self.max_concurrency_per_block or len(fns)
+        tasks = [_Task(fn) for fn in fns]
+        pending = deque(tasks)
+        in_flight = []
+        while pending or in_flight:
+            while pending and len(in_flight) < limit:
+                task = pending.popleft()
+                self._submit(task)
+                in_flight.append(task)
+            # help the pool by executing the tasks that have not been picked up yet
+            for task in in_flight:
+                self._execute(task, False)
+            done, _ = wait(
+                [t.future for t in in_flight],
+                timeout=deadline.remaining() if deadline is not None else None,
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                # the deadline has passed; running threads cannot be interrupted, they are expected to check the deadline themselves
+                for task in tasks:
+                    if task.claim():
+                        task.future.cancel()
+                raise DeadlineExceededError(
+                    f"The run did not complete within {deadline.timeout} seconds."
+                )
+            in_flight = [t for t in in_flight if t.future not in done]
+        for task in tasks:
+            exc = task.future.exception()
+            if exc is not None:
+                raise exc
+        return [task.future.result() for task in tasks]
+
+    def run_first(
+        self,
+        fns: List[Callable[[], Any]],
+        n: int = 1,
+        max_concurrency: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Tuple[int, Any]]:
+        """Executes the callables concurrently and returns as soon as `n` of them have completed successfully.
+        The callables that have not started yet are skipped; the running ones cannot be interrupted and complete in the background.
+
+        Parameters
+        ----------
+        fns : List[Callable[[], Any]]
+            callables without arguments to execute
+        n : int, optional
+            number of successful results to wait for, by default 1
+        max_concurrency : Optional[int], optional
+            maximum number of callables executed at the same time, by default the executor-wide `max_concurrency_per_block`
+        deadline : Optional[Deadline], optional
+            deadline after which the results are no longer awaited, by default None
+
+        Returns
+        -------
+        List[Tuple[int, Any]]
+            (index, result) of the first `n` successful callables in the completion order
+
+        Raises
+        ------
+        DeadlineExceededError
+            the deadline passed before `n` callables completed
+        Exception
+            the exception raised by the first failed callable if fewer than `n` callables succeeded
+        """
+        with self._running():
+            return self._run_first(fns, n, max_concurrency, deadline)
+
+    def _run_first(
+        self,
+        fns: List[Callable[[], Any]],
+        n: int,
+        max_concurrency: Optional[int],
+        deadline: Optional[Deadline],
+    ) -> List[Tuple[int, Any]]:
+        limit = max_concurrency or self.max_concurrency_per_block or len(fns)
+        # the outcomes are recorded before the futures are resolved, so they are visible once `wait` returns
+        successes: List[Tuple[int, Any]] = []
+        errors: List[BaseException] = []
+
+        def record(index: int, fn: Callable[[], Any]) -> Any:
+            try:
+                result = fn()
+            except BaseException as e:
+                errors.append(e)
+                raise
+            successes.append((index, result))
+            return result
+
+        tasks = [_Task(partial(record, i, fn)) for i, fn in enumerate(fns)]
+        pending = deque(tasks)
+        in_flight = []
+        try:
+            while len(successes) < n and (pending or in_flight):
+                while pending and len(in_flight) < limit:
+                    task = pending.popleft()
+                    self._submit(task)
+                    in_flight.append(task)
+                timeout = deadline.remaining() if deadline is not None else None
+                done, _ = wait(
+                    [t.future for t in in_flight],
+                    timeout=(
+                        _HELP_DELAY if timeout is None else min(timeout, _HELP_DELAY)
+                    ),
+                    return_when=FIRST_COMPLETED,
+                )
+                if not done:
+                    if deadline is not None and deadline.expired:
+                        raise DeadlineExceededError(
+                            f"The run did not complete within {deadline.timeout} seconds."
+                        )
+                    # none of the callables was picked up by the (saturated) pool, so one of them is executed by this thread
+                    if not any(t.claimed for t in in_flight):
+                        self._execute(in_flight[0], False)
+                    continue
+                in_flight = [t for t in in_flight if t.future not in done]
+        finally:
+            for task in tasks:
+                if task.claim():
+                    task.future.cancel()
+        if len(successes) < n:
+            raise errors[0]
+        return successes[:n]
+
+    def get_stats(self) -> dict:
+        """Returns the current queue and utilization metrics of the executor."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self._queued,
+                "active": self._active,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "max_queued": self._max_queued,
+            }
+
+    def retire(self) -> None:
+        """Shuts down the executor once the calls that are already running complete. Until then, they can still submit tasks."""
+        with self._lock:
+            self._is_retired = True
+            drained = self._callers == 0
+        if drained:
+            self.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shuts down the underlying pool. Tasks that are already queued are still executed.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            whether to block until all the running tasks are completed, by default True
+        """
+        with self._lock:
+            self._is_shutdown = True
+        self._pool.shutdown(wait=wait)
+
+
+_executor: Optional[BlockExecutor] = None
+_executor_lock = Lock()
+
+
+def get_executor() -> BlockExecutor:
+    """Returns the process-wide executor, creating it with the default configuration if needed."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = BlockExecutor()
+        return _executor
+
+
+def configure_executor(
+    max_workers: int = _DEFAULT_MAX_WORKERS,
+    max_concurrency_per_block: Optional[int] = None,
+) -> BlockExecutor:
+    """Replaces the process-wide executor. The previous executor (if any) is shut down once the calls running on it complete.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        maximum number of worker threads, by default 32
+    max_concurrency_per_block : Optional[int], optional
+        default maximum number of concurrent branches per block, by default None
+
+    Returns
+    -------
+    BlockExecutor
+        the new executor
+    """
+    global _executor
+    with _executor_lock:
+        previous = _executor
+        _executor = BlockExecutor(
+            max_workers=max_workers,
+            max_concurrency_per_block=max_concurrency_per_block,
+        )
+    if previous is not None:
+        previous.retire()
+    return _executor
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Shuts down the process-wide executor. A new one is created on the next use."""
+    global _executor
+    with _executor_lock:
+        previous = _executor
+        _executor = None
+    if previous is not None:
+        previous.shutdown(wait=wait)
+
+
+atexit.register(shutdown_executor)
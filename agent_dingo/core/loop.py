@@ -0,0 +1,225 @@
+from typing import Any, Coroutine, Optional
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+)
+from contextvars import ContextVar, copy_context
+from threading import Event, Lock, Thread
+from agent_dingo.core.deadline import Deadline, DeadlineExceededError
+import asyncio
+import atexit
+import threading
+
+# the background loop that executes the current code, directly or through the sync code called by its coroutines
+_current_loop: ContextVar[Optional["BackgroundLoop"]] = ContextVar(
+    "dingo_current_loop", default=None
+)
+
+
+class BackgroundLoop:
+    def __init__(self, name: str = "dingo-loop"):
+        """
+        A long-lived event loop running in a dedicated daemon thread.
+        The sync code paths use it to execute coroutines without creating a new event loop for each call,
+        so the async clients keep their pooled connections and the calls work even if the calling thread already runs a loop.
+
+        A coroutine running on the loop can call sync code that calls `run` again. Blocking on the loop would deadlock in this case,
+        so the nested coroutine is executed on a temporary loop instead. The nesting is tracked with a context variable,
+        which is propagated to the threads of the block executor and the tool pools, but not to the threads created by the user code;
+        a nested call from such a thread blocks until its deadline.
+
+        Parameters
+        ----------
+        name : str, optional
+            name of the thread, by default "dingo-loop"
+        """
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[Thread] = None
+        self._lock = Lock()
+        self._is_shutdown = False
+
+    def _run_loop(self, started: Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        started.set()
+        self._loop.run_forever()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._is_shutdown:
+                raise RuntimeError("Cannot submit coroutines after the loop shutdown.")
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                started = Event()
+                self._thread = Thread(
+                    target=self._run_loop, args=(started,), name=self.name, daemon=True
+                )
+                self._thread.start()
+                started.wait()
+            return self._loop
+
+    @property
+    def is_loop_thread(self) -> bool:
+        """True if called from the thread of the loop."""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    @property
+    def is_nested(self) -> bool:
+        """True if called (possibly from another thread) by a coroutine that runs on the loop."""
+        return self.is_loop_thread or _current_loop.get() is self
+
+    async def _run_owned(self, coro: Coroutine) -> Any:
+        _current_loop.set(self)
+        return await coro
+
+    def _run_on_temporary_loop(
+        self, coro: Coroutine, deadline: Optional[Deadline] = None
+    ) -> Any:
+        async def run_until_deadline():
+            task = asyncio.ensure_future(coro)
+            timeout = deadline.remaining() if deadline is not None else None
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if not done:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise DeadlineExceededError(
+                    f"The run did not complete within {deadline.timeout} seconds."
+                )
+            return task.result()
+
+        def target():
+            # the coroutines of the temporary loop are still blocking this loop
+            _current_loop.set(self)
+            return asyncio.run(run_until_deadline())
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(copy_context().run, target).result()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedules the coroutine on the loop. Can be called from any thread.
+
+        Parameters
+        ----------
+        coro : Coroutine
+            coroutine to execute
+
+        Returns
+        -------
+        Future
+            future of the result of the coroutine
+        """
+        try:
+            loop = self._get_loop()
+        except BaseException:
+            coro.close()
+            raise
+        return asyncio.run_coroutine_threadsafe(self._run_owned(coro), loop)
+
+    def run(self, coro: Coroutine, deadline: Optional[Deadline] = None) -> Any:
+        """Executes the coroutine on the loop and blocks until it completes.
+
+        Parameters
+        ----------
+        coro : Coroutine
+            coroutine to execute
+        deadline : Optional[Deadline], optional
+            once the deadline passes, the coroutine is cancelled, by default None
+
+        Returns
+        -------
+        Any
+            result of the coroutine
+
+        Raises
+        ------
+        DeadlineExceededError
+            the coroutine did not complete before the deadline
+        """
+        if self.is_nested:
+            # blocking the loop on itself would deadlock, so the coroutine gets a temporary loop in another thread
+            return self._run_on_temporary_loop(coro, deadline)
+        future = self.submit(coro)
+        try:
+            return future.result(
+                timeout=deadline.remaining() if deadline is not None else None
+            )
+        except FutureTimeoutError as e:
+            if future.done():
+                # the result arrived right after the timeout
+                return future.result()
+            future.cancel()
+            raise DeadlineExceededError(
+                f"The run did not complete within {deadline.timeout} seconds."
+            ) from e
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cancels the pending coroutines and stops the loop.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            whether to block until the thread of the loop exits, by default True
+        """
+        with self._lock:
+            self._is_shutdown = True
+            loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+
+        async def _cancel_all():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            loop.stop()
+
+        if thread.is_alive():
+            asyncio.run_coroutine_threadsafe(_cancel_all(), loop)
+        if wait and not self.is_loop_thread:
+            thread.join()
+            loop.close()
+
+
+_background_loop: Optional[BackgroundLoop] = None
+_background_loop_lock = Lock()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Returns the process-wide background loop, creating it if needed."""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+        return _background_loop
+
+
+def run_sync(coro: Coroutine, deadline: Optional[Deadline] = None) -> Any:
+    """Executes the coroutine on the process-wide background loop and blocks until it completes.
+
+    Parameters
+    ----------
+    coro : Coroutine
+        coroutine to execute
+    deadline : Optional[Deadline], optional
+        once the deadline passes, the coroutine is cancelled, by default None
+
+    Returns
+    -------
+    Any
+        result of the coroutine
+    """
+    return get_background_loop().run(coro, deadline)
+
+
+def shutdown_background_loop(wait: bool = True) -> None:
+    """Shuts down the process-wide background loop. A new one is created on the next use."""
+    global _background_loop
+    with _background_loop_lock:
+        previous = _background_loop
+        _background_loop = None
+    if previous is not None:
+        previous.shutdown(wait=wait)
+
+
+atexit.register(shutdown_background_loop)
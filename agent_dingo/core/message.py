@@ -1,29 +1,47 @@
 class Message:
-    """A base class to represent a message."""
+    """A base class to represent a message.
+
+    Messages are immutable, so they can be shared between prompts; their serialized form is built once and cached,
+    and the callers receive copies of it.
+    The role is a class-level constant of every message type.
+    """
+
+    __slots__ = ("_content", "_dict")
 
     role: str = "undefined"
 
     def __init__(self, content: str):
-        self.content = content
+        self._content = content
+        self._dict = None
+
+    @property
+    def content(self) -> str:
+        return self._content
 
     def __repr__(self):
         return f'Message(role="{self.role}" content="{self.content}")'
 
+    def _get_dict(self) -> dict:
+        # the cached dict is shared by the prompts and is never handed out
+        if self._dict is None:
+            self._dict = {"role": self.role, "content": self._content}
+        return self._dict
+
     @property
-    def dict(self):
-        return {"role": self.role, "content": self.content}
+    def dict(self) -> dict:
+        return dict(self._get_dict())
 
 
 class UserMessage(Message):
+    __slots__ = ()
     role = "user"
-    pass
 
 
 class SystemMessage(Message):
+    __slots__ = ()
     role = "system"
-    pass
 
 
 class AssistantMessage(Message):
+    __slots__ = ()
     role = "assistant"
-    pass
@@ -0,0 +1,243 @@
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from threading import Lock
+from agent_dingo.core.deadline import DeadlineExceededError
+import asyncio
+import random
+import time
+
+T = TypeVar("T")
+
+_RETRYABLE_STATUS_CODES = (408, 409, 429)
+_RETRYABLE_ERROR_NAMES = ("APIConnectionError", "APITimeoutError")
+
+
+def _get_status_code(e: BaseException) -> Optional[int]:
+    # openai/litellm errors expose `status_code`, google api errors expose `code`
+    for status_code in (
+        getattr(e, "status_code", None),
+        getattr(getattr(e, "response", None), "status_code", None),
+        getattr(e, "code", None),
+    ):
+        if isinstance(status_code, int):
+            return status_code
+    return None
+
+
+def is_retryable_error(e: BaseException) -> bool:
+    """Returns True for transient errors: timeouts, connection errors, HTTP 408/409/429 and 5xx."""
+    if isinstance(e, DeadlineExceededError):
+        return False
+    status_code = _get_status_code(e)
+    if status_code is not None:
+        return status_code in _RETRYABLE_STATUS_CODES or status_code >= 500
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in _RETRYABLE_ERROR_NAMES for cls in type(e).__mro__)
+
+
+def get_retry_after(e: BaseException) -> Optional[float]:
+    """Returns the delay requested by the server via the `Retry-After` (or `Retry-After-Ms`) header, if any."""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(float(value) / 1000, 0.0)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            date = parsedate_to_datetime(value)
+            return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    def __init__(self, ratio: float = 0.1, burst: int = 10):
+        """
+        Limits the number of retries relative to the number of requests, so that retries cannot multiply the load during an outage.
+
+        Every request deposits `ratio` tokens and every retry withdraws one; the balance is capped at `burst`.
+
+        Parameters
+        ----------
+        ratio : float, optional
+            maximum long-term ratio of retries to requests, by default 0.1
+        burst : int, optional
+            maximum number of retries that can be made in a row, by default 10
+        """
+        if ratio < 0:
+            raise ValueError("ratio must be non-negative")
+        self.ratio = ratio
+        self.burst = burst
+        self._balance = float(burst)
+        self._lock = Lock()
+        self.requests = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self._balance = min(self._balance + self.ratio, self.burst)
+
+    def try_withdraw(self) -> bool:
+        """Returns True if a retry is allowed."""
+        with self._lock:
+            if self._balance < 1:
+                self.rejected += 1
+                return False
+            self._balance -= 1
+            self.retries += 1
+            return True
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "rejected": self.rejected,
+                "balance": self._balance,
+            }
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        budget: Optional[RetryBudget] = None,
+        is_retryable: Callable[[BaseException], bool] = is_retryable_error,
+        respect_retry_after: bool = True,
+    ):
+        """
+        Retries transient errors with exponential backoff and full jitter.
+
+        If the call receives a `timeout`, it is treated as the time available for all the attempts:
+        every attempt receives the remaining time and no retry is scheduled past it.
+
+        Parameters
+        ----------
+        max_attempts : int, optional
+            maximum number of attempts (including the first one), by default 3
+        base_delay : float, optional
+            delay before the first retry (before jitter), doubled with every attempt, by default 0.5
+        max_delay : float, optional
+            maximum delay between the attempts, by default 30.0
+        budget : Optional[RetryBudget], optional
+            retry budget; the process-wide budget is used if not provided, by default None
+        is_retryable : Callable[[BaseException], bool], optional
+            classifies the errors as retryable, by default `is_retryable_error`
+        respect_retry_after : bool, optional
+            whether to wait at least as long as requested by the `Retry-After` header, by default True
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be a positive integer")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or _default_budget
+        self.is_retryable = is_retryable
+        self.respect_retry_after = respect_retry_after
+
+    def get_delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Returns the delay before the retry that follows the given (0-based) attempt."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if self.respect_retry_after and error is not None:
+            retry_after = get_retry_after(error)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _next_delay(
+        self, attempt: int, error: BaseException, expires_at: Optional[float]
+    ) -> Optional[float]:
+        # returns None if the error must be re-raised
+        if attempt + 1 >= self.max_attempts or not self.is_retryable(error):
+            return None
+        delay = self.get_delay(attempt, error)
+        if expires_at is not None and time.monotonic() + delay >= expires_at:
+            return None
+        if not self.budget.try_withdraw():
+            return None
+        return delay
+
+    @staticmethod
+    def _with_remaining_time(kwargs: dict, expires_at: Optional[float]) -> dict:
+        if expires_at is None:
+            return kwargs
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError("No time left for another attempt.")
+        return {**kwargs, "timeout": remaining}
+
+    @staticmethod
+    def _get_expiration(kwargs: dict) -> Optional[float]:
+        timeout = kwargs.get("timeout")
+        return time.monotonic() + timeout if timeout is not None else None
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Calls the function and retries it on transient errors."""
+        self.budget.record_request()
+        expires_at = self._get_expiration(kwargs)
+        attempt = 0
+        while True:
+            try:
+                return fn(*args, **self._with_remaining_time(kwargs, expires_at))
+            except Exception as e:
+                delay = self._next_delay(attempt, e, expires_at)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def async_call(
+        self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any
+    ) -> T:
+        """Awaits the coroutine function and retries it on transient errors."""
+        self.budget.record_request()
+        expires_at = self._get_expiration(kwargs)
+        attempt = 0
+        while True:
+            try:
+                return await fn(*args, **self._with_remaining_time(kwargs, expires_at))
+            except Exception as e:
+                delay = self._next_delay(attempt, e, expires_at)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+_default_budget = RetryBudget()
+_default_policy: Optional[RetryPolicy] = None
+_default_policy_lock = Lock()
+
+
+def get_default_retry_policy() -> RetryPolicy:
+    """Returns the process-wide retry policy used by the LLMs and embedders that were not given an explicit policy."""
+    global _default_policy
+    with _default_policy_lock:
+        if _default_policy is None:
+            _default_policy = RetryPolicy()
+        return _default_policy
+
+
+def set_default_retry_policy(policy: RetryPolicy) -> None:
+    """Replaces the process-wide retry policy.
+
+    Parameters
+    ----------
+    policy : RetryPolicy
+        the new default policy
+    """
+    global _default_policy
+    with _default_policy_lock:
+        _default_policy = policy
@@ -0,0 +1,103 @@
+from typing import Any, Callable, Optional
+from collections import deque
+from threading import Event, Lock
+import asyncio
+
+
+class Waiter:
+    """A pending acquisition of a thread (event) or a coroutine (future of its loop).
+    The value passed to `grant` is available to the waiter once it wakes up."""
+
+    __slots__ = ("granted", "value", "event", "loop", "future")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self.value = None
+        self.loop = loop
+        self.event = Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def grant(self, value: Any = None) -> None:
+        self.value = value
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ConcurrencyLimit:
+    def __init__(self, limit: int):
+        """
+        A FIFO semaphore that can be acquired both by threads and by coroutines running in any event loop.
+
+        Parameters
+        ----------
+        limit : int
+            maximum number of concurrent holders
+        """
+        if limit < 1:
+            raise ValueError("limit must be a positive integer")
+        self.limit = limit
+        self._in_use = 0
+        self._waiters = deque()
+        self._lock = Lock()
+
+    def _try_acquire(self, waiter_factory: Callable[[], Waiter]) -> Optional[Waiter]:
+        with self._lock:
+            if not self._waiters and self._in_use < self.limit:
+                self._in_use += 1
+                return None
+            waiter = waiter_factory()
+            self._waiters.append(waiter)
+            return waiter
+
+    def acquire(self) -> None:
+        """Blocks until the limit allows one more holder."""
+        waiter = self._try_acquire(Waiter)
+        if waiter is not None:
+            waiter.event.wait()
+
+    async def async_acquire(self) -> None:
+        """Waits asynchronously until the limit allows one more holder."""
+        loop = asyncio.get_running_loop()
+        waiter = self._try_acquire(lambda: Waiter(loop))
+        if waiter is None:
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                # the slot was handed over right before the cancellation
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # the slot is handed over to the next waiter
+                self._waiters.popleft().grant()
+            else:
+                self._in_use -= 1
+
+    def __enter__(self) -> "ConcurrencyLimit":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    async def __aenter__(self) -> "ConcurrencyLimit":
+        await self.async_acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
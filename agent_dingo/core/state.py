@@ -1,56 +1,117 @@
-from typing import Union, List, Any
+from __future__ import annotations
+from typing import Union, List, Any, Optional, Iterable, Dict, Tuple, TYPE_CHECKING
 from agent_dingo.core.message import Message
 from threading import Lock
 
+if TYPE_CHECKING:
+    from agent_dingo.core.tracing import Tracer
+    from agent_dingo.core.deadline import Deadline
+    from agent_dingo.core.checkpoint import CheckpointSession
+
 
 class ChatPrompt:
-    def __init__(self, messages: List[Message]):
-        """A collection of messages that are sent to the model.
+    __slots__ = ("_messages", "_wire")
+
+    def __init__(self, messages: Iterable[Message]):
+        """An immutable collection of messages that are sent to the model.
 
         Parameters
         ----------
-        messages : List[Message]
+        messages : Iterable[Message]
             The messages to send to the model.
         """
-        self.messages = messages
+        self._messages = tuple(messages)
+        self._wire = None
 
     @property
-    def dict(self):
-        return [m.dict for m in self.messages]
+    def messages(self) -> Tuple[Message, ...]:
+        return self._messages
+
+    @property
+    def dict(self) -> List[dict]:
+        if self._wire is None:
+            self._wire = tuple(m._get_dict() for m in self._messages)
+        # the callers (e.g. the agent or the backends) are allowed to modify the returned messages
+        return [dict(m) for m in self._wire]
+
+    def append(self, *messages: Message) -> ChatPrompt:
+        """Returns a new prompt with the messages appended. The existing messages and their serialized form are shared.
+
+        Parameters
+        ----------
+        *messages : Message
+            The messages to append.
+
+        Returns
+        -------
+        ChatPrompt
+            The new prompt.
+        """
+        prompt = ChatPrompt.__new__(ChatPrompt)
+        prompt._messages = self._messages + messages
+        prompt._wire = (
+            self._wire + tuple(m._get_dict() for m in messages)
+            if self._wire is not None
+            else None
+        )
+        return prompt
+
+    def __len__(self) -> int:
+        return len(self._messages)
 
     def __repr__(self):
-        return f"ChatPrompt({self.messages})"
+        return f"ChatPrompt({list(self._messages)})"
+
+
+class _FrozenDict(dict):
+    """A dict that cannot be modified. It is still a dict, so it can be serialized (e.g. with json.dumps)."""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("KVData is immutable, use KVData.update to get a new one.")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return _FrozenDict, (dict(self),)
 
 
 class KVData:
+    __slots__ = ("_dict",)
+
     def __init__(self, **kwargs):
-        """A dictionary-like object that stores key-value pairs."""
-        self._dict = {}
-        for k, v in kwargs.items():
-            self._dict[k] = v
+        """An immutable dictionary-like object that stores key-value pairs."""
+        self._dict = _FrozenDict(kwargs)
 
-    def update(self, key: str, value: str):
-        """Update the value of a key.
+    def update(self, key: str, value: str) -> KVData:
+        """Returns a new KVData with the key added. The existing object is not modified.
 
         Parameters
         ----------
         key : str
-            key to update
+            key to add
         value : str
             value to set
+
+        Returns
+        -------
+        KVData
+            the updated data
         """
         if not isinstance(key, str) or not isinstance(value, str):
             raise TypeError("Both key and value must be strings.")
         # make existing keys immutable
         if key in self._dict:
             raise KeyError(f"Key {key} already exists.")
-        self._dict[key] = value
+        return type(self)(**self._dict, **{key: value})
 
     def __getitem__(self, key):
         return self._dict[key]
 
     def __repr__(self):
-        return "KVData({0})".format(str(self._dict))
+        return "KVData({0})".format(str(dict(self._dict)))
 
     def __dict__(self):
         return self._dict
@@ -62,14 +123,17 @@ class KVData:
         return self._dict.values()
 
     @property
-    def dict(self):
-        return self._dict.copy()
+    def dict(self) -> Dict[str, Any]:
+        # the data is immutable, so the same read-only dict is returned on every access
+        return self._dict
 
 
 State = Union[ChatPrompt, KVData]
 
 
 class Context(KVData):
+    __slots__ = ()
+
     def update(self, key, value):
         raise RuntimeError("Context is immutable.")
 
@@ -96,12 +160,30 @@ class UsageMeter:
 
 
 class Store:
-    def __init__(self):
-        """A simple key-value store that stores prompts, data, and other miscellaneous objects for the duration of a single pipeline run."""
+    def __init__(
+        self,
+        tracer: Optional[Tracer] = None,
+        deadline: Optional[Deadline] = None,
+        checkpoint: Optional[CheckpointSession] = None,
+    ):
+        """A simple key-value store that stores prompts, data, and other miscellaneous objects for the duration of a single pipeline run.
+
+        Parameters
+        ----------
+        tracer : Optional[Tracer], optional
+            tracer that records the execution spans of the run, by default None (tracing disabled)
+        deadline : Optional[Deadline], optional
+            deadline of the run, by default None (no deadline)
+        checkpoint : Optional[CheckpointSession], optional
+            checkpointing session of the run, by default None (checkpointing disabled)
+        """
         self._data = {}
         self._prompts = {}
         self._misc = {}
         self.usage_meter = UsageMeter()
+        self.tracer = tracer
+        self.deadline = deadline
+        self.checkpoint = checkpoint
         self._lock = Lock()  # probably not really needed
 
     def _update(self, key: str, item):
@@ -138,3 +220,45 @@ class Store:
     def get_prompt(self, key: str) -> ChatPrompt:
         with self._lock:
             return self._prompts[key]
+
+    def with_usage_meter(self, usage_meter: UsageMeter) -> Store:
+        """Returns a view of the store that shares all the items but records the usage in a separate usage meter.
+
+        Parameters
+        ----------
+        usage_meter : UsageMeter
+            usage meter of the view
+        """
+        store = Store.__new__(Store)
+        store.__dict__.update(self.__dict__)
+        store.usage_meter = usage_meter
+        return store
+
+    def snapshot(self) -> dict:
+        """Returns a shallow copy of the stored items and the usage. The states themselves are immutable and are shared."""
+        with self._lock:
+            return {
+                "prompts": dict(self._prompts),
+                "data": dict(self._data),
+                "misc": dict(self._misc),
+                "usage": {
+                    "prompt_tokens": self.usage_meter.prompt_tokens,
+                    "completion_tokens": self.usage_meter.completion_tokens,
+                },
+            }
+
+    def restore(self, snapshot: dict) -> None:
+        """Restores the stored items and the usage from a snapshot.
+
+        Parameters
+        ----------
+        snapshot : dict
+            snapshot created by `snapshot`
+        """
+        with self._lock:
+            self._prompts.update(snapshot["prompts"])
+            self._data.update(snapshot["data"])
+            self._misc.update(snapshot["misc"])
+        self.usage_meter.increment(
+            snapshot["usage"]["prompt_tokens"], snapshot["usage"]["completion_tokens"]
+        )
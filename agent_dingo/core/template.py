@@ -0,0 +1,81 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from string import Formatter
+import re
+
+_formatter = Formatter()
+_CONVERSIONS = {"r": repr, "s": str, "a": ascii}
+_SIMPLE_FIELD = re.compile(r"[A-Za-z_]\w*")
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+class CompiledTemplate:
+    __slots__ = ("source", "names", "_parts", "_plain", "_formatted", "_fallback")
+
+    def __init__(self, source: str):
+        """
+        A `str.format` template that is parsed once and rendered by filling the placeholder slots and joining the parts.
+
+        Templates with positional, attribute or index fields (e.g. `{0}`, `{a.b}`, `{a[0]}`) or nested format specs
+        are rendered with `str.format` instead.
+
+        Parameters
+        ----------
+        source : str
+            the template
+
+        Raises
+        ------
+        ValueError
+            the template contains an unknown conversion (e.g. `{x!z}`), as `str.format` would raise
+        """
+        self.source = source
+        # literal parts interleaved with the slots of the placeholders (None)
+        self._parts: List[Optional[str]] = []
+        # (slot index, name) of the placeholders without conversion and format spec
+        self._plain: List[Tuple[int, str]] = []
+        # (slot index, name, conversion, format spec) of the remaining placeholders
+        self._formatted: List[Tuple[int, str, Optional[Callable], str]] = []
+        self._fallback = False
+        for literal, name, spec, conversion in _formatter.parse(source):
+            if literal:
+                self._parts.append(literal)
+            if name is None:
+                continue
+            if conversion is not None and conversion not in _CONVERSIONS:
+                raise ValueError(f"Unknown conversion specifier {conversion}")
+            if not _SIMPLE_FIELD.fullmatch(name) or "{" in (spec or ""):
+                self._fallback = True
+                continue
+            if conversion or spec:
+                self._formatted.append(
+                    (len(self._parts), name, _CONVERSIONS.get(conversion), spec or "")
+                )
+            else:
+                self._plain.append((len(self._parts), name))
+            self._parts.append(None)
+        if self._fallback:
+            self.names = frozenset(_PLACEHOLDER.findall(source))
+        else:
+            self.names = frozenset(
+                [name for _, name in self._plain]
+                + [name for _, name, _, _ in self._formatted]
+            )
+
+    @property
+    def is_static(self) -> bool:
+        """True if the template has no placeholders."""
+        return not self.names and not self._fallback
+
+    def render(self, values: Dict[str, Any]) -> str:
+        if self._fallback:
+            return self.source.format(**values)
+        parts = self._parts.copy()
+        for i, name in self._plain:
+            value = values[name]
+            parts[i] = value if value.__class__ is str else format(value)
+        for i, name, conversion, spec in self._formatted:
+            value = values[name]
+            if conversion is not None:
+                value = conversion(value)
+            parts[i] = format(value, spec)
+        return "".join(parts)
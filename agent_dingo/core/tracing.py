@@ -0,0 +1,182 @@
+from typing import Any, Dict, Iterator, List, Optional
+from agent_dingo.core.state import UsageMeter
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from threading import Lock
+import asyncio
+import json
+import os
+import threading
+import time
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    start: float
+    end: float
+    thread_id: int
+    thread_name: str
+    task_id: Optional[int] = None
+    args: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def _current_task_id() -> Optional[int]:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        return None
+    return id(task) if task is not None else None
+
+
+class Tracer:
+    def __init__(self):
+        """
+        Records the execution spans of a pipeline run (blocks, LLM calls, tool calls and retrievals).
+        Pass it to `Pipeline.run`/`Pipeline.async_run` as `_tracer` to enable tracing; it is then available as `store.tracer`.
+        """
+        self.spans: List[Span] = []
+        self._lock = Lock()
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[Dict[str, Any]]:
+        """Records the duration of the enclosed code as a span.
+
+        Parameters
+        ----------
+        name : str
+            name of the span
+        category : str
+            category of the span (e.g. "block", "llm", "tool", "retrieval")
+        **args : Any
+            additional attributes of the span
+
+        Yields
+        ------
+        Dict[str, Any]
+            the attributes of the span, can be updated inside the block
+        """
+        thread = threading.current_thread()
+        task_id = _current_task_id()
+        start = time.perf_counter()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = repr(e)
+            raise
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append(
+                    Span(
+                        name=name,
+                        category=category,
+                        start=start,
+                        end=end,
+                        thread_id=thread.ident,
+                        thread_name=thread.name,
+                        task_id=task_id,
+                        args=args,
+                    )
+                )
+
+    @contextmanager
+    def llm_span(
+        self, name: str, usage_meter: Optional[UsageMeter], **args: Any
+    ) -> Iterator[UsageMeter]:
+        """Records an LLM call as a span together with the number of consumed tokens.
+
+        Parameters
+        ----------
+        name : str
+            name of the span
+        usage_meter : Optional[UsageMeter]
+            usage meter of the run; it is updated once the call is complete
+
+        Yields
+        ------
+        UsageMeter
+            a separate usage meter that must be passed to the LLM call
+        """
+        call_meter = UsageMeter()
+        with self.span(name, "llm", **args) as span_args:
+            try:
+                yield call_meter
+            finally:
+                span_args.update(call_meter.get_usage())
+                if usage_meter is not None:
+                    usage_meter.increment(
+                        call_meter.prompt_tokens, call_meter.completion_tokens
+                    )
+
+    def to_chrome_trace(self) -> dict:
+        """Converts the spans to the Chrome trace event format (can be opened in Perfetto or chrome://tracing).
+
+        Each thread and each asyncio task is shown as a separate track.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        if not spans:
+            return {"traceEvents": []}
+        origin = spans[0].start
+        pid = os.getpid()
+        tracks = {}
+        events = []
+        for span in spans:
+            track = (span.thread_id, span.task_id)
+            if track not in tracks:
+                tracks[track] = len(tracks) + 1
+                track_name = span.thread_name
+                if span.task_id is not None:
+                    track_name += f" / task {span.task_id:x}"
+                events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": pid,
+                        "tid": tracks[track],
+                        "args": {"name": track_name},
+                    }
+                )
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": (span.start - origin) * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": pid,
+                    "tid": tracks[track],
+                    "args": {k: _jsonable(v) for k, v in span.args.items()},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str) -> None:
+        """Writes the Chrome trace JSON to a file.
+
+        Parameters
+        ----------
+        path : str
+            path of the output file
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+def optional_span(tracer: Optional[Tracer], name: str, category: str, **args: Any):
+    """Returns `tracer.span(...)` or a no-op context manager if the tracer is None."""
+    if tracer is None:
+        return nullcontext(args)
+    return tracer.span(name, category, **args)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
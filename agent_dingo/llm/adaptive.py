@@ -0,0 +1,260 @@
+from typing import AsyncIterator, Optional
+from collections import deque
+from threading import Lock
+from agent_dingo.core.blocks import BaseLLM
+from agent_dingo.core.state import UsageMeter
+from agent_dingo.core.semaphore import Waiter
+from agent_dingo.llm.wrapper import BaseLLMWrapper
+import asyncio
+import time
+
+
+def is_throttling_error(e: BaseException) -> bool:
+    """Returns True if the exception signals that the provider is overloaded (HTTP 429 or 5xx)."""
+    status_code = getattr(e, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status_code, int):
+        return status_code == 429 or status_code >= 500
+    return type(e).__name__ in ("RateLimitError", "ServiceUnavailableError")
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        backoff: float = 0.5,
+        latency_tolerance: Optional[float] = None,
+        window: int = 100,
+    ):
+        """
+        Limits the number of in-flight requests and adapts the limit with AIMD (additive increase, multiplicative decrease).
+
+        Every successful request increases the limit by `increase / limit` (i.e. by `increase` per round of requests).
+        A throttling error (HTTP 429/5xx) or, optionally, a latency rising above `latency_tolerance` times the baseline
+        multiplies the limit by `backoff`. Requests that were granted a slot before the last decrease do not decrease the limit again.
+
+        Parameters
+        ----------
+        initial_limit : int, optional
+            initial number of in-flight requests, by default 4
+        min_limit : int, optional
+            lower bound of the limit, by default 1
+        max_limit : int, optional
+            upper bound of the limit, by default 64
+        increase : float, optional
+            additive increase per round of successful requests, by default 1.0
+        backoff : float, optional
+            multiplicative decrease factor, by default 0.5
+        latency_tolerance : Optional[float], optional
+            if set, the limit is also decreased when the smoothed latency exceeds the minimum recent latency by this factor, by default None
+        window : int, optional
+            number of recent latencies used to determine the baseline, by default 100
+        """
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Expected 1 <= min_limit <= initial_limit <= max_limit")
+        if not 0 < backoff < 1:
+            raise ValueError("backoff must be between 0 and 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._waiters = deque()
+        self._epoch = 0
+        self._latencies = deque(maxlen=window)
+        self._smoothed_latency = None
+        self._lock = Lock()
+        self.throttled = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        """Current maximum number of in-flight requests."""
+        return int(self._limit)
+
+    def _try_acquire(self, waiter_factory):
+        # returns (epoch, None) if a slot is available, otherwise (None, waiter)
+        with self._lock:
+            if not self._waiters and self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return self._epoch, None
+            waiter = waiter_factory()
+            self._waiters.append(waiter)
+            return None, waiter
+
+    def _grant_waiters(self) -> None:
+        # must be called with the lock held
+        while self._waiters and self._in_flight < int(self._limit):
+            self._in_flight += 1
+            # the epoch is taken when the slot is granted, so a request that waited through a decrease can decrease the limit again
+            self._waiters.popleft().grant(self._epoch)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._grant_waiters()
+
+    def acquire(self) -> int:
+        """Blocks until a slot is available. Returns the epoch that must be passed to `release`."""
+        epoch, waiter = self._try_acquire(Waiter)
+        if waiter is None:
+            return epoch
+        waiter.event.wait()
+        return waiter.value
+
+    async def async_acquire(self) -> int:
+        """Waits asynchronously until a slot is available. Returns the epoch that must be passed to `release`."""
+        loop = asyncio.get_running_loop()
+        epoch, waiter = self._try_acquire(lambda: Waiter(loop))
+        if waiter is None:
+            return epoch
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                # the slot was handed over right before the cancellation
+                self._release()
+            raise
+        return waiter.value
+
+    def release(
+        self,
+        epoch: int,
+        latency: Optional[float] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Frees the slot and adapts the limit based on the outcome of the request.
+
+        Parameters
+        ----------
+        epoch : int
+            epoch returned by `acquire`
+        latency : Optional[float], optional
+            latency of a successful request, by default None
+        error : Optional[BaseException], optional
+            exception raised by the request, by default None
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if error is not None:
+                if is_throttling_error(error):
+                    self.throttled += 1
+                    self._decrease(epoch)
+            elif latency is not None:
+                if self._is_congested(latency):
+                    self._decrease(epoch)
+                else:
+                    self._limit = min(
+                        self._limit + self.increase / self._limit, self.max_limit
+                    )
+            self._grant_waiters()
+
+    def _is_congested(self, latency: float) -> bool:
+        # must be called with the lock held
+        self._latencies.append(latency)
+        if self._smoothed_latency is None:
+            self._smoothed_latency = latency
+        else:
+            self._smoothed_latency = 0.8 * self._smoothed_latency + 0.2 * latency
+        if self.latency_tolerance is None:
+            return False
+        baseline = min(self._latencies)
+        return self._smoothed_latency > self.latency_tolerance * baseline
+
+    def _decrease(self, epoch: int) -> None:
+        # must be called with the lock held
+        if epoch != self._epoch:
+            return
+        self._epoch += 1
+        self.decreases += 1
+        self._limit = max(self._limit * self.backoff, self.min_limit)
+
+    def get_stats(self) -> dict:
+        """Returns the current limit, the number of in-flight and waiting requests and the throttling counters."""
+        with self._lock:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiters),
+                "throttled": self.throttled,
+                "decreases": self.decreases,
+                "smoothed_latency": self._smoothed_latency,
+            }
+
+
+class AdaptiveConcurrencyLLM(BaseLLMWrapper):
+    def __init__(self, llm: BaseLLM, limiter: Optional[AdaptiveLimiter] = None):
+        """
+        Wraps an LLM and adapts the number of its concurrent requests to the throttling signals of the provider.
+        Requests above the current limit wait for a free slot.
+
+        Parameters
+        ----------
+        llm : BaseLLM
+            llm to wrap
+        limiter : Optional[AdaptiveLimiter], optional
+            limiter to use; it can be shared between several llms that use the same quota, by default a new AdaptiveLimiter
+        """
+        super().__init__(llm)
+        self.limiter = limiter or AdaptiveLimiter()
+
+    @property
+    def limit(self) -> int:
+        return self.limiter.limit
+
+    def send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        epoch = self.limiter.acquire()
+        start = time.perf_counter()
+        try:
+            response = self.llm.send_message(messages, functions, usage_meter, **kwargs)
+        except BaseException as e:
+            self.limiter.release(epoch, error=e)
+            raise
+        self.limiter.release(epoch, latency=time.perf_counter() - start)
+        return response
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        epoch = await self.limiter.async_acquire()
+        start = time.perf_counter()
+        try:
+            response = await self.llm.async_send_message(
+                messages, functions, usage_meter, **kwargs
+            )
+        except BaseException as e:
+            self.limiter.release(epoch, error=e)
+            raise
+        self.limiter.release(epoch, latency=time.perf_counter() - start)
+        return response
+
+    async def async_stream_message(
+        self, messages, usage_meter: UsageMeter = None, **kwargs
+    ) -> AsyncIterator[str]:
+        epoch = await self.limiter.async_acquire()
+        try:
+            async for chunk in self.llm.async_stream_message(
+                messages, usage_meter, **kwargs
+            ):
+                yield chunk
+        except BaseException as e:
+            self.limiter.release(epoch, error=e)
+            raise
+        # the duration of a stream depends on the output length, it is not used as a latency signal
+        self.limiter.release(epoch)
+
+    def get_stats(self) -> dict:
+        """Returns the statistics of the underlying limiter."""
+        return self.limiter.get_stats()
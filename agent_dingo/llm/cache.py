@@ -0,0 +1,418 @@
+from typing import Any, AsyncIterator, Iterator, Optional, Tuple
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock, local
+from agent_dingo.core.blocks import BaseLLM
+from agent_dingo.core.state import UsageMeter
+from agent_dingo.llm.wrapper import BaseLLMWrapper
+from agent_dingo.llm.router import RouterLLM
+import copy
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+
+
+class BaseCache(ABC):
+    """Base class for the key-value storages of the LLM responses."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+
+class InMemoryCache(BaseCache):
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        """
+        Thread-safe in-memory LRU cache with an optional time-to-live.
+
+        Parameters
+        ----------
+        max_size : int, optional
+            maximum number of entries, by default 1024
+        ttl : Optional[float], optional
+            time-to-live of an entry in seconds, by default None (entries do not expire)
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(
+        self,
+        path: str,
+        max_size_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        compress: bool = False,
+        timeout: float = 30.0,
+        touch_interval: float = 60.0,
+    ):
+        """
+        Persistent cache stored in a single SQLite file that can be shared by multiple processes.
+        The database is opened in WAL mode, so readers do not block writers.
+        The values must be JSON-serializable.
+
+        Parameters
+        ----------
+        path : str
+            path to the database file
+        max_size_bytes : Optional[int], optional
+            maximum total size of the stored values; least recently used entries are evicted first, by default None (unbounded)
+        ttl : Optional[float], optional
+            time-to-live of an entry in seconds, by default None (entries do not expire)
+        compress : bool, optional
+            whether to compress the stored values with zlib, by default False
+        timeout : float, optional
+            how long to wait for a lock held by another connection, by default 30.0
+        touch_interval : float, optional
+            the access time of an entry is only updated on a hit if it is older than this number of seconds,
+            so most reads do not need a write transaction; the eviction order is approximate within this interval, by default 60.0
+        """
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.ttl = ttl
+        self.compress = compress
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+        self._local = local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, compressed INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _encode(self, value: Any) -> Tuple[bytes, bool]:
+        data = json.dumps(value).encode()
+        if self.compress:
+            return zlib.compress(data), True
+        return data, False
+
+    @staticmethod
+    def _decode(data: bytes, compressed: bool) -> Any:
+        if compressed:
+            data = zlib.decompress(data)
+        return json.loads(data)
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and created_at + self.ttl < now
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, compressed, created_at, accessed_at FROM entries WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        if self._is_expired(row[2], now):
+            with conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        if now - row[3] > self.touch_interval:
+            with conn:
+                conn.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+        return self._decode(row[0], bool(row[1]))
+
+    def set(self, key: str, value: Any) -> None:
+        data, compressed = self._encode(value)
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, data, int(compressed), len(data), now, now),
+            )
+            if self.max_size_bytes is not None:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS total FROM entries) "
+            "WHERE total > ?)",
+            (self.max_size_bytes,),
+        )
+
+    def items(self, limit: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+        """Iterates over the non-expired entries, starting with the most recently used.
+
+        Parameters
+        ----------
+        limit : Optional[int], optional
+            maximum number of entries to return, by default None
+        """
+        now = time.time()
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT key, value, compressed, created_at FROM entries ORDER BY accessed_at DESC LIMIT ?",
+                (-1 if limit is None else limit,),
+            )
+            .fetchall()
+        )
+        for key, data, compressed, created_at in rows:
+            if not self._is_expired(created_at, now):
+                yield key, self._decode(data, bool(compressed))
+
+    def clear(self) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM entries")
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class TieredCache(BaseCache):
+    def __init__(
+        self, front: BaseCache, back: SQLiteCache, warm_start: Optional[int] = None
+    ):
+        """
+        Two-level cache: a fast (usually in-memory) front cache backed by a persistent cache.
+        Writes go to both levels; misses in the front cache are served from (and promoted from) the back cache.
+
+        Parameters
+        ----------
+        front : BaseCache
+            fast cache, e.g. InMemoryCache
+        back : SQLiteCache
+            persistent cache
+        warm_start : Optional[int], optional
+            number of the most recently used persistent entries to preload into the front cache, by default None
+        """
+        self.front = front
+        self.back = back
+        if warm_start:
+            # the most recently used entries are inserted last to keep them at the top of the LRU
+            for key, value in reversed(list(back.items(limit=warm_start))):
+                front.set(key, value)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.front.get(key)
+        if value is None:
+            value = self.back.get(key)
+            if value is not None:
+                self.front.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.front.set(key, value)
+        self.back.set(key, value)
+
+    def clear(self) -> None:
+        self.front.clear()
+        self.back.clear()
+
+
+def _model_id(llm: BaseLLM) -> str:
+    model = getattr(llm, "model", None)
+    if isinstance(model, str):
+        return model
+    # e.g. llama.cpp models are objects that are loaded from a file
+    return getattr(model, "model_path", None) or type(llm).__name__
+
+
+def make_request_key(
+    messages, functions=None, model: Optional[str] = None, **kwargs
+) -> str:
+    """Computes a stable hash of an LLM request.
+
+    Parameters
+    ----------
+    messages : list
+        messages to send
+    functions : list, optional
+        functions (tools) available to the LLM, by default None
+    model : Optional[str], optional
+        model identifier, by default None
+    **kwargs
+        remaining generation parameters (e.g. temperature)
+
+    Returns
+    -------
+    str
+        sha256 hex digest of the request
+    """
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "functions": functions,
+            "kwargs": kwargs,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CachedLLM(BaseLLMWrapper):
+    def __init__(
+        self,
+        llm: BaseLLM,
+        cache: Optional[BaseCache] = None,
+        cache_nonzero_temperature: bool = False,
+        model_id: Optional[str] = None,
+    ):
+        """
+        Wraps an LLM and caches its responses. Cache hits do not consume any tokens.
+
+        If the wrapped LLM is a RouterLLM, the route is selected for each request: the cache key includes the name and the model of the route,
+        and the temperature of the route decides whether the response is cached.
+
+        Parameters
+        ----------
+        llm : BaseLLM
+            llm to wrap
+        cache : Optional[BaseCache], optional
+            storage of the responses, by default an InMemoryCache with default settings
+        cache_nonzero_temperature : bool, optional
+            whether to cache the responses generated with a non-zero temperature, by default False
+        model_id : Optional[str], optional
+            model identifier used as a part of the cache key, by default inferred from the llm
+        """
+        super().__init__(llm)
+        self.cache = cache if cache is not None else InMemoryCache()
+        self.cache_nonzero_temperature = cache_nonzero_temperature
+        self.model_id = model_id or _model_id(llm)
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def _get_key(self, messages, functions, kwargs) -> Optional[str]:
+        kwargs = dict(kwargs)
+        # the timeout depends on the deadline of the run and does not affect the response
+        kwargs.pop("timeout", None)
+        llm, model_id = self.llm, self.model_id
+        if isinstance(llm, RouterLLM):
+            # the response depends on the route that the router selects for the request
+            name, _ = llm.select_route(messages, functions)
+            llm = llm.routes[name]
+            model_id = f"{model_id}/{name}:{_model_id(llm)}"
+        # the backends treat a zero temperature as unset and apply their default instead
+        temperature = kwargs.pop("temperature", None) or getattr(
+            llm, "temperature", None
+        )
+        if temperature and not self.cache_nonzero_temperature:
+            return None
+        return make_request_key(
+            messages, functions, model_id, temperature=temperature, **kwargs
+        )
+
+    def _lookup(self, key: Optional[str]) -> Optional[dict]:
+        if key is None:
+            return None
+        response = self.cache.get(key)
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return copy.deepcopy(response)
+
+    def _store(self, key: Optional[str], response: dict) -> None:
+        if key is not None:
+            self.cache.set(key, copy.deepcopy(response))
+
+    def send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        key = self._get_key(messages, functions, kwargs)
+        response = self._lookup(key)
+        if response is None:
+            response = self.llm.send_message(messages, functions, usage_meter, **kwargs)
+            self._store(key, response)
+        return response
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        key = self._get_key(messages, functions, kwargs)
+        response = self._lookup(key)
+        if response is None:
+            response = await self.llm.async_send_message(
+                messages, functions, usage_meter, **kwargs
+            )
+            self._store(key, response)
+        return response
+
+    async def async_stream_message(
+        self, messages, usage_meter: UsageMeter = None, **kwargs
+    ) -> AsyncIterator[str]:
+        key = self._get_key(messages, None, kwargs)
+        response = self._lookup(key)
+        if response is not None:
+            yield response["content"]
+            return
+        chunks = []
+        async for chunk in self.llm.async_stream_message(
+            messages, usage_meter, **kwargs
+        ):
+            chunks.append(chunk)
+            yield chunk
+        self._store(key, {"role": "assistant", "content": "".join(chunks)})
+
+    def get_stats(self) -> dict:
+        """Returns the number of cache hits and misses."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,194 @@
+from typing import Literal, Optional
+from concurrent.futures import Future
+from threading import Lock
+from agent_dingo.core.blocks import BaseLLM
+from agent_dingo.core.state import UsageMeter
+from agent_dingo.llm.wrapper import BaseLLMWrapper
+from agent_dingo.llm.cache import make_request_key, _model_id
+import asyncio
+import copy
+
+UsagePolicy = Literal["leader", "all", "split"]
+
+
+class _LeaderCancelled(Exception):
+    pass
+
+
+class _Flight:
+    __slots__ = ("future", "callers", "follower_share")
+
+    def __init__(self):
+        self.future = Future()
+        self.callers = 1
+        self.follower_share = (0, 0)
+
+    def set_result(self, response) -> None:
+        if not self.future.done():
+            self.future.set_result(response)
+
+    def set_exception(self, e: BaseException) -> None:
+        if not self.future.done():
+            self.future.set_exception(e)
+
+
+class CoalescingLLM(BaseLLMWrapper):
+    def __init__(self, llm: BaseLLM, usage_policy: UsagePolicy = "leader"):
+        """
+        Wraps an LLM and merges identical concurrent requests into a single call (single-flight).
+        Sync and async callers share the in-flight calls.
+
+        Parameters
+        ----------
+        llm : BaseLLM
+            llm to wrap
+        usage_policy : UsagePolicy, optional
+            defines how the usage of a shared call is recorded:
+            "leader" charges only the caller that issued the call (reflects the actual spend),
+            "all" charges every caller the full usage (as if each of them issued the call),
+            "split" divides the usage evenly between the callers; by default "leader"
+        """
+        if usage_policy not in ("leader", "all", "split"):
+            raise ValueError(
+                f"usage_policy must be one of 'leader', 'all', 'split', got {usage_policy}"
+            )
+        super().__init__(llm)
+        self.usage_policy = usage_policy
+        self.model_id = _model_id(llm)
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = Lock()
+
+    def _get_key(self, messages, functions, kwargs) -> str:
+        kwargs = dict(kwargs)
+        # the timeout depends on the deadline of the run and does not affect the response
+        kwargs.pop("timeout", None)
+        temperature = kwargs.pop("temperature", None)
+        if temperature is None:
+            temperature = self.temperature
+        return make_request_key(
+            messages, functions, self.model_id, temperature=temperature, **kwargs
+        )
+
+    def _join(self, key: str):
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                flight.callers += 1
+                self.coalesced += 1
+        return flight, is_leader
+
+    def _leave(self, key: str, flight: _Flight) -> None:
+        # a cancelled follower does not receive the response, so it does not get a share of the usage
+        with self._lock:
+            if self._flights.get(key) is flight:
+                flight.callers -= 1
+
+    def _land(self, key: str, flight: _Flight) -> int:
+        # after the flight is removed, no new callers can join it
+        with self._lock:
+            del self._flights[key]
+            return flight.callers
+
+    def _charge(
+        self,
+        usage: UsageMeter,
+        flight: _Flight,
+        callers: int,
+        meter: Optional[UsageMeter],
+    ) -> None:
+        # charges the leader and stores the share of each follower, which is charged once the follower receives the response
+        if self.usage_policy == "leader":
+            leader_share = (usage.prompt_tokens, usage.completion_tokens)
+            flight.follower_share = (0, 0)
+        elif self.usage_policy == "all":
+            leader_share = (usage.prompt_tokens, usage.completion_tokens)
+            flight.follower_share = leader_share
+        else:
+            p, p_rem = divmod(usage.prompt_tokens, callers)
+            c, c_rem = divmod(usage.completion_tokens, callers)
+            # the leader gets the remainder
+            leader_share = (p + p_rem, c + c_rem)
+            flight.follower_share = (p, c)
+        if meter is not None:
+            meter.increment(*leader_share)
+
+    @staticmethod
+    def _charge_follower(flight: _Flight, meter: Optional[UsageMeter]) -> None:
+        if meter is not None:
+            meter.increment(*flight.follower_share)
+
+    def send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        key = self._get_key(messages, functions, kwargs)
+        flight, is_leader = self._join(key)
+        if not is_leader:
+            try:
+                response = flight.future.result()
+            except _LeaderCancelled:
+                return self.send_message(messages, functions, usage_meter, **kwargs)
+            self._charge_follower(flight, usage_meter)
+            return copy.deepcopy(response)
+        usage = UsageMeter()
+        try:
+            response = self.llm.send_message(messages, functions, usage, **kwargs)
+        except BaseException as e:
+            self._land(key, flight)
+            flight.set_exception(e)
+            raise
+        self._charge(usage, flight, self._land(key, flight), usage_meter)
+        flight.set_result(response)
+        # the followers receive copies of the shared response, so the leader does as well
+        return copy.deepcopy(response)
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        key = self._get_key(messages, functions, kwargs)
+        flight, is_leader = self._join(key)
+        if not is_leader:
+            try:
+                # the shield keeps the cancellation of a follower from cancelling the shared future
+                response = await asyncio.shield(asyncio.wrap_future(flight.future))
+            except _LeaderCancelled:
+                return await self.async_send_message(
+                    messages, functions, usage_meter, **kwargs
+                )
+            except asyncio.CancelledError:
+                self._leave(key, flight)
+                raise
+            self._charge_follower(flight, usage_meter)
+            return copy.deepcopy(response)
+        usage = UsageMeter()
+        try:
+            response = await self.llm.async_send_message(
+                messages, functions, usage, **kwargs
+            )
+        except asyncio.CancelledError:
+            # the waiting callers should not be cancelled together with the leader, they retry instead
+            self._land(key, flight)
+            flight.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            self._land(key, flight)
+            flight.set_exception(e)
+            raise
+        self._charge(usage, flight, self._land(key, flight), usage_meter)
+        flight.set_result(response)
+        # the followers receive copies of the shared response, so the leader does as well
+        return copy.deepcopy(response)
+
+    def get_stats(self) -> dict:
+        """Returns the number of issued calls and the number of requests that were merged into them."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+            }
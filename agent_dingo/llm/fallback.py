@@ -0,0 +1,327 @@
+from typing import AsyncIterator, Callable, List, Literal, Optional
+from collections import deque
+from threading import Lock
+from agent_dingo.core.blocks import BaseLLM
+from agent_dingo.core.state import UsageMeter
+from agent_dingo.core.retry import is_retryable_error
+from agent_dingo.core.deadline import Deadline, DeadlineExceededError, remaining_time
+import time
+
+BreakerState = Literal["closed", "open", "half_open"]
+
+
+class NoHealthyBackendError(RuntimeError):
+    """Raised when all the backends of a FallbackLLM are unavailable (their circuit breakers are open)."""
+
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        slow_call_duration: Optional[float] = None,
+        window: int = 20,
+        min_calls: int = 5,
+        open_duration: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        """
+        Stops sending requests to a backend that keeps failing.
+
+        The breaker is closed (requests pass) until the share of failed or slow calls among the last `window` calls
+        reaches `failure_rate_threshold`. It then opens (requests are rejected) for `open_duration` seconds,
+        after which it is half-open: a limited number of probe requests are allowed, and the breaker closes if they succeed
+        or opens again if any of them fails.
+
+        Parameters
+        ----------
+        failure_rate_threshold : float, optional
+            share of failed or slow calls that opens the breaker, by default 0.5
+        slow_call_duration : Optional[float], optional
+            calls that take longer than this number of seconds are counted as failed, by default None (latency is ignored)
+        window : int, optional
+            number of recent calls to consider, by default 20
+        min_calls : int, optional
+            minimum number of calls before the breaker can open, by default 5
+        open_duration : float, optional
+            number of seconds the breaker stays open, by default 30.0
+        half_open_max_calls : int, optional
+            maximum number of concurrent probe calls in the half-open state, by default 1
+        """
+        if not 0 < failure_rate_threshold <= 1:
+            raise ValueError("failure_rate_threshold must be between 0 and 1")
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.min_calls = min_calls
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self._outcomes = deque(maxlen=window)
+        self._state: BreakerState = "closed"
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = Lock()
+        self.times_opened = 0
+
+    @property
+    def state(self) -> BreakerState:
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def _update_state(self) -> None:
+        # must be called with the lock held
+        if (
+            self._state == "open"
+            and time.monotonic() >= self._opened_at + self.open_duration
+        ):
+            self._state = "half_open"
+            self._probes = 0
+
+    def _open(self) -> None:
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def allow_request(self) -> bool:
+        """Returns True if a request can be sent. In the half-open state, the allowed request is a probe."""
+        with self._lock:
+            self._update_state()
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            return False
+
+    def _record(self, failed: bool) -> None:
+        with self._lock:
+            if self._state == "half_open":
+                self._probes = max(self._probes - 1, 0)
+                if failed:
+                    self._open()
+                else:
+                    self._state = "closed"
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls:
+                failure_rate = sum(self._outcomes) / len(self._outcomes)
+                if failure_rate >= self.failure_rate_threshold:
+                    self._open()
+                    self._outcomes.clear()
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        """Records a successful call; a call slower than `slow_call_duration` is counted as failed."""
+        slow = (
+            self.slow_call_duration is not None
+            and latency is not None
+            and latency > self.slow_call_duration
+        )
+        self._record(slow)
+
+    def record_failure(self) -> None:
+        """Records a failed call."""
+        self._record(True)
+
+    def release(self) -> None:
+        """Releases a request that neither succeeded nor failed because of the backend (e.g. an invalid request)."""
+        with self._lock:
+            if self._state == "half_open" and self._probes > 0:
+                self._probes -= 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            self._update_state()
+            return {
+                "state": self._state,
+                "times_opened": self.times_opened,
+                "failure_rate": (
+                    sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+                ),
+            }
+
+
+def _get_deadline(kwargs: dict) -> Optional[Deadline]:
+    # the timeout covers all the attempts, not each of them
+    timeout = kwargs.get("timeout")
+    if timeout is None:
+        return None
+    if timeout <= 0:
+        raise DeadlineExceededError("No time is left for the request.")
+    return Deadline(timeout)
+
+
+def _get_attempt_kwargs(deadline: Optional[Deadline], kwargs: dict) -> dict:
+    if deadline is None:
+        return kwargs
+    return {**kwargs, "timeout": remaining_time(deadline)}
+
+
+class FallbackLLM(BaseLLM):
+    def __init__(
+        self,
+        llms: List[BaseLLM],
+        breakers: Optional[List[CircuitBreaker]] = None,
+        is_failure: Callable[[BaseException], bool] = is_retryable_error,
+    ):
+        """
+        Sends the requests to the first healthy LLM from an ordered list of backends.
+
+        Every backend has its own circuit breaker. If a backend fails (or its breaker is open), the request is sent to the next one.
+        Errors that are not caused by the backend (e.g. an invalid request) are raised immediately.
+
+        Parameters
+        ----------
+        llms : List[BaseLLM]
+            backends in the order of preference
+        breakers : Optional[List[CircuitBreaker]], optional
+            circuit breakers of the backends, by default a CircuitBreaker with the default parameters for each backend
+        is_failure : Callable[[BaseException], bool], optional
+            classifies the errors that indicate an unhealthy backend, by default `is_retryable_error`
+        """
+        if not llms:
+            raise ValueError("At least one llm is required")
+        if breakers is None:
+            breakers = [CircuitBreaker() for _ in llms]
+        if len(breakers) != len(llms):
+            raise ValueError("The number of breakers must match the number of llms")
+        self.llms = llms
+        self.breakers = breakers
+        self.is_failure = is_failure
+        # functions can only be passed if every backend can handle them
+        self.supports_function_calls = all(llm.supports_function_calls for llm in llms)
+        self.failovers = 0
+        self.rejected = 0
+        self._served = [0] * len(llms)
+        self._lock = Lock()
+
+    @property
+    def temperature(self):
+        return getattr(self.llms[0], "temperature", None)
+
+    @property
+    def model(self):
+        return getattr(self.llms[0], "model", None)
+
+    def _record_served(self, index: int) -> None:
+        with self._lock:
+            self._served[index] += 1
+            if index > 0:
+                self.failovers += 1
+
+    def _raise_unavailable(self, last_error: Optional[BaseException]):
+        if last_error is not None:
+            raise last_error
+        with self._lock:
+            self.rejected += 1
+        raise NoHealthyBackendError("All the backends are unavailable.")
+
+    def send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        last_error = None
+        deadline = _get_deadline(kwargs)
+        for i, (llm, breaker) in enumerate(zip(self.llms, self.breakers)):
+            attempt_kwargs = _get_attempt_kwargs(deadline, kwargs)
+            if not breaker.allow_request():
+                continue
+            start = time.perf_counter()
+            try:
+                response = llm.send_message(
+                    messages, functions, usage_meter, **attempt_kwargs
+                )
+            except Exception as e:
+                if not self.is_failure(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                last_error = e
+                continue
+            except BaseException:
+                # e.g. KeyboardInterrupt, the probe (if any) must not stay claimed
+                breaker.release()
+                raise
+            breaker.record_success(time.perf_counter() - start)
+            self._record_served(i)
+            return response
+        self._raise_unavailable(last_error)
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        last_error = None
+        deadline = _get_deadline(kwargs)
+        for i, (llm, breaker) in enumerate(zip(self.llms, self.breakers)):
+            attempt_kwargs = _get_attempt_kwargs(deadline, kwargs)
+            if not breaker.allow_request():
+                continue
+            start = time.perf_counter()
+            try:
+                response = await llm.async_send_message(
+                    messages, functions, usage_meter, **attempt_kwargs
+                )
+            except Exception as e:
+                if not self.is_failure(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                last_error = e
+                continue
+            except BaseException:
+                # e.g. cancellation
+                breaker.release()
+                raise
+            breaker.record_success(time.perf_counter() - start)
+            self._record_served(i)
+            return response
+        self._raise_unavailable(last_error)
+
+    async def async_stream_message(
+        self, messages, usage_meter: UsageMeter = None, **kwargs
+    ) -> AsyncIterator[str]:
+        last_error = None
+        deadline = _get_deadline(kwargs)
+        for i, (llm, breaker) in enumerate(zip(self.llms, self.breakers)):
+            attempt_kwargs = _get_attempt_kwargs(deadline, kwargs)
+            if not breaker.allow_request():
+                continue
+            started = False
+            try:
+                async for chunk in llm.async_stream_message(
+                    messages, usage_meter, **attempt_kwargs
+                ):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if not self.is_failure(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                # a stream that already produced output cannot be resumed by another backend
+                if started:
+                    raise
+                last_error = e
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            # the duration of a stream depends on the output length, only the outcome is recorded
+            breaker.record_success()
+            self._record_served(i)
+            return
+        self._raise_unavailable(last_error)
+
+    def get_stats(self) -> dict:
+        """Returns the state of the circuit breakers and the number of requests served by each backend."""
+        with self._lock:
+            served = list(self._served)
+            failovers, rejected = self.failovers, self.rejected
+        return {
+            "backends": [
+                {"llm": type(llm).__name__, "served": n, **breaker.get_stats()}
+                for llm, breaker, n in zip(self.llms, self.breakers, served)
+            ],
+            "failovers": failovers,
+            "rejected": rejected,
+        }
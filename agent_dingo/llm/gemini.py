@@ -14,6 +14,9 @@ except ImportError:
 from typing import Optional, List
 from agent_dingo.core.blocks import BaseLLM
 from agent_dingo.core.state import UsageMeter
+from agent_dingo.core.retry import RetryPolicy, get_default_retry_policy
+from agent_dingo.core.loop import run_sync
+import asyncio
 import json
 
 _ROLES_MAP = {
@@ -25,7 +28,12 @@ _ROLES_MAP = {
 
 class Gemini(BaseLLM):
     def __init__(
-        self, model: str, project: str, location: str, temperature: float = 0.7
+        self,
+        model: str,
+        project: str,
+        location: str,
+        temperature: float = 0.7,
+        retry_policy: Optional[RetryPolicy] = None,
     ):
         """
         VertexAI Gemini LLM.
@@ -40,11 +48,14 @@ class Gemini(BaseLLM):
             location to use
         temperature : float, optional
             generation temperature, by default 0.7
+        retry_policy : Optional[RetryPolicy], optional
+            policy for retrying the failed requests, by default the process-wide policy
         """
         _vertex_init(project=project, location=location)
         self._model = GenerativeModel(model)
         self.supports_function_calls = True
         self.temperature = temperature
+        self.retry_policy = retry_policy
 
     def _get_tools(self, functions: Optional[List]) -> List[Tool]:
         if functions is None:
@@ -66,13 +77,17 @@ class Gemini(BaseLLM):
         functions=None,
         usage_meter: UsageMeter = None,
         temperature: Optional[float] = None,
+        timeout: Optional[float] = None,
         **kwargs,
     ):
         converted = self._openai_to_gemini(messages)
-        out = self._model.generate_content(
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        out = retry_policy.call(
+            self._generate,
             contents=converted,
             tools=self._get_tools(functions),
             generation_config={"temperature": temperature or self.temperature},
+            timeout=timeout,
         )
         return self._postprocess_response(out, usage_meter)
 
@@ -82,16 +97,33 @@ class Gemini(BaseLLM):
         functions=None,
         usage_meter: UsageMeter = None,
         temperature=None,
+        timeout: Optional[float] = None,
         **kwargs,
     ):
         converted = self._openai_to_gemini(messages)
-        response = await self._model.generate_content_async(
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        response = await retry_policy.async_call(
+            self._async_generate,
             contents=converted,
             tools=self._get_tools(functions),
             generation_config={"temperature": temperature or self.temperature},
+            timeout=timeout,
         )
         return self._postprocess_response(response, usage_meter)
 
+    def _generate(self, timeout: Optional[float] = None, **kwargs):
+        if timeout is None:
+            return self._model.generate_content(**kwargs)
+        # the sdk does not accept a request timeout, so the async call is awaited on the background loop and cancelled once the time is up
+        return run_sync(
+            asyncio.wait_for(self._model.generate_content_async(**kwargs), timeout)
+        )
+
+    async def _async_generate(self, timeout: Optional[float] = None, **kwargs):
+        return await asyncio.wait_for(
+            self._model.generate_content_async(**kwargs), timeout
+        )
+
     def _postprocess_response(self, response, usage_meter: UsageMeter = None):
         n_prompt_tokens = response._raw_response.usage_metadata.prompt_token_count
         n_completion_tokens = (
@@ -0,0 +1,250 @@
+from typing import Optional
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    FIRST_COMPLETED,
+    wait as wait_futures,
+)
+from collections import deque
+from threading import Lock, Thread
+from agent_dingo.core.blocks import BaseLLM
+from agent_dingo.core.state import UsageMeter
+from agent_dingo.llm.wrapper import BaseLLMWrapper
+import asyncio
+import math
+import time
+
+
+class HedgedLLM(BaseLLMWrapper):
+    def __init__(
+        self,
+        llm: BaseLLM,
+        hedge_llm: Optional[BaseLLM] = None,
+        delay: Optional[float] = None,
+        percentile: float = 0.95,
+        window: int = 100,
+        min_samples: int = 20,
+        max_hedge_ratio: float = 0.05,
+        max_workers: int = 8,
+    ):
+        """
+        Wraps an LLM and sends a duplicate (hedge) request if the primary request is slower than usual.
+        The response that arrives first is returned and the other request is cancelled.
+
+        Only non-streaming requests are hedged. The usage of the winning request is recorded in the usage meter of the caller;
+        the usage of the duplicate requests that completed anyway is recorded separately in `duplicate_usage`.
+
+        Parameters
+        ----------
+        llm : BaseLLM
+            primary llm
+        hedge_llm : Optional[BaseLLM], optional
+            llm that receives the hedge requests, by default the primary llm
+        delay : Optional[float], optional
+            fixed number of seconds after which the request is hedged, by default None (the `percentile` of the observed latencies is used)
+        percentile : float, optional
+            percentile of the recent primary latencies after which the request is hedged, by default 0.95
+        window : int, optional
+            number of recent latencies to consider, by default 100
+        min_samples : int, optional
+            minimum number of observed latencies before the requests are hedged (only if `delay` is not set), by default 20
+        max_hedge_ratio : float, optional
+            maximum share of the requests that can be hedged, by default 0.05
+        max_workers : int, optional
+            maximum number of threads used for the sync hedge requests, by default 8
+        """
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be between 0 and 1")
+        if not 0 <= max_hedge_ratio <= 1:
+            raise ValueError("max_hedge_ratio must be between 0 and 1")
+        if delay is not None and delay < 0:
+            raise ValueError("delay must be non-negative")
+        super().__init__(llm)
+        self.hedge_llm = hedge_llm or llm
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.max_workers = max_workers
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.duplicate_usage = UsageMeter()
+        self._latencies = deque(maxlen=window)
+        self._lock = Lock()
+        self._pool = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="dingo-hedge"
+                )
+            return self._pool
+
+    def get_hedge_delay(self) -> Optional[float]:
+        """Returns the number of seconds after which a request is hedged, or None if the requests are not hedged yet."""
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            if len(self._latencies) < max(self.min_samples, 1):
+                return None
+            latencies = sorted(self._latencies)
+        index = max(math.ceil(self.percentile * len(latencies)) - 1, 0)
+        return latencies[index]
+
+    def _start_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def _can_hedge(self) -> bool:
+        with self._lock:
+            return self.hedged + 1 <= self.max_hedge_ratio * self.requests
+
+    def _acquire_hedge(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 > self.max_hedge_ratio * self.requests:
+                return False
+            self.hedged += 1
+            return True
+
+    def _timed_send_message(self, *args, **kwargs):
+        # the latency is measured from the actual start of the call, so a queue wait is not recorded as model latency
+        start = time.perf_counter()
+        try:
+            return self.llm.send_message(*args, **kwargs)
+        finally:
+            self._record_latency(time.perf_counter() - start)
+
+    async def _timed_async_send_message(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await self.llm.async_send_message(*args, **kwargs)
+        finally:
+            self._record_latency(time.perf_counter() - start)
+
+    @staticmethod
+    def _start_thread(fn, *args, **kwargs) -> Future:
+        # the primary request gets its own thread, so the hedge pool does not limit the throughput
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        Thread(target=run, name="dingo-hedge-primary", daemon=True).start()
+        return future
+
+    def _record_latency(self, latency: float) -> None:
+        # a cancelled primary request is recorded with the time it was running (a lower bound of its latency)
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _record_duplicate(self, usage: UsageMeter) -> None:
+        self.duplicate_usage.increment(usage.prompt_tokens, usage.completion_tokens)
+
+    def _settle(self, winner, meters: dict, usage_meter: Optional[UsageMeter]):
+        # `meters` maps the futures (or tasks) to the usage meters of their requests
+        if usage_meter is not None:
+            usage = meters[winner]
+            usage_meter.increment(usage.prompt_tokens, usage.completion_tokens)
+        if winner is not next(iter(meters)):
+            with self._lock:
+                self.hedge_wins += 1
+        for future, usage in meters.items():
+            if future is not winner:
+                future.add_done_callback(
+                    lambda f, usage=usage: (
+                        self._record_duplicate(usage)
+                        if not f.cancelled() and f.exception() is None
+                        else None
+                    )
+                )
+
+    def send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        self._start_request()
+        delay = self.get_hedge_delay()
+        if delay is None or not self._can_hedge():
+            # the request cannot be hedged, so it is sent inline from the calling thread
+            return self._timed_send_message(messages, functions, usage_meter, **kwargs)
+        primary_usage = UsageMeter()
+        primary = self._start_thread(
+            self._timed_send_message, messages, functions, primary_usage, **kwargs
+        )
+        meters = {primary: primary_usage}
+        done, _ = wait_futures([primary], timeout=delay)
+        if not done and self._acquire_hedge():
+            hedge_usage = UsageMeter()
+            hedge = self._get_pool().submit(
+                self.hedge_llm.send_message, messages, functions, hedge_usage, **kwargs
+            )
+            meters[hedge] = hedge_usage
+        pending = set(meters)
+        while pending:
+            done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        # running threads cannot be interrupted, only the queued requests are cancelled
+                        other.cancel()
+                    self._settle(future, meters, usage_meter)
+                    return future.result()
+        raise primary.exception()
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        self._start_request()
+        delay = self.get_hedge_delay()
+        if delay is None:
+            return await self._timed_async_send_message(
+                messages, functions, usage_meter, **kwargs
+            )
+        primary_usage = UsageMeter()
+        primary = asyncio.ensure_future(
+            self._timed_async_send_message(messages, functions, primary_usage, **kwargs)
+        )
+        meters = {primary: primary_usage}
+        try:
+            done, _ = await asyncio.wait([primary], timeout=delay)
+            if not done and self._acquire_hedge():
+                hedge_usage = UsageMeter()
+                hedge = asyncio.ensure_future(
+                    self.hedge_llm.async_send_message(
+                        messages, functions, hedge_usage, **kwargs
+                    )
+                )
+                meters[hedge] = hedge_usage
+            pending = set(meters)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        self._settle(task, meters, usage_meter)
+                        return task.result()
+            raise primary.exception()
+        finally:
+            for task in meters:
+                if not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> dict:
+        """Returns the number of hedged requests, how often the hedge won and the usage of the duplicate requests."""
+        delay = self.get_hedge_delay()
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "hedge_ratio": self.hedged / self.requests if self.requests else 0.0,
+                "hedge_delay": delay,
+                "duplicate_usage": self.duplicate_usage.get_usage(),
+            }
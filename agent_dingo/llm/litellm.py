@@ -1,6 +1,7 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, AsyncIterator
 from agent_dingo.core.blocks import BaseLLM
 from agent_dingo.core.state import UsageMeter
+from agent_dingo.core.retry import RetryPolicy, get_default_retry_policy
 
 try:
     from litellm import completion, acompletion
@@ -16,6 +17,7 @@ class LiteLLM(BaseLLM):
         model: str,
         temperature: float = 0.7,
         completion_extra_kwargs: Optional[Dict] = None,
+        retry_policy: Optional[RetryPolicy] = None,
     ):
         """
         Lite LLM client to interact with various LLM providers.
@@ -28,11 +30,14 @@ class LiteLLM(BaseLLM):
             generation temparature, by default 0.7
         completion_extra_kwargs : Optional[Dict], optional
             additional arguments to be passed to a completion method, by default None
+        retry_policy : Optional[RetryPolicy], optional
+            policy for retrying the failed requests, by default the process-wide policy
         """
 
         self.temperature = temperature
         self.model = model
         self.completion_extra_kwargs = completion_extra_kwargs or {}
+        self.retry_policy = retry_policy
 
     def send_message(
         self,
@@ -40,12 +45,16 @@ class LiteLLM(BaseLLM):
         functions=None,
         usage_meter: UsageMeter = None,
         temperature: Optional[float] = None,
+        timeout: Optional[float] = None,
         **kwargs,
     ):
-        response = completion(
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        response = retry_policy.call(
+            completion,
             messages=messages,
             model=self.model,
             temperature=temperature or self.temperature,
+            **self._timeout_kwargs(timeout),
             **self.completion_extra_kwargs,
         )
         self._log_usage(response, usage_meter)
@@ -57,17 +66,55 @@ class LiteLLM(BaseLLM):
         functions=None,
         usage_meter: UsageMeter = None,
         temperature=None,
+        timeout: Optional[float] = None,
         **kwargs,
     ):
-        response = await acompletion(
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        response = await retry_policy.async_call(
+            acompletion,
             messages=messages,
             model=self.model,
             temperature=temperature or self.temperature,
+            **self._timeout_kwargs(timeout),
             **self.completion_extra_kwargs,
         )
         self._log_usage(response, usage_meter)
         return response["choices"][0]["message"]
 
+    async def async_stream_message(
+        self,
+        messages,
+        usage_meter: UsageMeter = None,
+        temperature=None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        # only the request itself is retried; a stream that fails midway is not restarted
+        response = await retry_policy.async_call(
+            acompletion,
+            messages=messages,
+            model=self.model,
+            temperature=temperature or self.temperature,
+            **self._timeout_kwargs(timeout),
+            stream=True,
+            stream_options={"include_usage": True},
+            **self.completion_extra_kwargs,
+        )
+        async for chunk in response:
+            usage = getattr(chunk, "usage", None)
+            if usage and usage_meter:
+                usage_meter.increment(
+                    prompt_tokens=usage.prompt_tokens,
+                    completion_tokens=usage.completion_tokens,
+                )
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    @staticmethod
+    def _timeout_kwargs(timeout: Optional[float]) -> Dict:
+        return {"timeout": timeout} if timeout is not None else {}
+
     def _log_usage(self, response, usage_meter: UsageMeter = None):
         if usage_meter:
             usage_meter.increment(
@@ -1,4 +1,4 @@
-from typing import Optional, Any
+from typing import Optional, Any, AsyncIterator, Callable, Tuple
 from agent_dingo.core.blocks import BaseLLM
 from agent_dingo.core.state import UsageMeter
 
@@ -12,6 +12,8 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
 
+_END_OF_STREAM = object()
+
 
 class LlamaCPP(BaseLLM):
     def __init__(
@@ -45,10 +47,7 @@ class LlamaCPP(BaseLLM):
         temperature: Optional[float] = None,
         **kwargs,
     ):
-        with self._lock:
-            response = self.model.create_chat_completion(
-                messages, temperature=temperature or self.temperature
-            )
+        response = self._create_completion(messages, temperature or self.temperature)
         self._log_usage(response, usage_meter)
         return response["choices"][0]["message"]
 
@@ -60,16 +59,92 @@ class LlamaCPP(BaseLLM):
         temperature=None,
         **kwargs,
     ):
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         response = await loop.run_in_executor(
             self._get_executor(),
-            self.model.create_chat_completion,
+            self._create_completion,
             messages,
-            temperature=temperature or self.temperature,
+            temperature or self.temperature,
         )
         self._log_usage(response, usage_meter)
         return response["choices"][0]["message"]
 
+    async def async_stream_message(
+        self,
+        messages,
+        usage_meter: UsageMeter = None,
+        temperature=None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """Streams the response of the model.
+
+        llama.cpp does not report the usage of streamed completions, so it is estimated once the stream ends:
+        the prompt tokens are counted without the chat template and the completion tokens by tokenizing the generated text.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        producer = loop.run_in_executor(
+            self._get_executor(),
+            self._produce_stream,
+            messages,
+            temperature or self.temperature,
+            lambda item: loop.call_soon_threadsafe(queue.put_nowait, item),
+            stop,
+        )
+        try:
+            while True:
+                content = await queue.get()
+                if content is _END_OF_STREAM:
+                    break
+                yield content
+            n_prompt_tokens, n_completion_tokens = await producer
+        finally:
+            # releases the model if the consumer stops early
+            stop.set()
+        if usage_meter:
+            usage_meter.increment(
+                prompt_tokens=n_prompt_tokens, completion_tokens=n_completion_tokens
+            )
+
+    def _create_completion(self, messages, temperature: float):
+        # the model is stateful, so the generations cannot interleave
+        with self._lock:
+            return self.model.create_chat_completion(messages, temperature=temperature)
+
+    def _produce_stream(
+        self,
+        messages,
+        temperature: float,
+        put: Callable[[Any], None],
+        stop: threading.Event,
+    ) -> Tuple[int, int]:
+        contents = []
+        try:
+            # the lock is held for the whole stream, so the tokens of concurrent requests are not interleaved
+            with self._lock:
+                stream = self.model.create_chat_completion(
+                    messages, temperature=temperature, stream=True
+                )
+                try:
+                    for chunk in stream:
+                        if stop.is_set():
+                            break
+                        content = chunk["choices"][0]["delta"].get("content")
+                        if content:
+                            contents.append(content)
+                            put(content)
+                finally:
+                    stream.close()
+        finally:
+            put(_END_OF_STREAM)
+        prompt = "\n".join(m["content"] for m in messages if m.get("content"))
+        n_prompt_tokens = len(self.model.tokenize(prompt.encode("utf-8")))
+        n_completion_tokens = len(
+            self.model.tokenize("".join(contents).encode("utf-8"), add_bos=False)
+        )
+        return n_prompt_tokens, n_completion_tokens
+
     def _get_executor(self):
         if self._executor is None:
             self._executor = ThreadPoolExecutor(max_workers=1)
@@ -1,17 +1,17 @@
-from typing import Optional, List
+from typing import Optional, List, AsyncIterator
 from agent_dingo.core.blocks import BaseLLM
 from agent_dingo.core.state import UsageMeter
 import openai
-from tenacity import retry, stop_after_attempt, wait_fixed
+from agent_dingo.core.retry import RetryPolicy, get_default_retry_policy
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(3))
 def _send_message(
     client: openai.OpenAI,
     messages: dict,
     model: str = "gpt-3.5-turbo-0613",
     functions: Optional[List] = None,
     temperature: float = 1.0,
+    timeout: Optional[float] = None,
 ) -> dict:
     """Sends messages to the LLM and returns the response.
 
@@ -25,6 +25,8 @@ def _send_message(
         List of functions to use, by default None
     temperature : float, optional
         Temperature to use, by default 1.
+    timeout : Optional[float], optional
+        Request timeout in seconds, by default None (client default)
     log_usage : Callable, optional
         Function to log usage, by default None
 
@@ -34,6 +36,8 @@ def _send_message(
         The response from the LLM.
     """
     f = {}
+    if timeout is not None:
+        f["timeout"] = timeout
     if functions is not None:
         f["tools"] = [{"type": "function", "function": f} for f in functions]
         f["tool_choice"] = "auto"
@@ -43,15 +47,17 @@ def _send_message(
     return response.choices[0].message, response
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(3))
 async def _async_send_message(
     client: openai.AsyncOpenAI,
     messages: dict,
     model: str = "gpt-3.5-turbo-0613",
     functions: Optional[List] = None,
     temperature: float = 1.0,
+    timeout: Optional[float] = None,
 ) -> dict:
     f = {}
+    if timeout is not None:
+        f["timeout"] = timeout
     if functions is not None:
         f["tools"] = [{"type": "function", "function": f} for f in functions]
         f["tool_choice"] = "auto"
@@ -61,6 +67,23 @@ async def _async_send_message(
     return response.choices[0].message, response
 
 
+async def _async_stream_message(
+    client: openai.AsyncOpenAI,
+    messages: dict,
+    model: str = "gpt-3.5-turbo-0613",
+    temperature: float = 1.0,
+    timeout: Optional[float] = None,
+):
+    return await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True},
+        **({"timeout": timeout} if timeout is not None else {}),
+    )
+
+
 def to_dict(obj):
     if isinstance(obj, dict):
         return {k: to_dict(v) for k, v in obj.items()}
@@ -78,6 +101,7 @@ class OpenAI(BaseLLM):
         model: str,
         temperature: float = 0.7,
         base_url: Optional[str] = None,
+        retry_policy: Optional[RetryPolicy] = None,
         # TODO: Add per instance API key
         # TODO: Add remaining generation parameters
     ):
@@ -92,11 +116,15 @@ class OpenAI(BaseLLM):
             generation temperature, by default 0.7
         base_url : Optional[str], optional
             _description_, by default None
+        retry_policy : Optional[RetryPolicy], optional
+            policy for retrying the failed requests, by default the process-wide policy
         """
         self.model = model
         self.temperature = temperature
-        self.client = openai.OpenAI(base_url=base_url)
-        self.async_client = openai.AsyncOpenAI(base_url=base_url)
+        self.retry_policy = retry_policy
+        # the retries are handled by the retry policy instead of the client
+        self.client = openai.OpenAI(base_url=base_url, max_retries=0)
+        self.async_client = openai.AsyncOpenAI(base_url=base_url, max_retries=0)
         if base_url is None:
             self.supports_function_calls = True
 
@@ -106,14 +134,18 @@ class OpenAI(BaseLLM):
         functions=None,
         usage_meter: UsageMeter = None,
         temperature=None,
+        timeout: Optional[float] = None,
         **kwargs,
     ):
-        response = _send_message(
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        response = retry_policy.call(
+            _send_message,
             client=self.client,
             messages=messages,
             model=self.model,
             functions=functions,
             temperature=temperature or self.temperature,
+            timeout=timeout,
         )
         return self._postprocess_response(response, usage_meter)
 
@@ -123,17 +155,49 @@ class OpenAI(BaseLLM):
         functions=None,
         usage_meter: UsageMeter = None,
         temperature=None,
+        timeout: Optional[float] = None,
         **kwargs,
     ):
-        response = await _async_send_message(
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        response = await retry_policy.async_call(
+            _async_send_message,
             client=self.async_client,
             messages=messages,
             model=self.model,
             functions=functions,
             temperature=temperature or self.temperature,
+            timeout=timeout,
         )
         return self._postprocess_response(response, usage_meter)
 
+    async def async_stream_message(
+        self,
+        messages,
+        usage_meter: UsageMeter = None,
+        temperature=None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        # only the request itself is retried; a stream that fails midway is not restarted
+        stream = await retry_policy.async_call(
+            _async_stream_message,
+            client=self.async_client,
+            messages=messages,
+            model=self.model,
+            temperature=temperature or self.temperature,
+            timeout=timeout,
+        )
+        async for chunk in stream:
+            # with `include_usage`, the last chunk has no choices and carries the usage of the whole request
+            if chunk.usage is not None and usage_meter:
+                usage_meter.increment(
+                    prompt_tokens=chunk.usage.prompt_tokens,
+                    completion_tokens=chunk.usage.completion_tokens,
+                )
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
     def _postprocess_response(self, response, usage_meter: UsageMeter = None):
         res, full_res = to_dict(response[0]), to_dict(response[1])
         if usage_meter:
@@ -0,0 +1,330 @@
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from threading import Lock
+from agent_dingo.core.blocks import BaseLLM
+from agent_dingo.core.state import UsageMeter
+from agent_dingo.llm.wrapper import BaseLLMWrapper
+import asyncio
+import json
+import time
+
+
+class _TokenBucket:
+    """A token bucket that is refilled continuously at `limit` tokens per minute.
+
+    Callers reserve tokens upfront (the level can go negative) and wait until the bucket is refilled,
+    so the waiting callers are served in the order they arrived.
+    """
+
+    __slots__ = ("limit", "rate", "level", "updated_at")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.rate = limit / 60.0
+        self.level = float(limit)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.level + (now - self.updated_at) * self.rate, self.limit)
+        self.updated_at = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Takes the amount from the bucket and returns the number of seconds to wait before using it."""
+        self._refill(now)
+        # a request larger than the bucket would never fit, it has to wait for a full bucket at most
+        self.level -= min(amount, self.limit)
+        return max(-self.level / self.rate, 0.0)
+
+    def refund(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.level + amount, self.limit)
+
+    def resize(self, limit: int, now: float) -> None:
+        """Changes the limit and keeps the current fill level relative to the capacity."""
+        self._refill(now)
+        self.level *= limit / self.limit
+        self.limit = limit
+        self.rate = limit / 60.0
+
+
+def _update_bucket(
+    bucket: Optional[_TokenBucket], limit: Optional[int], now: float
+) -> Optional[_TokenBucket]:
+    if not limit:
+        return None
+    if bucket is None:
+        return _TokenBucket(limit)
+    if bucket.limit != limit:
+        bucket.resize(limit, now)
+    return bucket
+
+
+class RateLimiter:
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        """
+        Client-side limiter of the requests per minute (RPM) and tokens per minute (TPM).
+        Callers that exceed the limits are queued instead of failing.
+
+        Parameters
+        ----------
+        rpm : Optional[int], optional
+            maximum number of requests per minute, by default None (unlimited)
+        tpm : Optional[int], optional
+            maximum number of tokens per minute, by default None (unlimited)
+        """
+        self._lock = Lock()
+        self.waiting = 0
+        self.requests = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.set_limits(rpm, tpm)
+
+    def set_limits(self, rpm: Optional[int] = None, tpm: Optional[int] = None) -> None:
+        """Replaces the limits.
+        New buckets start full; the existing buckets keep their fill level (scaled to the new limit),
+        so setting the limits again does not reset a used quota.
+        """
+        for name, value in (("rpm", rpm), ("tpm", tpm)):
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be a positive integer")
+        with self._lock:
+            self.rpm = rpm
+            self.tpm = tpm
+            now = time.monotonic()
+            self._requests = _update_bucket(getattr(self, "_requests", None), rpm, now)
+            self._tokens = _update_bucket(getattr(self, "_tokens", None), tpm, now)
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserves a request with the estimated number of tokens and returns the number of seconds to wait before sending it.
+
+        Parameters
+        ----------
+        tokens : int, optional
+            estimated number of tokens of the request, by default 0
+
+        Returns
+        -------
+        float
+            number of seconds to wait
+        """
+        now = time.monotonic()
+        with self._lock:
+            wait = 0.0
+            if self._requests is not None:
+                wait = self._requests.reserve(1, now)
+            if self._tokens is not None:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            self.requests += 1
+            if wait > 0:
+                self.delayed += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def release(self, tokens: int = 0) -> None:
+        """Returns a reservation that was not used (e.g. the caller was cancelled while waiting)."""
+        now = time.monotonic()
+        with self._lock:
+            if self._requests is not None:
+                self._requests.refund(1, now)
+            if self._tokens is not None:
+                self._tokens.refund(tokens, now)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Corrects the token bucket once the actual usage of a request is known."""
+        with self._lock:
+            if self._tokens is not None:
+                now = time.monotonic()
+                diff = estimated_tokens - actual_tokens
+                if diff >= 0:
+                    self._tokens.refund(diff, now)
+                else:
+                    self._tokens.reserve(-diff, now)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Blocks until the request can be sent. Returns the time spent waiting."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            with self._lock:
+                self.waiting += 1
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+        return wait
+
+    async def async_acquire(self, tokens: int = 0) -> float:
+        """Waits asynchronously until the request can be sent. Returns the time spent waiting."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            with self._lock:
+                self.waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.release(tokens)
+                raise
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+        return wait
+
+    def get_stats(self) -> dict:
+        """Returns the limits, the number of currently waiting callers and the queue wait times."""
+        with self._lock:
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "requests": self.requests,
+                "delayed": self.delayed,
+                "waiting": self.waiting,
+                "total_wait": self.total_wait,
+                "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = Lock()
+
+
+def get_rate_limiter(
+    provider: str, model: str, rpm: Optional[int] = None, tpm: Optional[int] = None
+) -> RateLimiter:
+    """Returns the process-wide limiter of the provider and model, creating it if needed.
+
+    Parameters
+    ----------
+    provider : str
+        name of the provider (e.g. "openai")
+    model : str
+        name of the model
+    rpm : Optional[int], optional
+        requests per minute; if provided, replaces the limit of an existing limiter, by default None
+    tpm : Optional[int], optional
+        tokens per minute; if provided, replaces the limit of an existing limiter, by default None
+
+    Returns
+    -------
+    RateLimiter
+        the shared limiter
+    """
+    with _limiters_lock:
+        limiter = _limiters.get((provider, model))
+        if limiter is None:
+            limiter = _limiters[(provider, model)] = RateLimiter(rpm, tpm)
+            return limiter
+    if rpm is not None or tpm is not None:
+        limiter.set_limits(rpm or limiter.rpm, tpm or limiter.tpm)
+    return limiter
+
+
+def estimate_tokens(messages: List[dict], functions: Optional[List] = None) -> int:
+    """Roughly estimates the number of prompt tokens (~4 characters per token)."""
+    n_chars = 0
+    for message in messages:
+        content = message.get("content")
+        if content is not None and not isinstance(content, str):
+            content = json.dumps(content)
+        n_chars += len(content or "")
+        if message.get("tool_calls"):
+            n_chars += len(json.dumps(message["tool_calls"]))
+    if functions:
+        n_chars += len(json.dumps(functions))
+    # every message has a few tokens of overhead
+    return n_chars // 4 + 4 * len(messages)
+
+
+class RateLimitedLLM(BaseLLMWrapper):
+    def __init__(
+        self,
+        llm: BaseLLM,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        provider: Optional[str] = None,
+        limiter: Optional[RateLimiter] = None,
+        completion_tokens_estimate: int = 256,
+    ):
+        """
+        Wraps an LLM and delays its requests to stay within the requests per minute and tokens per minute limits.
+        LLMs with the same provider and model share the same limiter.
+
+        The number of tokens of a request is estimated before the call and corrected once the actual usage is known.
+
+        Parameters
+        ----------
+        llm : BaseLLM
+            llm to wrap
+        rpm : Optional[int], optional
+            requests per minute, by default None
+        tpm : Optional[int], optional
+            tokens per minute, by default None
+        provider : Optional[str], optional
+            name of the provider used to share the limiter, by default the lowercased class name of the llm
+        limiter : Optional[RateLimiter], optional
+            explicit limiter to use instead of the shared one, by default None
+        completion_tokens_estimate : int, optional
+            expected number of completion tokens if `max_tokens` is not passed, by default 256
+        """
+        super().__init__(llm)
+        if limiter is None:
+            limiter = get_rate_limiter(
+                provider or type(llm).__name__.lower(), str(self.model), rpm, tpm
+            )
+        self.limiter = limiter
+        self.completion_tokens_estimate = completion_tokens_estimate
+
+    def _estimate(self, messages, functions, kwargs) -> int:
+        completion_tokens = kwargs.get("max_tokens") or self.completion_tokens_estimate
+        return estimate_tokens(messages, functions) + completion_tokens
+
+    def _settle(
+        self, estimated: int, usage: UsageMeter, usage_meter: Optional[UsageMeter]
+    ) -> None:
+        actual = usage.prompt_tokens + usage.completion_tokens
+        # some llms do not report the usage, the estimate is kept in that case
+        if actual > 0:
+            self.limiter.reconcile(estimated, actual)
+        if usage_meter is not None:
+            usage_meter.increment(usage.prompt_tokens, usage.completion_tokens)
+
+    def send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        estimated = self._estimate(messages, functions, kwargs)
+        self.limiter.acquire(estimated)
+        usage = UsageMeter()
+        try:
+            return self.llm.send_message(messages, functions, usage, **kwargs)
+        finally:
+            self._settle(estimated, usage, usage_meter)
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        estimated = self._estimate(messages, functions, kwargs)
+        await self.limiter.async_acquire(estimated)
+        usage = UsageMeter()
+        try:
+            return await self.llm.async_send_message(
+                messages, functions, usage, **kwargs
+            )
+        finally:
+            self._settle(estimated, usage, usage_meter)
+
+    async def async_stream_message(
+        self, messages, usage_meter: UsageMeter = None, **kwargs
+    ) -> AsyncIterator[str]:
+        estimated = self._estimate(messages, None, kwargs)
+        await self.limiter.async_acquire(estimated)
+        usage = UsageMeter()
+        try:
+            async for chunk in self.llm.async_stream_message(messages, usage, **kwargs):
+                yield chunk
+        finally:
+            self._settle(estimated, usage, usage_meter)
+
+    def get_stats(self) -> dict:
+        """Returns the statistics of the underlying limiter."""
+        return self.limiter.get_stats()
@@ -0,0 +1,224 @@
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from dataclasses import dataclass
+from threading import Lock
+from agent_dingo.core.blocks import BaseLLM
+from agent_dingo.core.state import UsageMeter
+from agent_dingo.llm.rate_limit import estimate_tokens
+import time
+
+
+@dataclass
+class RequestFeatures:
+    """Cheap features of a request that are used to select a route."""
+
+    prompt_tokens: int
+    n_messages: int
+    has_tools: bool
+    has_tool_results: bool
+    last_message: str
+
+
+def extract_features(
+    messages: List[dict], functions: Optional[List] = None
+) -> RequestFeatures:
+    """Extracts the routing features of a request without calling any model."""
+    last_content = messages[-1].get("content") if messages else None
+    return RequestFeatures(
+        prompt_tokens=estimate_tokens(messages, functions),
+        n_messages=len(messages),
+        has_tools=bool(functions),
+        has_tool_results=any(m.get("role") == "tool" for m in messages),
+        last_message=last_content if isinstance(last_content, str) else "",
+    )
+
+
+def threshold_rule(
+    small: str, large: str, max_prompt_tokens: int = 1000, tools_to_large: bool = True
+) -> Callable[[RequestFeatures], str]:
+    """Creates a rule that sends short prompts to the small model and the rest to the large one.
+
+    Parameters
+    ----------
+    small : str
+        name of the route for short prompts
+    large : str
+        name of the route for long prompts
+    max_prompt_tokens : int, optional
+        maximum estimated number of prompt tokens for the small model, by default 1000
+    tools_to_large : bool, optional
+        whether the requests with tools are always sent to the large model, by default True
+
+    Returns
+    -------
+    Callable[[RequestFeatures], str]
+        the rule
+    """
+
+    def rule(features: RequestFeatures) -> str:
+        if tools_to_large and (features.has_tools or features.has_tool_results):
+            return large
+        return small if features.prompt_tokens <= max_prompt_tokens else large
+
+    return rule
+
+
+class _RouteStats:
+    __slots__ = (
+        "requests",
+        "errors",
+        "latency",
+        "estimated_prompt_tokens",
+        "prompt_tokens",
+        "completion_tokens",
+    )
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.estimated_prompt_tokens = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_latency": self.latency / self.requests if self.requests else 0.0,
+            "estimated_prompt_tokens": self.estimated_prompt_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class RouterLLM(BaseLLM):
+    def __init__(
+        self,
+        routes: Dict[str, BaseLLM],
+        rule: Callable[[RequestFeatures], str],
+        default: Optional[str] = None,
+    ):
+        """
+        Selects an LLM for every request based on its features (estimated prompt size, presence of tools, etc.).
+
+        If the request contains functions and the selected LLM does not support function calls,
+        the request is sent to the first route that does.
+
+        The router has no model or temperature of its own. To cache its responses, wrap it with CachedLLM,
+        which keys each request by the selected route, or wrap the llms of the routes individually.
+
+        Parameters
+        ----------
+        routes : Dict[str, BaseLLM]
+            llms by route name
+        rule : Callable[[RequestFeatures], str]
+            rule or classifier that returns the name of the route for the request features
+        default : Optional[str], optional
+            route used if the rule returns an unknown name, by default the first route
+        """
+        if not routes:
+            raise ValueError("At least one route is required")
+        default = default or next(iter(routes))
+        if default not in routes:
+            raise ValueError(f"Unknown default route {default}")
+        self.routes = routes
+        self.rule = rule
+        self.default = default
+        self.supports_function_calls = any(
+            llm.supports_function_calls for llm in routes.values()
+        )
+        self._stats = {name: _RouteStats() for name in routes}
+        self._lock = Lock()
+
+    def select_route(self, messages: List[dict], functions: Optional[List] = None):
+        """Returns the name of the route and the features of the request."""
+        features = extract_features(messages, functions)
+        name = self.rule(features)
+        if name not in self.routes:
+            name = self.default
+        if functions and not self.routes[name].supports_function_calls:
+            name = next(
+                (n for n, llm in self.routes.items() if llm.supports_function_calls),
+                None,
+            )
+            if name is None:
+                raise ValueError(
+                    "The request contains functions, but none of the routes supports function calls"
+                )
+        return name, features
+
+    def _record(
+        self,
+        name: str,
+        features: RequestFeatures,
+        latency: float,
+        usage: UsageMeter,
+        failed: bool,
+    ) -> None:
+        with self._lock:
+            stats = self._stats[name]
+            stats.requests += 1
+            stats.errors += failed
+            stats.latency += latency
+            stats.estimated_prompt_tokens += features.prompt_tokens
+            stats.prompt_tokens += usage.prompt_tokens
+            stats.completion_tokens += usage.completion_tokens
+
+    def send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        name, features = self.select_route(messages, functions)
+        usage = UsageMeter()
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.routes[name].send_message(
+                messages, functions, usage, **kwargs
+            )
+            failed = False
+            return response
+        finally:
+            self._record(name, features, time.perf_counter() - start, usage, failed)
+            if usage_meter is not None:
+                usage_meter.increment(usage.prompt_tokens, usage.completion_tokens)
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        name, features = self.select_route(messages, functions)
+        usage = UsageMeter()
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = await self.routes[name].async_send_message(
+                messages, functions, usage, **kwargs
+            )
+            failed = False
+            return response
+        finally:
+            self._record(name, features, time.perf_counter() - start, usage, failed)
+            if usage_meter is not None:
+                usage_meter.increment(usage.prompt_tokens, usage.completion_tokens)
+
+    async def async_stream_message(
+        self, messages, usage_meter: UsageMeter = None, **kwargs
+    ) -> AsyncIterator[str]:
+        name, features = self.select_route(messages)
+        usage = UsageMeter()
+        start = time.perf_counter()
+        failed = True
+        try:
+            async for chunk in self.routes[name].async_stream_message(
+                messages, usage, **kwargs
+            ):
+                yield chunk
+            failed = False
+        finally:
+            self._record(name, features, time.perf_counter() - start, usage, failed)
+            if usage_meter is not None:
+                usage_meter.increment(usage.prompt_tokens, usage.completion_tokens)
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Returns the number of requests, the average latency and the token usage of every route."""
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
@@ -0,0 +1,45 @@
+from typing import AsyncIterator
+from agent_dingo.core.blocks import BaseLLM
+from agent_dingo.core.state import UsageMeter
+
+
+class BaseLLMWrapper(BaseLLM):
+    def __init__(self, llm: BaseLLM):
+        """
+        Base class for LLMs that wrap another LLM to alter how the requests are sent.
+        All the calls are delegated to the wrapped LLM unless overridden.
+
+        Parameters
+        ----------
+        llm : BaseLLM
+            llm to wrap
+        """
+        if not isinstance(llm, BaseLLM):
+            raise TypeError(f"Expected a BaseLLM, got {type(llm)}")
+        self.llm = llm
+        self.supports_function_calls = llm.supports_function_calls
+
+    @property
+    def temperature(self):
+        return getattr(self.llm, "temperature", None)
+
+    @property
+    def model(self):
+        return getattr(self.llm, "model", None)
+
+    def send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        return self.llm.send_message(messages, functions, usage_meter, **kwargs)
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter: UsageMeter = None, **kwargs
+    ):
+        return await self.llm.async_send_message(
+            messages, functions, usage_meter, **kwargs
+        )
+
+    def async_stream_message(
+        self, messages, usage_meter: UsageMeter = None, **kwargs
+    ) -> AsyncIterator[str]:
+        return self.llm.async_stream_message(messages, usage_meter, **kwargs)
@@ -1,5 +1,6 @@
 import openai
 from agent_dingo.rag.base import BaseEmbedder
+from agent_dingo.core.retry import RetryPolicy, get_default_retry_policy
 from typing import Optional, List
 
 
@@ -9,10 +10,13 @@ class OpenAIEmbedder(BaseEmbedder):
         model: str = "text-embedding-3-small",
         base_url: Optional[str] = None,
         dimensions: Optional[int] = None,
+        retry_policy: Optional[RetryPolicy] = None,
     ):
         self.model = model
-        self.client = openai.OpenAI(base_url=base_url)
-        self.async_client = openai.AsyncOpenAI(base_url=base_url)
+        self.retry_policy = retry_policy
+        # the retries are handled by the retry policy instead of the client
+        self.client = openai.OpenAI(base_url=base_url, max_retries=0)
+        self.async_client = openai.AsyncOpenAI(base_url=base_url, max_retries=0)
         self.params = {
             "model": self.model,
         }
@@ -22,15 +26,19 @@ class OpenAIEmbedder(BaseEmbedder):
     def embed(self, texts: str) -> List[List[float]]:
         if isinstance(texts, str):
             texts = [texts]
-        embeddings = [
-            i.embedding
-            for i in (self.client.embeddings.create(**self.params, input=texts).data)
-        ]
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        res = retry_policy.call(
+            self.client.embeddings.create, **self.params, input=texts
+        )
+        embeddings = [i.embedding for i in res.data]
         return embeddings
 
     async def async_embed(self, texts: str) -> List[List[float]]:
         if isinstance(texts, str):
             texts = [texts]
-        res = await self.async_client.embeddings.create(**self.params, input=texts)
+        retry_policy = self.retry_policy or get_default_retry_policy()
+        res = await retry_policy.async_call(
+            self.async_client.embeddings.create, **self.params, input=texts
+        )
         embeddings = [i.embedding for i in res.data]
         return embeddings
@@ -1,6 +1,7 @@
 from agent_dingo.core.state import ChatPrompt, Context, Store
 from agent_dingo.core.message import UserMessage, SystemMessage
 from agent_dingo.core.blocks import BasePromptModifier as _BasePromptModifier
+from agent_dingo.core.tracing import optional_span
 from agent_dingo.rag.base import BaseEmbedder, BaseVectorStore, RetrievedChunk
 from typing import List, Optional
 from warnings import warn
@@ -38,10 +39,13 @@ class RAGPromptModifier(_BasePromptModifier):
         query = state.messages[-1].content
         query_embedding = self.embedder.embed(query)[0]
         try:
-            retrieved_data = self.vector_store.retrieve(
-                self.n_chunks_to_retrieve,
-                query_embedding,
-            )
+            with optional_span(
+                store.tracer, type(self.vector_store).__name__, "retrieval"
+            ):
+                retrieved_data = self.vector_store.retrieve(
+                    self.n_chunks_to_retrieve,
+                    query_embedding,
+                )
         except Exception as e:
             retrieved_data = []
             warn("No data was retrieved")
@@ -55,10 +59,13 @@ class RAGPromptModifier(_BasePromptModifier):
         query = state.messages[-1].content
         query_embedding = (await self.embedder.async_embed(query))[0]
         try:
-            retrieved_data = await self.vector_store.async_retrieve(
-                self.n_chunks_to_retrieve,
-                query_embedding,
-            )
+            with optional_span(
+                store.tracer, type(self.vector_store).__name__, "retrieval"
+            ):
+                retrieved_data = await self.vector_store.async_retrieve(
+                    self.n_chunks_to_retrieve,
+                    query_embedding,
+                )
         except Exception as e:
             retrieved_data = []
             warn("No data was retrieved")
@@ -84,7 +91,8 @@ class RAGPromptModifier(_BasePromptModifier):
                 )
                 modified = True
             else:
-                modified_message = message.__class__(message.content)
+                # messages are immutable, the unchanged ones are shared with the original prompt
+                modified_message = message
             messages.append(modified_message)
         if not modified:
             raise ValueError(
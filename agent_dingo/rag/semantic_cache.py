@@ -0,0 +1,181 @@
+from agent_dingo.core.state import ChatPrompt, Context, Store, KVData
+from agent_dingo.core.blocks import BaseReasoner as _BaseReasoner, BaseLLM
+from agent_dingo.core.tracing import optional_span
+from agent_dingo.rag.base import (
+    BaseEmbedder,
+    BaseVectorStore,
+    Chunk,
+    Document,
+    RetrievedChunk,
+)
+from agent_dingo.rag.vector_stores.in_memory import InMemoryVectorStore
+from typing import List, Optional
+from threading import Lock
+from warnings import warn
+from asyncio import to_thread
+import hashlib
+import json
+import time
+
+
+class SemanticCache(_BaseReasoner):
+    def __init__(
+        self,
+        llm: BaseLLM,
+        embedder: BaseEmbedder,
+        vector_store: Optional[BaseVectorStore] = None,
+        threshold: float = 0.95,
+        score_is_distance: bool = False,
+        n_candidates: int = 3,
+    ):
+        """
+        Answers the prompt with a previously generated response if a semantically similar prompt was already answered,
+        otherwise calls the LLM and caches its response.
+
+        Only the last message of the prompt is embedded; the cached response is reused only if all the preceding messages are identical.
+
+        Parameters
+        ----------
+        llm : BaseLLM
+            llm to call on a cache miss
+        embedder : BaseEmbedder
+            embedder used to embed the last message of the prompt
+        vector_store : Optional[BaseVectorStore], optional
+            vector store that holds the cached prompts, by default InMemoryVectorStore
+        threshold : float, optional
+            minimum similarity (or maximum distance if `score_is_distance`) to consider a cached prompt a match, by default 0.95
+        score_is_distance : bool, optional
+            must be set to True if the vector store returns distances instead of similarities (e.g. ChromaDB), by default False
+        n_candidates : int, optional
+            number of nearest neighbours to check, by default 3
+        """
+        self.llm = llm
+        self.embedder = embedder
+        self.vector_store = vector_store or InMemoryVectorStore()
+        self.threshold = threshold
+        self.score_is_distance = score_is_distance
+        self.n_candidates = n_candidates
+        self.hits = 0
+        self.misses = 0
+        self._llm_time = 0.0
+        self._lookup_time = 0.0
+        self._lock = Lock()
+
+    @staticmethod
+    def _split(state: ChatPrompt):
+        if not isinstance(state, ChatPrompt):
+            raise TypeError(f"State must be a ChatPrompt, got {type(state)}")
+        prefix = json.dumps(state.dict[:-1], sort_keys=True)
+        return (
+            state.messages[-1].content,
+            hashlib.sha256(prefix.encode()).hexdigest(),
+        )
+
+    def _is_match(self, chunk: RetrievedChunk, prefix_hash: str) -> bool:
+        if chunk.document_metadata.get("prefix_hash") != prefix_hash:
+            return False
+        if self.score_is_distance:
+            return chunk.score <= self.threshold
+        return chunk.score >= self.threshold
+
+    def _find(
+        self, candidates: List[RetrievedChunk], prefix_hash: str
+    ) -> Optional[str]:
+        for chunk in candidates:
+            if self._is_match(chunk, prefix_hash):
+                return chunk.document_metadata["response"]
+        return None
+
+    def _make_chunk(
+        self, query: str, prefix_hash: str, embedding: List[float], response: str
+    ) -> Chunk:
+        document = Document(
+            content=query,
+            metadata={"prefix_hash": prefix_hash, "response": response},
+        )
+        return Chunk(content=query, parent=document, embedding=embedding)
+
+    def _record(self, hit: bool, lookup_time: float, llm_time: float = 0.0) -> None:
+        with self._lock:
+            self._lookup_time += lookup_time
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._llm_time += llm_time
+
+    def forward(self, state: ChatPrompt, context: Context, store: Store) -> KVData:
+        query, prefix_hash = self._split(state)
+        start = time.perf_counter()
+        embedding = self.embedder.embed(query)[0]
+        try:
+            with optional_span(
+                store.tracer, type(self.vector_store).__name__, "retrieval"
+            ):
+                candidates = self.vector_store.retrieve(self.n_candidates, embedding)
+        except Exception:
+            candidates = []
+            warn("Semantic cache lookup failed")
+        response = self._find(candidates, prefix_hash)
+        lookup_time = time.perf_counter() - start
+        if response is not None:
+            self._record(True, lookup_time)
+            return KVData(_out_0=response)
+        start = time.perf_counter()
+        response = self.llm.forward(state, context, store)["_out_0"]
+        self._record(False, lookup_time, time.perf_counter() - start)
+        self.vector_store.upsert_chunks(
+            [self._make_chunk(query, prefix_hash, embedding, response)]
+        )
+        return KVData(_out_0=response)
+
+    async def async_forward(
+        self, state: ChatPrompt, context: Context, store: Store
+    ) -> KVData:
+        query, prefix_hash = self._split(state)
+        start = time.perf_counter()
+        embedding = (await self.embedder.async_embed(query))[0]
+        try:
+            with optional_span(
+                store.tracer, type(self.vector_store).__name__, "retrieval"
+            ):
+                candidates = await self.vector_store.async_retrieve(
+                    self.n_candidates, embedding
+                )
+        except Exception:
+            candidates = []
+            warn("Semantic cache lookup failed")
+        response = self._find(candidates, prefix_hash)
+        lookup_time = time.perf_counter() - start
+        if response is not None:
+            self._record(True, lookup_time)
+            return KVData(_out_0=response)
+        start = time.perf_counter()
+        response = (await self.llm.async_forward(state, context, store))["_out_0"]
+        self._record(False, lookup_time, time.perf_counter() - start)
+        await to_thread(
+            self.vector_store.upsert_chunks,
+            [self._make_chunk(query, prefix_hash, embedding, response)],
+        )
+        return KVData(_out_0=response)
+
+    def get_stats(self) -> dict:
+        """Returns the hit rate and the estimated time saved by the cache.
+
+        The time saved is estimated as the average LLM latency on a miss multiplied by the number of hits,
+        minus the total time spent on the lookups.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            avg_llm_latency = self._llm_time / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "avg_llm_latency": avg_llm_latency,
+                "avg_lookup_latency": self._lookup_time / total if total else 0.0,
+                "latency_saved": avg_llm_latency * self.hits - self._lookup_time,
+            }
+
+    def get_required_context_keys(self) -> List[str]:
+        return self.llm.get_required_context_keys()
@@ -0,0 +1,66 @@
+from agent_dingo.rag.base import (
+    BaseVectorStore as _BaseVectorStore,
+    Chunk,
+    RetrievedChunk,
+)
+from typing import Optional, List
+from collections import OrderedDict
+from threading import Lock
+import heapq
+import math
+
+
+def _normalize(embedding: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in embedding))
+    if norm == 0:
+        return list(embedding)
+    return [x / norm for x in embedding]
+
+
+class InMemoryVectorStore(_BaseVectorStore):
+    def __init__(self, max_size: Optional[int] = None):
+        """
+        Simple in-process vector store that uses the cosine similarity as a score.
+        Suitable for small collections (e.g. caches); the search is exhaustive.
+
+        Parameters
+        ----------
+        max_size : Optional[int], optional
+            maximum number of stored chunks; the oldest chunks are evicted first, by default None (unbounded)
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def upsert_chunks(self, chunks: List[Chunk]):
+        with self._lock:
+            for chunk in chunks:
+                if chunk.embedding is None:
+                    raise ValueError("Chunk must be embedded before upserting")
+                self._entries[chunk.hash] = (
+                    _normalize(chunk.embedding),
+                    chunk.content,
+                    chunk.parent.metadata,
+                )
+                self._entries.move_to_end(chunk.hash)
+            while self.max_size is not None and len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def retrieve(self, k: int, query: List[float]) -> List[RetrievedChunk]:
+        query = _normalize(query)
+        with self._lock:
+            entries = list(self._entries.values())
+        scored = (
+            (sum(q * e for q, e in zip(query, embedding)), content, metadata)
+            for embedding, content, metadata in entries
+        )
+        top = heapq.nlargest(k, scored, key=lambda x: x[0])
+        return [
+            RetrievedChunk(content, metadata, score) for score, content, metadata in top
+        ]
+
+    async def async_retrieve(self, k: int, query: List[float]) -> List[RetrievedChunk]:
+        return self.retrieve(k, query)
+
+    def __len__(self) -> int:
+        return len(self._entries)
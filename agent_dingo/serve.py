@@ -1,10 +1,12 @@
 from agent_dingo.core.state import State, Store, Context, ChatPrompt
 from agent_dingo.core.blocks import Pipeline
+from agent_dingo.core.deadline import DeadlineExceededError
 from agent_dingo.core.message import UserMessage, SystemMessage, AssistantMessage
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
-from typing import List, Dict, Optional, Tuple, Union
+from typing import AsyncIterator, List, Dict, Optional, Tuple, Union
 from uuid import uuid4
 import time
 
@@ -17,6 +19,7 @@ class Message(BaseModel):
 class PipelineRunRequest(BaseModel):
     model: str
     messages: List[Message]
+    stream: bool = False
 
 
 class Usage(BaseModel):
@@ -53,6 +56,37 @@ class PipelineOutputResponse(BaseModel):
     choices: List[Choice]
 
 
+class Delta(BaseModel):
+    role: Optional[str] = None
+    content: Optional[str] = None
+
+
+class ChunkChoice(BaseModel):
+    index: int
+    delta: Delta
+    logprobs: Optional[Dict] = None
+    finish_reason: Optional[str] = None
+
+
+class PipelineOutputChunk(BaseModel):
+    id: str
+    object: str = "chat.completion.chunk"
+    created: int
+    model: str
+    choices: List[ChunkChoice]
+    usage: Optional[Usage] = None
+
+
+class ErrorDetail(BaseModel):
+    message: str
+    type: str
+    code: Optional[int] = None
+
+
+class ErrorChunk(BaseModel):
+    error: ErrorDetail
+
+
 _role_to_message_type = {
     "user": UserMessage,
     "system": SystemMessage,
@@ -81,6 +115,42 @@ def _construct_response(
     )
 
 
+async def _stream_response(
+    chunks: AsyncIterator[str], model: str, get_usage
+) -> AsyncIterator[str]:
+    generated_uuid = str(uuid4())
+    current_timestamp = int(time.time())
+
+    def sse(delta: Delta, finish_reason: Optional[str] = None, usage=None) -> str:
+        chunk = PipelineOutputChunk(
+            id=generated_uuid,
+            created=current_timestamp,
+            model=model,
+            choices=[ChunkChoice(index=0, delta=delta, finish_reason=finish_reason)],
+            usage=usage,
+        )
+        return f"data: {chunk.model_dump_json(exclude_none=True)}\n\n"
+
+    yield sse(Delta(role="assistant", content=""))
+    try:
+        async for content in chunks:
+            yield sse(Delta(content=content))
+    except DeadlineExceededError as e:
+        # the status code is already sent, so the client is notified with an error chunk (the non-streaming path returns 504)
+        error = ErrorChunk(error=ErrorDetail(message=str(e), type="timeout", code=504))
+        yield f"data: {error.model_dump_json(exclude_none=True)}\n\n"
+        yield "data: [DONE]\n\n"
+        return
+    # the usage is only known after the whole output is generated
+    yield sse(Delta(), finish_reason="stop", usage=Usage(**get_usage()))
+    yield "data: [DONE]\n\n"
+
+
+async def _as_async_iterator(*items: str) -> AsyncIterator[str]:
+    for item in items:
+        yield item
+
+
 def _construct_pipeline_input(
     input_: List[Message],
 ) -> Tuple[ChatPrompt, Dict[str, str]]:
@@ -99,7 +169,11 @@ def _construct_pipeline_input(
     return state, context
 
 
-def make_app(pipeline: Union[Pipeline, Dict[str, Pipeline]], is_async: bool = False):
+def make_app(
+    pipeline: Union[Pipeline, Dict[str, Pipeline]],
+    is_async: bool = False,
+    timeout: Optional[float] = None,
+):
     app = FastAPI()
     created_at = int(time.time())
     if isinstance(pipeline, Pipeline):
@@ -112,20 +186,46 @@ def make_app(pipeline: Union[Pipeline, Dict[str, Pipeline]], is_async: bool = Fa
 
     if is_async:
 
-        @app.post("/chat/completions")
-        async def run_pipeline(input: PipelineRunRequest) -> PipelineOutputResponse:
+        @app.post("/chat/completions", response_model=PipelineOutputResponse)
+        async def run_pipeline(input: PipelineRunRequest):
             state, context = _construct_pipeline_input(input.messages)
             selected_pipeline = available_pipelines[input.model]
-            output, usage = await selected_pipeline.async_run(_state=state, **context)
+            if input.stream:
+                stream = selected_pipeline.async_stream(
+                    _state=state, _timeout=timeout, **context
+                )
+                return StreamingResponse(
+                    _stream_response(stream, input.model, lambda: stream.usage),
+                    media_type="text/event-stream",
+                )
+            try:
+                output, usage = await selected_pipeline.async_run(
+                    _state=state, _timeout=timeout, **context
+                )
+            except DeadlineExceededError as e:
+                raise HTTPException(status_code=504, detail=str(e))
             return _construct_response(output, Usage(**usage), model=input.model)
 
     else:
 
-        @app.post("/chat/completions")
-        def run_pipeline(input: PipelineRunRequest) -> PipelineOutputResponse:
+        @app.post("/chat/completions", response_model=PipelineOutputResponse)
+        def run_pipeline(input: PipelineRunRequest):
             state, context = _construct_pipeline_input(input.messages)
             selected_pipeline = available_pipelines[input.model]
-            output, usage = selected_pipeline.run(_state=state, **context)
+            try:
+                output, usage = selected_pipeline.run(
+                    _state=state, _timeout=timeout, **context
+                )
+            except DeadlineExceededError as e:
+                raise HTTPException(status_code=504, detail=str(e))
+            if input.stream:
+                # sync pipelines cannot be streamed, the whole output is sent as a single chunk
+                return StreamingResponse(
+                    _stream_response(
+                        _as_async_iterator(output), input.model, lambda: usage
+                    ),
+                    media_type="text/event-stream",
+                )
             return _construct_response(output, Usage(**usage), model=input.model)
 
     @app.get("/models")
@@ -143,6 +243,7 @@ def serve_pipeline(
     is_async: bool = False,
     host: str = "0.0.0.0",
     port: int = 8000,
+    timeout: Optional[float] = None,
 ):
-    app = make_app(pipeline, is_async)
+    app = make_app(pipeline, is_async, timeout)
     uvicorn.run(app, host=host, port=port)
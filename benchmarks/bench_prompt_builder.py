@@ -0,0 +1,66 @@
+"""Measures the per-request overhead of PromptBuilder.forward.
+
+The compiled PromptBuilder is compared with the previous implementation, which resolved the placeholders
+and called `str.format` on every message for every request.
+
+Usage: python benchmarks/bench_prompt_builder.py [n_iterations]
+"""
+
+from agent_dingo.core.blocks import PromptBuilder
+from agent_dingo.core.message import SystemMessage, UserMessage, AssistantMessage
+from agent_dingo.core.state import ChatPrompt, KVData, Context, Store
+import sys
+import timeit
+
+
+def legacy_forward(pb: PromptBuilder, state, context, store) -> ChatPrompt:
+    values = {}
+    for n in pb._placeholder_names:
+        if n in pb._from_state.keys():
+            values[n] = state[pb._from_state[n]]
+        elif n in pb._from_store.keys():
+            outer, inner = pb._from_store[n].split(".")
+            values[n] = store.get_data(outer)[inner]
+        elif n in context.keys():
+            values[n] = context[n]
+        else:
+            raise KeyError(f"Could not find value for placeholder {n}")
+    return ChatPrompt([type(m)(m.content.format(**values)) for m in pb.messages])
+
+
+def make_case():
+    messages = [
+        SystemMessage("You are a helpful assistant. " * 20),
+        UserMessage("What is the capital of France?"),
+        AssistantMessage("Paris."),
+        UserMessage(
+            "Context: {context}\nUser {user} asked: {query}\nAnswer in {language}."
+        ),
+    ]
+    pb = PromptBuilder(
+        messages,
+        from_state={"query": "_out_0"},
+        from_store={"context": "retrieval.documents"},
+    )
+    state = KVData(_out_0="What is the capital of Germany?")
+    store = Store()
+    store.update("retrieval", KVData(documents="Berlin is the capital of Germany."))
+    context = Context(user="alice", language="English")
+    return pb, state, context, store
+
+
+def main(n: int = 100_000) -> None:
+    pb, state, context, store = make_case()
+    assert [m.dict for m in pb.forward(state, context, store).messages] == [
+        m.dict for m in legacy_forward(pb, state, context, store).messages
+    ]
+    for name, fn in (
+        ("legacy", lambda: legacy_forward(pb, state, context, store)),
+        ("compiled", lambda: pb.forward(state, context, store)),
+    ):
+        best = min(timeit.repeat(fn, number=n, repeat=5))
+        print(f"{name:>10}: {best / n * 1e6:.2f} us/request")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -3,7 +3,6 @@ from agent_dingo.core.blocks import BaseLLM
 from agent_dingo.core.state import ChatPrompt, UsageMeter
 
 import openai
-from tenacity import retry, stop_after_attempt, wait_fixed
 
 
 class FakeLLM(BaseLLM):
@@ -29,7 +28,7 @@ class FakeLLM(BaseLLM):
         **kwargs,
     ):
         res, full_res = (
-            "Fake response",
+            {"role": "assistant", "content": "Fake response"},
             {
                 "id": "chatcmpl-123",
                 "object": "chat.completion",
@@ -2,7 +2,53 @@ import unittest
 from unittest.mock import patch
 from agent_dingo.agent import Agent
 from agent_dingo.agent.function_descriptor import FunctionDescriptor
+from agent_dingo.core.state import ChatPrompt, Context, Store
+from agent_dingo.core.message import UserMessage
+from agent_dingo.llm.cache import InMemoryCache
 from tests.fake_llm import FakeLLM
+import asyncio
+import json
+import os
+import threading
+import time
+import warnings
+
+
+class ToolCallingLLM(FakeLLM):
+    """Requests the given tool calls and then answers with the joined tool results."""
+
+    def __init__(self, calls):
+        super().__init__()
+        self.calls = calls
+
+    def send_message(self, messages, functions=None, usage_meter=None, **kwargs):
+        if messages[-1]["role"] != "tool":
+            tool_calls = [
+                {
+                    "id": f"call_{i}",
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(args)},
+                }
+                for i, (name, args) in enumerate(self.calls)
+            ]
+            return {"role": "assistant", "content": None, "tool_calls": tool_calls}
+        results = [m for m in messages if m["role"] == "tool"]
+        self.tool_call_ids = [m["tool_call_id"] for m in results]
+        self.tool_results = [m["content"] for m in results]
+        return {"role": "assistant", "content": ",".join(m["content"] for m in results)}
+
+    async def async_send_message(self, *args, **kwargs):
+        return self.send_message(*args, **kwargs)
+
+
+def _get_pid(x):
+    return f"{x}:{os.getpid()}"
+
+
+def _descriptor(name, func, **kwargs):
+    return FunctionDescriptor(
+        name=name, func=func, json_repr={}, requires_context=False, **kwargs
+    )
 
 
 class TestAgentDingo(unittest.TestCase):
@@ -52,5 +98,201 @@ class TestAgentDingo(unittest.TestCase):
         self.assertEqual(len(self.agent._registry._Registry__functions), 1)
 
 
+class TestAgentToolCalls(unittest.TestCase):
+    def _run(self, agent, is_async=False):
+        prompt = ChatPrompt([UserMessage("Hi")])
+        if is_async:
+            out = asyncio.run(agent.async_forward(prompt, Context(), Store()))
+        else:
+            out = agent.forward(prompt, Context(), Store())
+        return out["_out_0"]
+
+    def _make_agent(self, calls, **kwargs):
+        self.llm = ToolCallingLLM(calls)
+        return Agent(self.llm, **kwargs)
+
+    def test_concurrent_calls(self):
+        def slow(x):
+            time.sleep(0.2 if x == "a" else 0.1)
+            return x
+
+        async def async_slow(x):
+            await asyncio.sleep(0.2 if x == "a" else 0.1)
+            return x
+
+        for func, is_async in ((slow, False), (async_slow, True)):
+            agent = self._make_agent([("slow", {"x": x}) for x in "abc"])
+            agent.register_descriptor(_descriptor("slow", func))
+            start = time.perf_counter()
+            self.assertEqual(self._run(agent, is_async), "a,b,c")
+            self.assertLess(time.perf_counter() - start, 0.35)
+            self.assertEqual(self.llm.tool_call_ids, ["call_0", "call_1", "call_2"])
+
+    def test_sequential_calls(self):
+        def slow(x):
+            time.sleep(0.1)
+            return x
+
+        agent = self._make_agent(
+            [("slow", {"x": x}) for x in "abc"], parallel_tool_calls=False
+        )
+        agent.register_descriptor(_descriptor("slow", slow))
+        start = time.perf_counter()
+        self.assertEqual(self._run(agent), "a,b,c")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+
+    def test_per_tool_limits(self):
+        lock = threading.Lock()
+        running = {"limited": 0, "free": 0}
+        peak = {"limited": 0, "free": 0}
+        events = []
+
+        def make_tool(name):
+            def tool(x):
+                with lock:
+                    running[name] += 1
+                    peak[name] = max(peak[name], running[name])
+                time.sleep(0.05)
+                with lock:
+                    running[name] -= 1
+                return x
+
+            return tool
+
+        def side_effect(x):
+            events.append(("side_effect", running["free"] + running["limited"]))
+            return x
+
+        calls = [("limited", {"x": "1"}), ("limited", {"x": "2"})]
+        calls += [("free", {"x": "3"}), ("free", {"x": "4"})]
+        calls += [("side_effect", {"x": "5"}), ("free", {"x": "6"})]
+        for is_async in (False, True):
+            agent = self._make_agent(calls)
+            agent.register_descriptor(
+                _descriptor("limited", make_tool("limited"), max_concurrency=1)
+            )
+            agent.register_descriptor(_descriptor("free", make_tool("free")))
+            agent.register_descriptor(
+                _descriptor("side_effect", side_effect, concurrent=False)
+            )
+            peak.update(limited=0, free=0)
+            events.clear()
+            self.assertEqual(self._run(agent, is_async), "1,2,3,4,5,6")
+            self.assertEqual(peak["limited"], 1)
+            self.assertEqual(peak["free"], 2)
+            # the non-concurrent function runs alone
+            self.assertEqual(events, [("side_effect", 0)])
+
+    def test_tool_cache(self):
+        executed = []
+
+        def convert(a, b):
+            executed.append((a, b))
+            return str(a * b)
+
+        calls = [("convert", {"a": 2, "b": 3}), ("convert", {"b": 3, "a": 2})]
+        agent = self._make_agent(calls, parallel_tool_calls=False)
+        agent.register_descriptor(_descriptor("convert", convert, cache="run"))
+        self.assertEqual(self._run(agent), "6,6")
+        self.assertEqual(len(executed), 1)
+        # the per-run cache is not shared between the runs
+        self.assertEqual(self._run(agent, is_async=True), "6,6")
+        self.assertEqual(len(executed), 2)
+        stats = agent.get_tool_cache_stats()["convert"]
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+
+        agent = self._make_agent(calls, parallel_tool_calls=False)
+        agent.register_descriptor(
+            _descriptor("convert", convert, cache=InMemoryCache(ttl=60))
+        )
+        self._run(agent)
+        self._run(agent, is_async=True)
+        self.assertEqual(len(executed), 3)
+        self.assertEqual(agent.get_tool_cache_stats()["convert"]["hits"], 3)
+
+    def test_tool_cache_skips_errors(self):
+        executed = []
+
+        def fail(a):
+            executed.append(a)
+            raise ValueError("boom")
+
+        agent = self._make_agent([("fail", {"a": 1})] * 2, parallel_tool_calls=False)
+        agent.register_descriptor(_descriptor("fail", fail, cache="run"))
+        with patch("builtins.print"):
+            self._run(agent)
+        self.assertEqual(len(executed), 2)
+
+    def test_tool_cache_with_context(self):
+        with self.assertRaises(ValueError):
+            Agent(FakeLLM()).register_descriptor(
+                FunctionDescriptor(
+                    name="f",
+                    func=lambda chat_context: "",
+                    json_repr={},
+                    requires_context=True,
+                    required_context_keys=[],
+                    cache=InMemoryCache(),
+                )
+            )
+
+    def test_tool_timeout(self):
+        def slow(x):
+            time.sleep(0.5 if x == "slow" else 0)
+            return x
+
+        async def async_slow(x):
+            await asyncio.sleep(0.5 if x == "slow" else 0)
+            return x
+
+        calls = [("slow", {"x": "slow"}), ("slow", {"x": "fast"})]
+        for func in (slow, async_slow):
+            for is_async in (False, True):
+                agent = self._make_agent(calls)
+                agent.register_descriptor(_descriptor("slow", func, timeout=0.1))
+                start = time.perf_counter()
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    self._run(agent, is_async)
+                self.assertLess(time.perf_counter() - start, 0.4)
+                error, result = self.llm.tool_results
+                error = json.loads(error)
+                self.assertEqual(error["error"], "timeout")
+                self.assertEqual(error["function"], "slow")
+                self.assertEqual(result, "fast")
+
+    def test_process_executor(self):
+        agent = self._make_agent([("get_pid", {"x": "a"})])
+        agent.register_descriptor(
+            _descriptor("get_pid", _get_pid, executor="process", timeout=30)
+        )
+        for is_async in (False, True):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                x, pid = self._run(agent, is_async).split(":")
+            self.assertEqual(x, "a")
+            self.assertNotEqual(int(pid), os.getpid())
+
+    def test_invalid_execution_options(self):
+        agent = Agent(FakeLLM())
+        invalid = [
+            _descriptor("f", _get_pid, executor="gpu"),
+            _descriptor("f", _get_pid, timeout=0),
+            _descriptor("f", _get_pid, executor="inline", timeout=1),
+            _descriptor("f", asyncio.sleep, executor="process"),
+            FunctionDescriptor(
+                name="f",
+                func=lambda chat_context: "",
+                json_repr={},
+                requires_context=True,
+                required_context_keys=[],
+                executor="process",
+            ),
+        ]
+        for descriptor in invalid:
+            with self.assertRaises(ValueError):
+                agent.register_descriptor(descriptor)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import threading
+from agent_dingo.agent.tool_pools import (
+    ToolPools,
+    get_tool_pools,
+    configure_tool_pools,
+    shutdown_tool_pools,
+)
+
+
+class TestToolPools(unittest.TestCase):
+    def tearDown(self):
+        shutdown_tool_pools()
+
+    def test_submit(self):
+        pools = ToolPools(max_threads=2, max_processes=1)
+        future = pools.submit("thread", lambda x: x + 1, {"x": 1})
+        self.assertEqual(future.result(), 2)
+        pools.shutdown()
+        with self.assertRaises(RuntimeError):
+            pools.submit("thread", lambda: 1, {})
+
+    def test_reconfigure_during_turn(self):
+        old = get_tool_pools()
+        started = threading.Event()
+        reconfigured = threading.Event()
+        results = []
+
+        def turn():
+            with old.running() as pools:
+                results.append(pools.submit("thread", lambda: 1, {}).result())
+                started.set()
+                reconfigured.wait()
+                # the turn submits its next function to the replaced pools
+                results.append(pools.submit("thread", lambda: 2, {}).result())
+
+        thread = threading.Thread(target=turn)
+        thread.start()
+        self.assertTrue(started.wait(5))
+        new = configure_tool_pools(max_threads=2)
+        reconfigured.set()
+        thread.join()
+        self.assertEqual(results, [1, 2])
+        self.assertIsNot(new, old)
+        with self.assertRaises(RuntimeError):
+            old.submit("thread", lambda: 1, {})
+        with self.assertRaises(RuntimeError):
+            with old.running():
+                pass
@@ -0,0 +1,72 @@
+import unittest
+import asyncio
+import time
+from agent_dingo.core.blocks import InlineBlock, PromptBuilder
+from agent_dingo.core.message import UserMessage
+from agent_dingo.core.state import KVData, UsageMeter
+from tests.fake_llm import FakeLLM
+
+
+def _make_pipeline():
+    block = InlineBlock(required_context_keys=["delay"])
+
+    @block
+    def func(state, context, store):
+        delay = float(context["delay"])
+        if delay < 0:
+            raise ValueError("negative delay")
+        time.sleep(delay)
+        return state["_out_0"]
+
+    return func.as_pipeline()
+
+
+class TestRunMany(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = _make_pipeline()
+        self.inputs = [
+            (KVData(_out_0="a"), {"delay": "0.03"}),
+            (KVData(_out_0="b"), {"delay": "-1"}),
+            (KVData(_out_0="c"), {"delay": "0"}),
+        ]
+
+    def test_ordered(self):
+        results = list(self.pipeline.run_many(self.inputs, max_concurrency=3))
+        self.assertEqual([r.index for r in results], [0, 1, 2])
+        self.assertEqual(results[0].output, "a")
+        self.assertFalse(results[1].ok)
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertEqual(results[2].output, "c")
+
+    def test_completion_order(self):
+        results = list(
+            self.pipeline.run_many(self.inputs, max_concurrency=3, ordered=False)
+        )
+        self.assertEqual(results[-1].index, 0)
+
+    def test_async_run_many(self):
+        async def collect():
+            return [
+                r
+                async for r in self.pipeline.async_run_many(
+                    self.inputs, max_concurrency=2
+                )
+            ]
+
+        results = asyncio.run(collect())
+        self.assertEqual([r.output for r in results], ["a", None, "c"])
+
+    def test_usage_is_aggregated(self):
+        pipeline = PromptBuilder([UserMessage("Hi {name}")]) >> FakeLLM()
+        meter = UsageMeter()
+        inputs = [(None, {"name": "a"}), (None, {}), (None, {"name": "b"})]
+        results = list(pipeline.run_many(inputs, usage_meter=meter))
+        self.assertEqual(results[0].output, "Fake response")
+        self.assertEqual(results[0].usage["total_tokens"], 21)
+        self.assertIsInstance(results[1].error, KeyError)
+        self.assertEqual(results[1].usage["total_tokens"], 0)
+        self.assertEqual(meter.get_usage()["total_tokens"], 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
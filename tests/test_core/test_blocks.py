@@ -8,9 +8,51 @@ from agent_dingo.core.blocks import (
     SaveState,
     LoadState,
     InlineBlock,
+    Switch,
+    Race,
+    Map,
 )
 from agent_dingo.core.state import State, ChatPrompt, KVData, Context, Store, UsageMeter
-from agent_dingo.core.message import Message
+from agent_dingo.core.message import Message, SystemMessage, UserMessage
+from agent_dingo.llm.cache import InMemoryCache
+from tests.fake_llm import FakeLLM
+import asyncio
+import time
+
+
+class StreamingFakeLLM(FakeLLM):
+    async def async_stream_message(self, messages, usage_meter=None, **kwargs):
+        for chunk in ["Fake", " response"]:
+            yield chunk
+        usage_meter.increment(9, 12)
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def _make_block(value, delay=0.0, calls=None):
+    block = InlineBlock()
+
+    @block
+    def func(state, context, store):
+        time.sleep(delay)
+        if calls is not None:
+            calls.append(value)
+        return value
+
+    return func
+
+
+def _make_async_block(value, delay=0.0):
+    block = InlineBlock()
+
+    @block
+    async def func(state, context, store):
+        await asyncio.sleep(delay)
+        return value
+
+    return func
 
 
 class TestBlocks(unittest.TestCase):
@@ -30,6 +72,40 @@ class TestBlocks(unittest.TestCase):
             pb.forward(state, context, store).messages[0].content, "Hello World"
         )
 
+    def test_prompt_builder_sources(self):
+        pb = PromptBuilder(
+            [
+                SystemMessage("Static {{braces}}"),
+                UserMessage("{greeting}, {name}! {count:>3} {value!r}"),
+            ],
+            from_state={"greeting": "_out_0"},
+            from_store={"name": "user.name"},
+        )
+        store = Store()
+        store.update("user", KVData(name="Bob"))
+        context = Context(count=7, value="v")
+        prompt = pb.forward(KVData(_out_0="Hi"), context, store)
+        self.assertEqual(prompt.messages[0].content, "Static {braces}")
+        self.assertIsInstance(prompt.messages[0], SystemMessage)
+        self.assertEqual(prompt.messages[1].content, "Hi, Bob!   7 'v'")
+        self.assertIsInstance(prompt.messages[1], UserMessage)
+        self.assertEqual(sorted(pb.get_required_context_keys()), ["count", "value"])
+        # static messages are built once
+        again = pb.forward(KVData(_out_0="Hi"), context, store)
+        self.assertIs(again.messages[0], prompt.messages[0])
+        self.assertIsNot(again.messages, prompt.messages)
+
+    def test_prompt_builder_errors(self):
+        pb = PromptBuilder([UserMessage("Hello {name}")])
+        with self.assertRaises(KeyError):
+            pb.forward(None, Context(), Store())
+        with self.assertRaises(ValueError):
+            PromptBuilder([UserMessage("Hello {name}")], from_store={"name": "name"})
+        # unknown conversions are rejected when the template is compiled, like in str.format
+        for template in ("Hello {name!z}", "Hello {0!z}"):
+            with self.assertRaises(ValueError):
+                PromptBuilder([UserMessage(template)])
+
     def test_pipeline(self):
         p = Pipeline()
         p.add_block(Squash("{0} {1}"))
@@ -94,6 +170,197 @@ class TestBlocks(unittest.TestCase):
         store = Store()
         self.assertIs(func.forward(state, context, store), state_)
 
+    def test_switch(self):
+        calls = []
+
+        def make_branch(name):
+            block = InlineBlock(required_context_keys=[name])
+
+            @block
+            def func(state, context, store):
+                calls.append(name)
+                return f"{name}: {state['_out_0']}"
+
+            return func
+
+        switch = Switch(
+            lambda state, context, store: context["route"],
+            {"short": make_branch("short"), "long": make_branch("long")},
+            required_context_keys=["route", "short"],
+        )
+        pipeline = Identity() >> switch
+        self.assertEqual(pipeline.run(KVData(_out_0="Hi"), route="long")[0], "long: Hi")
+        self.assertEqual(calls, ["long"])
+        output = asyncio.run(pipeline.async_run(KVData(_out_0="Hi"), route="short"))
+        self.assertEqual(output[0], "short: Hi")
+        self.assertEqual(calls, ["long", "short"])
+        with self.assertRaises(KeyError):
+            pipeline.run(KVData(_out_0="Hi"), route="other")
+        switch.default = Identity()
+        self.assertEqual(pipeline.run(KVData(_out_0="Hi"), route="other")[0], "Hi")
+        self.assertEqual(switch.get_required_context_keys(), ["route", "short", "long"])
+
+    def test_race(self):
+        calls = []
+        race = (
+            Race() & _make_block("slow", 0.5, calls) & _make_block("fast", 0.0, calls)
+        )
+        start = time.perf_counter()
+        self.assertEqual(race.as_pipeline().run(KVData(_out_0="Hi"))[0], "fast")
+        self.assertLess(time.perf_counter() - start, 0.4)
+        output = asyncio.run(
+            (Race() & _make_async_block("slow", 0.5) & _make_async_block("fast"))
+            .as_pipeline()
+            .async_run()
+        )
+        self.assertEqual(output[0], "fast")
+
+    def test_race_validator_and_n(self):
+        race = Race(validator=lambda state: state["_out_0"] != "fast")
+        race = race & _make_block("slow", 0.1) & _make_block("fast")
+        self.assertEqual(race.as_pipeline().run()[0], "slow")
+        race = Race(n=2) & _make_block("a", 0.3) & _make_block("b") & _make_block("c")
+        output = (race >> Squash("{0} {1}")).run()[0]
+        self.assertIn(output, ["b c", "c b"])
+        race = Race(n=2) & _make_async_block("a", 0.2) & _make_async_block("b")
+        output = asyncio.run((race >> Squash("{0} {1}")).async_run())[0]
+        self.assertEqual(output, "b a")
+        race = Race(validator=lambda state: False) & _make_block("a") & _make_block("b")
+        with self.assertRaises(ValueError):
+            race.as_pipeline().run()
+        with self.assertRaises(ValueError):
+            (Race(n=3) & _make_block("a") & _make_block("b")).as_pipeline().run()
+
+    def test_race_usage(self):
+        race = Race()
+        race.add_block(FakeLLM() >> _make_async_block("slow", 0.5))
+        race.add_block(_make_async_block("fast"))
+        output, usage = asyncio.run(
+            race.as_pipeline().async_run(ChatPrompt([Message("Hello")]))
+        )
+        self.assertEqual(output, "fast")
+        # the tokens of the cancelled branch are still accounted
+        self.assertEqual(usage["total_tokens"], 21)
+        self.assertEqual(race.discarded_usage.get_usage()["total_tokens"], 21)
+
+        race = Race()
+        race.add_block(FakeLLM() >> _make_block("slow", 0.2))
+        race.add_block(_make_block("fast", 0.05))
+        output, _ = race.as_pipeline().run(ChatPrompt([Message("Hello")]))
+        self.assertEqual(output, "fast")
+        # the running sync branch completes in the background
+        time.sleep(0.4)
+        self.assertEqual(race.discarded_usage.get_usage()["total_tokens"], 21)
+
+    def test_map(self):
+        block = InlineBlock(required_context_keys=["suffix"])
+
+        @block
+        def upper(state, context, store):
+            time.sleep(0.05 if state["_out_0"] == "a" else 0.0)
+            return state["_out_0"].upper() + context["suffix"]
+
+        mapped = Map(upper, key="items", max_concurrency=2)
+        state = KVData(items=["a", "b", "c"])
+        out = mapped.forward(state, Context(suffix="!"), Store())
+        self.assertEqual(list(out.values()), ["A!", "B!", "C!"])
+        out = asyncio.run(mapped.async_forward(state, Context(suffix="?"), Store()))
+        self.assertEqual(list(out.values()), ["A?", "B?", "C?"])
+        self.assertEqual(mapped.get_required_context_keys(), ["suffix"])
+        # without a key, each value of the state is an element
+        pipeline = (
+            InlineBlock()(lambda *_: ["x", "y"]) >> Map(upper) >> Squash("{0}{1}")
+        )
+        self.assertEqual(pipeline.run(suffix="")[0], "XY")
+
+    def test_map_cache(self):
+        calls = []
+        block = InlineBlock()
+
+        @block
+        def echo(state, context, store):
+            calls.append(state["_out_0"])
+            return state["_out_0"] + context["suffix"]
+
+        mapped = Map(echo, cache=InMemoryCache())
+        state = KVData(_out_0="a", _out_1="b", _out_2="a")
+        mapped.forward(state, Context(suffix="!"), Store())
+        out = mapped.forward(state, Context(suffix="!"), Store())
+        self.assertEqual(list(out.values()), ["a!", "b!", "a!"])
+        self.assertEqual(sorted(calls), ["a", "a", "b"])
+        # the context is a part of the cache key
+        out = mapped.forward(state, Context(suffix="?"), Store())
+        self.assertEqual(out["_out_1"], "b?")
+
+    def test_map_shared_cache(self):
+        cache = InMemoryCache()
+        upper = InlineBlock()(lambda state, *_: state["_out_0"].upper())
+        lower = InlineBlock()(lambda state, *_: state["_out_0"].lower())
+
+        def upper_fn(state, context, store):
+            return state["_out_0"].upper()
+
+        def lower_fn(state, context, store):
+            return state["_out_0"].lower()
+
+        state = KVData(_out_0="Ab")
+        out = Map(InlineBlock()(upper_fn), cache=cache).forward(
+            state, Context(), Store()
+        )
+        self.assertEqual(out["_out_0"], "AB")
+        out = Map(InlineBlock()(lower_fn), cache=cache).forward(
+            state, Context(), Store()
+        )
+        self.assertEqual(out["_out_0"], "ab")
+        # the lambdas share a qualname, so they need an explicit namespace
+        Map(upper, cache=cache, cache_namespace="upper").forward(
+            state, Context(), Store()
+        )
+        out = Map(lower, cache=cache, cache_namespace="lower").forward(
+            state, Context(), Store()
+        )
+        self.assertEqual(out["_out_0"], "ab")
+
+    def test_map_errors(self):
+        block = InlineBlock()
+
+        @block
+        def parse(state, context, store):
+            return str(int(state["_out_0"]))
+
+        state = KVData(_out_0="1", _out_1="x", _out_2="3")
+        with self.assertRaises(ValueError):
+            Map(parse).forward(state, Context(), Store())
+        store = Store()
+        out = Map(parse, on_error="skip", errors_key="errors").forward(
+            state, Context(), store
+        )
+        self.assertEqual(list(out.values()), ["1", "3"])
+        self.assertIsInstance(store.get_misc("errors")[1], ValueError)
+        out = asyncio.run(
+            Map(parse, on_error="default", default="").async_forward(
+                state, Context(), Store()
+            )
+        )
+        self.assertEqual(list(out.values()), ["1", "", "3"])
+
+    def test_parallel_required_context_keys(self):
+        parallel = Parallel() & InlineBlock(["a"])(lambda *_: "a")
+        parallel.add_block(InlineBlock(["b"])(lambda *_: "b"))
+        self.assertEqual(parallel.get_required_context_keys(), ["a", "b"])
+
+    def test_pipeline_stream(self):
+        pipeline = Identity() >> (Identity() >> StreamingFakeLLM())
+        stream = pipeline.async_stream(ChatPrompt([Message("Hello")]))
+        self.assertEqual(asyncio.run(_collect(stream)), ["Fake", " response"])
+        self.assertEqual(stream.usage["total_tokens"], 21)
+
+    def test_pipeline_stream_fallback(self):
+        pipeline = Identity() >> FakeLLM() >> Identity()
+        stream = pipeline.async_stream(ChatPrompt([Message("Hello")]))
+        self.assertEqual(asyncio.run(_collect(stream)), ["Fake response"])
+        self.assertEqual(stream.usage["total_tokens"], 21)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import asyncio
+import tempfile
+import threading
+import warnings
+from agent_dingo.core.blocks import InlineBlock, PromptBuilder, SaveState, Squash
+from agent_dingo.core.checkpoint import (
+    Checkpoint,
+    FileCheckpointer,
+    SQLiteCheckpointer,
+)
+from agent_dingo.core.message import UserMessage
+from agent_dingo.core.state import KVData
+from tests.fake_llm import FakeLLM
+
+
+def _make_step(name, calls, fail=None):
+    block = InlineBlock()
+
+    @block
+    def func(state, context, store):
+        calls.append(name)
+        if fail is not None and fail[0]:
+            raise RuntimeError("Step failed")
+        return state["_out_0"] + f" {name}"
+
+    return func
+
+
+def _make_pipeline(calls, fail):
+    return (
+        PromptBuilder([UserMessage("Hello {name}")])
+        >> FakeLLM()
+        >> SaveState("llm")
+        >> _make_step("a", calls)
+        >> _make_step("b", calls, fail)
+    )
+
+
+class TestCheckpoint(unittest.TestCase):
+    def _check_resume(self, checkpointer, is_async=False):
+        calls = []
+        fail = [True]
+        pipeline = _make_pipeline(calls, fail)
+        with self.assertRaises(RuntimeError):
+            if is_async:
+                asyncio.run(
+                    pipeline.async_run(
+                        _checkpointer=checkpointer, _run_id="run/1", name="World"
+                    )
+                )
+            else:
+                pipeline.run(_checkpointer=checkpointer, _run_id="run/1", name="World")
+        checkpointer.flush()
+        checkpoint = checkpointer.load("run/1")
+        self.assertEqual(checkpoint.step, 4)
+        self.assertEqual(checkpoint.context, {"name": "World"})
+        self.assertEqual(checkpoint.state["_out_0"], "Fake response a")
+
+        fail[0] = False
+        calls.clear()
+        if is_async:
+            output, usage = asyncio.run(pipeline.async_resume("run/1", checkpointer))
+        else:
+            output, usage = pipeline.resume("run/1", checkpointer)
+        self.assertEqual(output, "Fake response a b")
+        # the completed blocks (including the LLM call) are not executed again
+        self.assertEqual(calls, ["b"])
+        self.assertEqual(usage["total_tokens"], 21)
+        checkpointer.flush()
+        self.assertIsNone(checkpointer.load("run/1"))
+
+    def test_file_checkpointer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpointer = FileCheckpointer(directory)
+            self._check_resume(checkpointer)
+            # the checkpoints survive the checkpointer
+            calls = []
+            with self.assertRaises(RuntimeError):
+                _make_pipeline(calls, [True]).run(
+                    _checkpointer=checkpointer, _run_id="run/2", name="World"
+                )
+            checkpointer.close()
+            checkpoint = FileCheckpointer(directory).load("run/2")
+            self.assertEqual(checkpoint.step, 4)
+            self.assertEqual(checkpoint.store["data"]["llm"]["_out_0"], "Fake response")
+
+    def test_sqlite_checkpointer(self):
+        checkpointer = SQLiteCheckpointer(":memory:")
+        self._check_resume(checkpointer)
+        self._check_resume(checkpointer, is_async=True)
+        checkpointer.close()
+
+    def test_snapshot_is_taken_at_save(self):
+        checkpointer = SQLiteCheckpointer(":memory:")
+        state = KVData(_out_0="a")
+        misc = {"items": [1]}
+        store = {"prompts": {}, "data": {}, "misc": misc, "usage": {}}
+        checkpointer.save(Checkpoint("run", 1, 2, state, {}, store))
+        # the changes made after the step boundary are not part of the checkpoint
+        misc["items"].append(2)
+        checkpointer.flush()
+        checkpoint = checkpointer.load("run")
+        self.assertEqual(checkpoint.store["misc"]["items"], [1])
+        checkpointer.close()
+
+    def test_successful_run(self):
+        checkpointer = SQLiteCheckpointer(":memory:")
+        pipeline = _make_pipeline([], [False])
+        output, _ = pipeline.run(_checkpointer=checkpointer, _run_id="1", name="World")
+        self.assertEqual(output, "Fake response a b")
+        checkpointer.flush()
+        self.assertIsNone(checkpointer.load("1"))
+        with self.assertRaises(KeyError):
+            pipeline.resume("1", checkpointer)
+        with self.assertRaises(ValueError):
+            pipeline.run(_checkpointer=checkpointer, name="World")
+
+    def test_pipeline_mismatch(self):
+        checkpointer = SQLiteCheckpointer(":memory:")
+        with self.assertRaises(RuntimeError):
+            _make_pipeline([], [True]).run(
+                _checkpointer=checkpointer, _run_id="1", name="World"
+            )
+        with self.assertRaises(ValueError):
+            (Squash("{0}") >> Squash("{0}")).resume("1", checkpointer)
+
+    def test_unpicklable_store_item(self):
+        block = InlineBlock()
+
+        @block
+        def func(state, context, store):
+            store.update("lock", threading.Lock())
+            store.update("note", "kept")
+            return state
+
+        checkpointer = SQLiteCheckpointer(":memory:")
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            with self.assertRaises(RuntimeError):
+                (func >> _make_step("a", [], [True])).run(
+                    KVData(_out_0="Hello"), _checkpointer=checkpointer, _run_id="1"
+                )
+            checkpointer.flush()
+        self.assertTrue(any("lock" in str(warning.message) for warning in w))
+        self.assertEqual(checkpointer.n_errors, 0)
+        store = checkpointer.load("1").store
+        self.assertEqual(store["misc"], {"note": "kept"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import unittest
+import asyncio
+import time
+from agent_dingo.core.deadline import Deadline, DeadlineExceededError, remaining_time
+from agent_dingo.core.executor import BlockExecutor
+from agent_dingo.core.blocks import BaseLLM, Parallel, InlineBlock, Squash, Identity
+from agent_dingo.core.state import KVData, ChatPrompt
+from agent_dingo.core.message import UserMessage
+
+
+def _make_block(value, delay=0.0, calls=None):
+    block = InlineBlock()
+
+    @block
+    def func(state, context, store):
+        if calls is not None:
+            calls.append(value)
+        time.sleep(delay)
+        return value
+
+    return func
+
+
+def _make_async_block(value, delay=0.0, cancelled=None):
+    block = InlineBlock()
+
+    @block
+    async def func(state, context, store):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(value)
+            raise
+        return value
+
+    return func
+
+
+class TimeoutRecordingLLM(BaseLLM):
+    def __init__(self):
+        self.temperature = 0.0
+        self.timeouts = []
+
+    def send_message(self, messages, functions=None, usage_meter=None, **kwargs):
+        self.timeouts.append(kwargs.get("timeout"))
+        return {"role": "assistant", "content": "ok"}
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter=None, **kwargs
+    ):
+        return self.send_message(messages, functions, usage_meter, **kwargs)
+
+
+class TestDeadline(unittest.TestCase):
+    def test_remaining_and_check(self):
+        deadline = Deadline(0.05)
+        self.assertFalse(deadline.expired)
+        self.assertLessEqual(deadline.remaining(), 0.05)
+        time.sleep(0.06)
+        self.assertTrue(deadline.expired)
+        self.assertEqual(deadline.remaining(), 0.0)
+        with self.assertRaises(DeadlineExceededError):
+            deadline.check()
+        with self.assertRaises(DeadlineExceededError):
+            remaining_time(deadline)
+
+    def test_no_deadline(self):
+        self.assertIsNone(Deadline.from_timeout(None))
+        self.assertIsNone(remaining_time(None))
+        with self.assertRaises(ValueError):
+            Deadline(0)
+
+    def test_is_timeout_error(self):
+        self.assertTrue(issubclass(DeadlineExceededError, TimeoutError))
+
+
+class TestPipelineDeadline(unittest.TestCase):
+    def test_sync_run_stops_at_next_block(self):
+        calls = []
+        pipeline = _make_block("a", delay=0.1, calls=calls) >> _make_block(
+            "b", calls=calls
+        )
+        with self.assertRaises(DeadlineExceededError):
+            pipeline.run(_state=KVData(_out_0="x"), _timeout=0.05)
+        self.assertEqual(calls, ["a"])
+
+    def test_sync_run_within_deadline(self):
+        pipeline = _make_block("a") >> _make_block("b")
+        output, _ = pipeline.run(_state=KVData(_out_0="x"), _timeout=5)
+        self.assertEqual(output, "b")
+
+    def test_async_run_cancels_in_flight_block(self):
+        cancelled = []
+        pipeline = Identity() >> _make_async_block("a", 1.0, cancelled)
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceededError):
+            asyncio.run(pipeline.async_run(_state=KVData(_out_0="x"), _timeout=0.05))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(cancelled, ["a"])
+
+    def test_block_timeout_is_not_a_deadline(self):
+        block = InlineBlock()
+
+        @block
+        async def func(state, context, store):
+            raise TimeoutError("the block timed out")
+
+        pipeline = Identity() >> func
+        with self.assertRaises(TimeoutError) as cm:
+            asyncio.run(pipeline.async_run(_state=KVData(_out_0="x"), _timeout=5))
+        self.assertNotIsInstance(cm.exception, DeadlineExceededError)
+
+    def test_async_parallel_cancels_siblings(self):
+        cancelled = []
+        parallel = Parallel()
+        parallel.add_block(_make_async_block("fast", 0.0, cancelled))
+        parallel.add_block(_make_async_block("slow", 1.0, cancelled))
+        pipeline = parallel >> Squash("{0} {1}")
+        with self.assertRaises(DeadlineExceededError):
+            asyncio.run(pipeline.async_run(_state=KVData(_out_0="x"), _timeout=0.05))
+        self.assertEqual(cancelled, ["slow"])
+
+    def test_sync_parallel_stops_waiting(self):
+        parallel = Parallel()
+        parallel.add_block(_make_block("fast"))
+        parallel.add_block(_make_block("slow", 0.3))
+        pipeline = parallel >> Squash("{0} {1}")
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceededError):
+            pipeline.run(_state=KVData(_out_0="x"), _timeout=0.05)
+        self.assertLess(time.perf_counter() - start, 0.25)
+
+    def test_llm_receives_remaining_time(self):
+        llm = TimeoutRecordingLLM()
+        prompt = ChatPrompt([UserMessage("hi")])
+        pipeline = Identity() >> llm
+        pipeline.run(_state=prompt)
+        pipeline.run(_state=prompt, _timeout=5)
+        self.assertIsNone(llm.timeouts[0])
+        self.assertGreater(llm.timeouts[1], 0)
+        self.assertLessEqual(llm.timeouts[1], 5)
+
+
+class TestExecutorDeadline(unittest.TestCase):
+    def test_pending_tasks_are_skipped(self):
+        executor = BlockExecutor(max_workers=1)
+        calls = []
+
+        def make(i):
+            def fn():
+                calls.append(i)
+                time.sleep(0.1)
+                return i
+
+            return fn
+
+        try:
+            with self.assertRaises(DeadlineExceededError):
+                executor.run_all(
+                    [make(i) for i in range(5)],
+                    max_concurrency=1,
+                    deadline=Deadline(0.05),
+                )
+            time.sleep(0.15)
+            self.assertLessEqual(len(calls), 2)
+        finally:
+            executor.shutdown()
@@ -0,0 +1,166 @@
+import unittest
+import asyncio
+import threading
+import time
+from agent_dingo.core.executor import (
+    BlockExecutor,
+    get_executor,
+    configure_executor,
+    shutdown_executor,
+)
+from agent_dingo.core.blocks import Parallel, InlineBlock, Squash
+from agent_dingo.core.state import KVData, Context, Store
+
+
+def _make_block(value, delay=0.0):
+    block = InlineBlock()
+
+    @block
+    def func(state, context, store):
+        time.sleep(delay)
+        return value
+
+    return func
+
+
+class TestBlockExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = BlockExecutor(max_workers=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_run_all_preserves_order(self):
+        fns = [lambda i=i: (time.sleep(0.01 * (5 - i)), i)[1] for i in range(5)]
+        self.assertEqual(self.executor.run_all(fns), [0, 1, 2, 3, 4])
+
+    def test_run_all_raises_first_exception(self):
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.executor.run_all([lambda: 1, fail])
+
+    def test_max_concurrency(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def fn():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        self.executor.run_all([fn] * 6, max_concurrency=2)
+        self.assertLessEqual(peak[0], 2)
+
+    def test_nested_does_not_deadlock(self):
+        executor = BlockExecutor(max_workers=1)
+        inner = lambda: executor.run_all([lambda: 1, lambda: 2])
+        self.assertEqual(executor.run_all([inner, inner]), [[1, 2], [1, 2]])
+        executor.shutdown()
+
+    def test_run_first(self):
+        calls = []
+
+        def fn(i, delay):
+            time.sleep(delay)
+            calls.append(i)
+            return i
+
+        fns = [lambda: fn(0, 0.3), lambda: fn(1, 0.0), lambda: fn(2, 0.0)]
+        # with 2 workers, the third callable is skipped once the second one completes
+        self.assertEqual(self.executor.run_first(fns, max_concurrency=2), [(1, 1)])
+        time.sleep(0.4)
+        self.assertEqual(sorted(calls), [0, 1])
+
+        def fail():
+            raise ValueError("boom")
+
+        self.assertEqual(self.executor.run_first([fail, lambda: 1]), [(1, 1)])
+        with self.assertRaises(ValueError):
+            self.executor.run_first([fail, lambda: 1], n=2)
+
+    def test_run_first_does_not_deadlock(self):
+        executor = BlockExecutor(max_workers=1)
+        inner = lambda: executor.run_first([lambda: 1, lambda: 2])[0][1]
+        self.assertEqual(executor.run_first([inner, inner])[0][1], 1)
+        executor.shutdown()
+
+    def test_stats(self):
+        self.executor.run_all([lambda: 1, lambda: 2, lambda: 3])
+        stats = self.executor.get_stats()
+        self.assertEqual(stats["completed"], 3)
+        self.assertEqual(stats["active"], 0)
+        self.assertEqual(stats["max_workers"], 2)
+
+    def test_shutdown(self):
+        self.executor.shutdown()
+        with self.assertRaises(RuntimeError):
+            self.executor.run_all([lambda: 1])
+
+
+class TestProcessExecutor(unittest.TestCase):
+    def tearDown(self):
+        shutdown_executor()
+
+    def test_configure_executor(self):
+        executor = configure_executor(max_workers=3)
+        self.assertIs(get_executor(), executor)
+        self.assertEqual(executor.max_workers, 3)
+        shutdown_executor()
+        self.assertIsNot(get_executor(), executor)
+
+    def test_reconfigure_during_run(self):
+        old = get_executor()
+        started = threading.Event()
+
+        def first():
+            started.set()
+            time.sleep(0.05)
+            return 1
+
+        results = []
+        # the run keeps submitting its remaining callables to the replaced executor
+        thread = threading.Thread(
+            target=lambda: results.append(
+                old.run_all([first] + [lambda: 2] * 3, max_concurrency=1)
+            )
+        )
+        thread.start()
+        started.wait()
+        configure_executor(max_workers=2)
+        thread.join()
+        self.assertEqual(results, [[1, 2, 2, 2]])
+        with self.assertRaises(RuntimeError):
+            old.run_all([lambda: 1])
+
+
+class TestParallel(unittest.TestCase):
+    def test_parallel_forward(self):
+        p = Parallel(max_concurrency=2) & _make_block("a", 0.01) & _make_block("b")
+        p.add_block(_make_block("c"))
+        out = p.forward(None, Context(), Store())
+        self.assertEqual(out.dict, {"_out_0": "a", "_out_1": "b", "_out_2": "c"})
+
+    def test_nested_parallel(self):
+        inner = (_make_block("a") & _make_block("b")) >> Squash("{0}{1}")
+        outer = Parallel() & inner & _make_block("c")
+        out = outer.forward(None, Context(), Store())
+        self.assertEqual(out.dict, {"_out_0": "ab", "_out_1": "c"})
+
+    def test_parallel_async_forward(self):
+        async def value(state, context, store):
+            return "a"
+
+        block = InlineBlock()(value)
+        p = Parallel(max_concurrency=1) & block & block
+        out = asyncio.run(p.async_forward(None, Context(), Store()))
+        self.assertEqual(out.dict, {"_out_0": "a", "_out_1": "a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
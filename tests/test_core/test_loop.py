@@ -0,0 +1,138 @@
+import unittest
+import asyncio
+import warnings
+from agent_dingo.core.loop import (
+    BackgroundLoop,
+    get_background_loop,
+    run_sync,
+    shutdown_background_loop,
+)
+from agent_dingo.core.blocks import InlineBlock
+from agent_dingo.core.deadline import Deadline, DeadlineExceededError
+from agent_dingo.core.executor import get_executor
+from agent_dingo.core.state import KVData, Context, Store
+
+
+async def _get_loop():
+    return asyncio.get_running_loop()
+
+
+class TestBackgroundLoop(unittest.TestCase):
+    def setUp(self):
+        self.loop = BackgroundLoop()
+
+    def tearDown(self):
+        self.loop.shutdown()
+
+    def test_run_reuses_loop(self):
+        first = self.loop.run(_get_loop())
+        second = self.loop.run(_get_loop())
+        self.assertIs(first, second)
+        self.assertTrue(first.is_running())
+
+    def test_run_inside_running_loop(self):
+        async def main():
+            return self.loop.run(_get_loop()), asyncio.get_running_loop()
+
+        background, caller = asyncio.run(main())
+        self.assertIsNot(background, caller)
+
+    def test_nested_run(self):
+        async def outer():
+            return self.loop.run(asyncio.sleep(0, result="inner"))
+
+        self.assertEqual(self.loop.run(outer()), "inner")
+
+    def test_deadline(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with self.assertRaises(DeadlineExceededError):
+            self.loop.run(slow(), Deadline(0.05))
+        self.loop.run(asyncio.sleep(0.01))
+        self.assertEqual(cancelled, [True])
+
+    def test_nested_deadline(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def outer():
+            with self.assertRaises(DeadlineExceededError):
+                self.loop.run(slow(), Deadline(0.05))
+            return True
+
+        self.assertTrue(self.loop.run(outer(), Deadline(0.5)))
+        self.assertEqual(cancelled, [True])
+
+    def test_exception(self):
+        async def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.loop.run(fail())
+
+    def test_shutdown(self):
+        loop = BackgroundLoop()
+        loop.run(asyncio.sleep(0))
+        loop.shutdown()
+        coro = asyncio.sleep(0)
+        with self.assertRaises(RuntimeError):
+            loop.submit(coro)
+        # the rejected coroutine is closed, so it is not reported as never awaited
+        self.assertIsNone(coro.cr_frame)
+
+    def test_process_wide_loop(self):
+        loop = get_background_loop()
+        self.assertIs(get_background_loop(), loop)
+        self.assertEqual(run_sync(asyncio.sleep(0, result=1)), 1)
+        shutdown_background_loop()
+        self.assertIsNot(get_background_loop(), loop)
+
+    def test_nested_run_from_executor_thread(self):
+        async def inner():
+            return 1
+
+        def sync_code():
+            # the executor workers block on the loop that runs the outer coroutine
+            return get_executor().run_all([lambda: run_sync(inner()) for _ in range(4)])
+
+        async def outer():
+            return sync_code()
+
+        self.assertEqual(run_sync(outer(), Deadline(2)), [1] * 4)
+
+    def test_async_inline_block(self):
+        block = InlineBlock()
+
+        @block
+        async def func(state, context, store):
+            return str(id(asyncio.get_running_loop()))
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            first = func.forward(None, Context(), Store())
+            second = func.forward(None, Context(), Store())
+
+            async def main():
+                # a sync call from a coroutine does not require nest_asyncio
+                return func.forward(None, Context(), Store())
+
+            third = asyncio.run(main())
+        self.assertEqual(first["_out_0"], second["_out_0"])
+        self.assertEqual(first["_out_0"], third["_out_0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import asyncio
+import time
+from agent_dingo.core.retry import (
+    RetryPolicy,
+    RetryBudget,
+    is_retryable_error,
+    get_retry_after,
+)
+from agent_dingo.core.deadline import DeadlineExceededError
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        self.response = _Response(status_code, headers)
+        self.status_code = status_code
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+class Flaky:
+    def __init__(self, errors, result="ok"):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+        self.timeouts = []
+
+    def __call__(self, timeout=None):
+        self.calls += 1
+        self.timeouts.append(timeout)
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+class TestRetryClassification(unittest.TestCase):
+    def test_retryable_errors(self):
+        self.assertTrue(is_retryable_error(HTTPError(429)))
+        self.assertTrue(is_retryable_error(HTTPError(503)))
+        self.assertTrue(is_retryable_error(APIConnectionError()))
+        self.assertTrue(is_retryable_error(ConnectionResetError()))
+
+    def test_non_retryable_errors(self):
+        self.assertFalse(is_retryable_error(HTTPError(400)))
+        self.assertFalse(is_retryable_error(HTTPError(401)))
+        self.assertFalse(is_retryable_error(ValueError()))
+        self.assertFalse(is_retryable_error(DeadlineExceededError()))
+
+    def test_retry_after(self):
+        self.assertEqual(get_retry_after(HTTPError(429, {"retry-after": "2"})), 2.0)
+        self.assertEqual(
+            get_retry_after(HTTPError(429, {"retry-after-ms": "1500"})), 1.5
+        )
+        self.assertIsNone(get_retry_after(HTTPError(429)))
+        self.assertIsNone(get_retry_after(ValueError()))
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def _policy(self, **kwargs):
+        kwargs.setdefault("base_delay", 0.001)
+        kwargs.setdefault("budget", RetryBudget(ratio=1.0, burst=100))
+        return RetryPolicy(**kwargs)
+
+    def test_retries_transient_errors(self):
+        fn = Flaky([HTTPError(500), HTTPError(429)])
+        self.assertEqual(self._policy().call(fn), "ok")
+        self.assertEqual(fn.calls, 3)
+
+    def test_does_not_retry_client_errors(self):
+        fn = Flaky([HTTPError(400)])
+        with self.assertRaises(HTTPError):
+            self._policy().call(fn)
+        self.assertEqual(fn.calls, 1)
+
+    def test_gives_up_after_max_attempts(self):
+        fn = Flaky([HTTPError(500)] * 5)
+        with self.assertRaises(HTTPError):
+            self._policy(max_attempts=2).call(fn)
+        self.assertEqual(fn.calls, 2)
+
+    def test_full_jitter_is_bounded(self):
+        policy = self._policy(base_delay=1.0, max_delay=5.0)
+        for attempt in range(6):
+            delay = policy.get_delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(5.0, 2**attempt))
+
+    def test_honors_retry_after(self):
+        policy = self._policy(max_delay=10.0)
+        self.assertGreaterEqual(
+            policy.get_delay(0, HTTPError(429, {"retry-after": "3"})), 3.0
+        )
+
+    def test_timeout_bounds_all_attempts(self):
+        fn = Flaky([HTTPError(500, {"retry-after": "5"})])
+        start = time.monotonic()
+        with self.assertRaises(HTTPError):
+            self._policy().call(fn, timeout=1.0)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(fn.calls, 1)
+
+    def test_remaining_time_is_passed_to_attempts(self):
+        fn = Flaky([HTTPError(500)])
+        self._policy().call(fn, timeout=10.0)
+        self.assertAlmostEqual(fn.timeouts[0], 10.0, places=2)
+        self.assertLess(fn.timeouts[1], fn.timeouts[0])
+
+    def test_budget_limits_retries(self):
+        budget = RetryBudget(ratio=0.0, burst=1)
+        policy = self._policy(budget=budget)
+        fn = Flaky([HTTPError(500)] * 3)
+        with self.assertRaises(HTTPError):
+            policy.call(fn)
+        self.assertEqual(fn.calls, 2)
+        self.assertEqual(budget.get_stats()["rejected"], 1)
+
+    def test_async_call(self):
+        fn = Flaky([HTTPError(502)])
+
+        async def coro_fn(**kwargs):
+            return fn(**kwargs)
+
+        self.assertEqual(asyncio.run(self._policy().async_call(coro_fn)), "ok")
+        self.assertEqual(fn.calls, 2)
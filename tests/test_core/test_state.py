@@ -1,6 +1,8 @@
 import unittest
+import json
+import pickle
 from agent_dingo.core.state import ChatPrompt, KVData, Context, UsageMeter, Store
-from agent_dingo.core.message import Message
+from agent_dingo.core.message import Message, UserMessage, AssistantMessage
 
 
 class TestState(unittest.TestCase):
@@ -8,6 +10,33 @@ class TestState(unittest.TestCase):
         cp = ChatPrompt([Message("Hello")])
         self.assertEqual(cp.dict, [{"role": "undefined", "content": "Hello"}])
 
+    def test_chat_prompt_is_immutable(self):
+        m = Message("Hello")
+        cp = ChatPrompt([m])
+        with self.assertRaises(AttributeError):
+            m.content = "Bye"
+        with self.assertRaises(AttributeError):
+            cp.messages.append(Message("Bye"))
+        # the returned list can be extended without affecting the prompt
+        messages = cp.dict
+        messages.append({"role": "user", "content": "Bye"})
+        self.assertEqual(len(cp.dict), 1)
+        # the returned messages are copies, so modifying them does not affect the shared prompt
+        messages[0]["content"] = "Bye"
+        m.dict["content"] = "Bye"
+        self.assertEqual(cp.dict[0], {"role": "undefined", "content": "Hello"})
+        self.assertEqual(m.content, "Hello")
+
+    def test_chat_prompt_append(self):
+        cp = ChatPrompt([UserMessage("Hello")])
+        cp.dict
+        extended = cp.append(AssistantMessage("Hi"), UserMessage("Bye"))
+        self.assertEqual(len(cp), 1)
+        self.assertEqual(len(extended), 3)
+        self.assertIs(extended.messages[0], cp.messages[0])
+        self.assertIs(extended._wire[0], cp._wire[0])
+        self.assertEqual(extended.dict[2], {"role": "user", "content": "Bye"})
+
     def test_kvdata(self):
         kv = KVData(a="1", b="2")
         self.assertEqual(kv["a"], "1")
@@ -15,6 +44,15 @@ class TestState(unittest.TestCase):
         self.assertEqual(kv.dict, {"a": "1", "b": "2"})
         with self.assertRaises(KeyError):
             kv.update("a", "3")
+        updated = kv.update("c", "3")
+        self.assertEqual(updated.dict, {"a": "1", "b": "2", "c": "3"})
+        self.assertNotIn("c", kv.keys())
+        # the returned dict is cached and read-only
+        self.assertIs(kv.dict, kv.dict)
+        with self.assertRaises(TypeError):
+            kv.dict["c"] = "3"
+        self.assertEqual(json.loads(json.dumps(kv.dict)), {"a": "1", "b": "2"})
+        self.assertEqual(pickle.loads(pickle.dumps(kv)).dict, kv.dict)
 
     def test_context(self):
         ctx = Context(a="1", b="2")
@@ -0,0 +1,57 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+from agent_dingo.core.blocks import Identity, PromptBuilder, Squash
+from agent_dingo.core.message import UserMessage
+from agent_dingo.core.state import KVData
+from agent_dingo.core.tracing import Tracer
+from tests.fake_llm import FakeLLM
+
+
+def _make_pipeline():
+    llm = FakeLLM()
+    pb = PromptBuilder([UserMessage("Hello {name}")])
+    return ((pb >> llm) & (pb >> llm)) >> Squash("{0} {1}")
+
+
+class TestTracer(unittest.TestCase):
+    def test_sync_run(self):
+        tracer = Tracer()
+        output, usage = _make_pipeline().run(_tracer=tracer, name="World")
+        self.assertEqual(output, "Fake response Fake response")
+        self.assertEqual(usage["total_tokens"], 42)
+        names = [(s.name, s.category) for s in tracer.spans]
+        self.assertEqual(names.count(("FakeLLM", "llm")), 2)
+        self.assertEqual(names.count(("FakeLLM", "block")), 2)
+        self.assertEqual(names.count(("Parallel", "block")), 1)
+        llm_span = next(s for s in tracer.spans if s.category == "llm")
+        self.assertEqual(llm_span.args["total_tokens"], 21)
+
+    def test_async_run(self):
+        tracer = Tracer()
+        _, usage = asyncio.run(_make_pipeline().async_run(_tracer=tracer, name="World"))
+        self.assertEqual(usage["total_tokens"], 42)
+        tasks = {s.task_id for s in tracer.spans if s.category == "llm"}
+        self.assertEqual(len(tasks), 2)
+
+    def test_chrome_trace_export(self):
+        tracer = Tracer()
+        Identity().as_pipeline().run(KVData(_out_0="Hello"), _tracer=tracer)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            tracer.export_chrome_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+        events = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual({e["name"] for e in events}, {"Pipeline", "Identity"})
+        self.assertTrue(all(e["dur"] >= 0 for e in events))
+
+    def test_disabled(self):
+        output, _ = _make_pipeline().run(name="World")
+        self.assertEqual(output, "Fake response Fake response")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import asyncio
+from agent_dingo.llm.adaptive import (
+    AdaptiveLimiter,
+    AdaptiveConcurrencyLLM,
+    is_throttling_error,
+)
+from tests.fake_llm import FakeLLM
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class ThrottlingError(Exception):
+    status_code = 429
+
+
+class ConcurrencyTrackingLLM(FakeLLM):
+    def __init__(self, fail_above=None, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail_above = fail_above
+
+    async def async_send_message(self, *args, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.fail_above is not None and self.in_flight > self.fail_above:
+                raise ThrottlingError()
+            return FakeLLM.send_message(self, *args, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    def test_additive_increase(self):
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=4)
+        for _ in range(2):
+            limiter.release(limiter.acquire(), latency=0.1)
+        self.assertEqual(limiter.limit, 2)
+        for _ in range(20):
+            limiter.release(limiter.acquire(), latency=0.1)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_multiplicative_decrease_once_per_epoch(self):
+        limiter = AdaptiveLimiter(initial_limit=8)
+        epochs = [limiter.acquire() for _ in range(3)]
+        for epoch in epochs:
+            limiter.release(epoch, error=ThrottlingError())
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.get_stats()["throttled"], 3)
+        limiter.release(limiter.acquire(), error=ThrottlingError())
+        self.assertEqual(limiter.limit, 2)
+
+    def test_queued_request_decreases_after_backoff(self):
+        limiter = AdaptiveLimiter(initial_limit=4)
+
+        async def run():
+            epochs = [await limiter.async_acquire() for _ in range(4)]
+            queued = asyncio.ensure_future(limiter.async_acquire())
+            await asyncio.sleep(0)
+            for epoch in epochs:
+                limiter.release(epoch, error=ThrottlingError())
+            self.assertEqual(limiter.limit, 2)
+            # the queued request was granted under the lower limit
+            limiter.release(await queued, error=ThrottlingError())
+            self.assertEqual(limiter.limit, 1)
+
+        asyncio.run(run())
+
+    def test_other_errors_do_not_decrease(self):
+        limiter = AdaptiveLimiter(initial_limit=8)
+        limiter.release(limiter.acquire(), error=ValueError())
+        self.assertEqual(limiter.limit, 8)
+
+    def test_rising_latency_decreases(self):
+        limiter = AdaptiveLimiter(initial_limit=8, latency_tolerance=2.0)
+        limiter.release(limiter.acquire(), latency=0.1)
+        for _ in range(10):
+            limiter.release(limiter.acquire(), latency=1.0)
+        self.assertLess(limiter.limit, 8)
+
+    def test_is_throttling_error(self):
+        class ServerError(Exception):
+            status_code = 503
+
+        self.assertTrue(is_throttling_error(ThrottlingError()))
+        self.assertTrue(is_throttling_error(ServerError()))
+        self.assertFalse(is_throttling_error(ValueError()))
+
+
+class TestAdaptiveConcurrencyLLM(unittest.TestCase):
+    def test_limits_in_flight_requests(self):
+        inner = ConcurrencyTrackingLLM()
+        llm = AdaptiveConcurrencyLLM(
+            inner, AdaptiveLimiter(initial_limit=2, max_limit=2)
+        )
+
+        async def run():
+            return await asyncio.gather(
+                *[llm.async_send_message(MESSAGES) for _ in range(10)]
+            )
+
+        responses = asyncio.run(run())
+        self.assertEqual(len(responses), 10)
+        self.assertEqual(inner.max_in_flight, 2)
+        self.assertEqual(llm.get_stats()["in_flight"], 0)
+
+    def test_backs_off_on_throttling(self):
+        inner = ConcurrencyTrackingLLM(fail_above=2)
+        llm = AdaptiveConcurrencyLLM(inner, AdaptiveLimiter(initial_limit=8))
+
+        async def run():
+            return await asyncio.gather(
+                *[llm.async_send_message(MESSAGES) for _ in range(8)],
+                return_exceptions=True,
+            )
+
+        asyncio.run(run())
+        self.assertEqual(llm.limit, 4)
+
+    def test_cancelled_waiter(self):
+        llm = AdaptiveConcurrencyLLM(
+            ConcurrencyTrackingLLM(), AdaptiveLimiter(initial_limit=1, max_limit=1)
+        )
+
+        async def run():
+            first = asyncio.ensure_future(llm.async_send_message(MESSAGES))
+            second = asyncio.ensure_future(llm.async_send_message(MESSAGES))
+            await asyncio.sleep(0)
+            second.cancel()
+            await first
+            return await llm.async_send_message(MESSAGES)
+
+        asyncio.run(run())
+        self.assertEqual(llm.get_stats()["waiting"], 0)
+        self.assertEqual(llm.get_stats()["in_flight"], 0)
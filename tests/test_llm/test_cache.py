@@ -0,0 +1,190 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from agent_dingo.llm.cache import (
+    CachedLLM,
+    InMemoryCache,
+    SQLiteCache,
+    TieredCache,
+    make_request_key,
+)
+from agent_dingo.llm.router import RouterLLM
+from agent_dingo.core.state import UsageMeter
+from tests.fake_llm import FakeLLM
+
+
+class CountingFakeLLM(FakeLLM):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def send_message(self, *args, **kwargs):
+        self.calls += 1
+        return super().send_message(*args, **kwargs)
+
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class TestInMemoryCache(unittest.TestCase):
+    def test_lru(self):
+        cache = InMemoryCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        cache = InMemoryCache(ttl=0.01)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_persistence(self):
+        value = {"role": "assistant", "content": "Hi"}
+        SQLiteCache(self.path, compress=True).set("a", value)
+        cache = SQLiteCache(self.path, compress=True)
+        self.assertEqual(cache.get("a"), value)
+        self.assertIsNone(cache.get("b"))
+
+    def test_size_eviction(self):
+        cache = SQLiteCache(self.path, max_size_bytes=25, touch_interval=0.0)
+        cache.set("a", "x" * 10)
+        time.sleep(0.01)
+        cache.set("b", "y" * 10)
+        time.sleep(0.01)
+        cache.get("a")
+        cache.set("c", "z" * 10)
+        self.assertEqual(cache.get("a"), "x" * 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_fresh_hits_do_not_write(self):
+        cache = SQLiteCache(self.path)
+        cache.set("a", 1)
+        conn = cache._connection()
+        changes = conn.total_changes
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(conn.total_changes, changes)
+        cache.touch_interval = 0.0
+        time.sleep(0.01)
+        cache.get("a")
+        self.assertEqual(conn.total_changes, changes + 1)
+
+    def test_ttl(self):
+        cache = SQLiteCache(self.path, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+
+    def test_concurrent_writers(self):
+        cache = SQLiteCache(self.path)
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(lambda i: cache.set(str(i), i), range(20)))
+        self.assertEqual(len(cache), 20)
+
+    def test_tiered_warm_start(self):
+        back = SQLiteCache(self.path)
+        back.set("a", 1)
+        back.set("b", 2)
+        front = InMemoryCache()
+        tiered = TieredCache(front, back, warm_start=10)
+        self.assertEqual(front.get("a"), 1)
+        tiered.set("c", 3)
+        self.assertEqual(back.get("c"), 3)
+        llm = CountingFakeLLM(temperature=0.0)
+        CachedLLM(llm, cache=TieredCache(InMemoryCache(), back)).send_message(MESSAGES)
+        CachedLLM(llm, cache=TieredCache(InMemoryCache(), back)).send_message(MESSAGES)
+        self.assertEqual(llm.calls, 1)
+
+
+class TestCachedLLM(unittest.TestCase):
+    def test_request_key(self):
+        self.assertEqual(
+            make_request_key(MESSAGES, None, "m", temperature=0.0),
+            make_request_key(list(MESSAGES), None, "m", temperature=0.0),
+        )
+        self.assertNotEqual(
+            make_request_key(MESSAGES, None, "m", temperature=0.0),
+            make_request_key(MESSAGES, [{"name": "f"}], "m", temperature=0.0),
+        )
+
+    def test_cache_hit(self):
+        llm = CountingFakeLLM(temperature=0.0)
+        cached = CachedLLM(llm)
+        meter = UsageMeter()
+        first = cached.send_message(MESSAGES, usage_meter=meter)
+        second = cached.send_message(MESSAGES, usage_meter=meter)
+        self.assertEqual(first, second)
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(meter.get_usage()["total_tokens"], 21)
+        self.assertEqual(cached.get_stats()["hits"], 1)
+        self.assertEqual(cached.get_stats()["misses"], 1)
+
+    def test_async_cache_hit(self):
+        llm = CountingFakeLLM(temperature=0.0)
+        cached = CachedLLM(llm)
+        cached.send_message(MESSAGES)
+        asyncio.run(cached.async_send_message(MESSAGES))
+        self.assertEqual(llm.calls, 1)
+
+    def test_nonzero_temperature(self):
+        llm = CountingFakeLLM(temperature=0.7)
+        cached = CachedLLM(llm)
+        cached.send_message(MESSAGES)
+        cached.send_message(MESSAGES)
+        self.assertEqual(llm.calls, 2)
+        cached = CachedLLM(llm, cache_nonzero_temperature=True)
+        cached.send_message(MESSAGES)
+        cached.send_message(MESSAGES)
+        self.assertEqual(llm.calls, 3)
+
+    def test_zero_temperature_falls_back_to_default(self):
+        llm = CountingFakeLLM(temperature=0.7)
+        cached = CachedLLM(llm)
+        # the backend sends its default temperature when 0 is passed
+        cached.send_message(MESSAGES, temperature=0)
+        cached.send_message(MESSAGES, temperature=0)
+        self.assertEqual(llm.calls, 2)
+
+    def test_router_routes(self):
+        small = CountingFakeLLM(model="small", temperature=0.0)
+        large = CountingFakeLLM(model="large", temperature=0.7)
+        router = RouterLLM(
+            {"small": small, "large": large},
+            lambda f: "small" if f.n_messages == 1 else "large",
+        )
+        cached = CachedLLM(router)
+        cached.send_message(MESSAGES)
+        cached.send_message(MESSAGES)
+        self.assertEqual(small.calls, 1)
+        # the selected route has a non-zero temperature
+        messages = MESSAGES * 2
+        cached.send_message(messages)
+        cached.send_message(messages)
+        self.assertEqual(large.calls, 2)
+        large.temperature = 0.0
+        cached.send_message(messages)
+        cached.send_message(messages)
+        self.assertEqual(large.calls, 3)
+        self.assertEqual(small.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from agent_dingo.llm.coalesce import CoalescingLLM
+from agent_dingo.core.state import UsageMeter
+from tests.fake_llm import FakeLLM
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class SlowFakeLLM(FakeLLM):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def send_message(self, *args, **kwargs):
+        self.calls += 1
+        time.sleep(0.05)
+        return super().send_message(*args, **kwargs)
+
+    async def async_send_message(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return FakeLLM.send_message(self, *args, **kwargs)
+
+
+class TestCoalescingLLM(unittest.TestCase):
+    def _run_sync(self, llm, meters):
+        with ThreadPoolExecutor(len(meters)) as pool:
+            return list(
+                pool.map(lambda m: llm.send_message(MESSAGES, usage_meter=m), meters)
+            )
+
+    def test_sync_coalescing(self):
+        llm = SlowFakeLLM()
+        coalescing = CoalescingLLM(llm)
+        meters = [UsageMeter() for _ in range(4)]
+        responses = self._run_sync(coalescing, meters)
+        self.assertEqual(llm.calls, 1)
+        self.assertTrue(all(r == responses[0] for r in responses))
+        self.assertEqual(sum(m.get_usage()["total_tokens"] for m in meters), 21)
+        self.assertEqual(coalescing.get_stats()["coalesced"], 3)
+
+    def test_async_coalescing(self):
+        llm = SlowFakeLLM()
+        coalescing = CoalescingLLM(llm, usage_policy="all")
+        meters = [UsageMeter() for _ in range(3)]
+
+        async def run():
+            return await asyncio.gather(
+                *[
+                    coalescing.async_send_message(MESSAGES, usage_meter=m)
+                    for m in meters
+                ]
+            )
+
+        asyncio.run(run())
+        self.assertEqual(llm.calls, 1)
+        self.assertTrue(all(m.get_usage()["total_tokens"] == 21 for m in meters))
+
+    def test_split_policy(self):
+        coalescing = CoalescingLLM(SlowFakeLLM(), usage_policy="split")
+        meters = [UsageMeter() for _ in range(2)]
+        self._run_sync(coalescing, meters)
+        self.assertEqual(
+            sorted(m.get_usage()["total_tokens"] for m in meters), [10, 11]
+        )
+
+    def test_cancelled_follower(self):
+        llm = SlowFakeLLM()
+        coalescing = CoalescingLLM(llm)
+
+        async def run():
+            tasks = [
+                asyncio.ensure_future(coalescing.async_send_message(MESSAGES))
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            tasks[1].cancel()
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+        leader, cancelled, follower = asyncio.run(run())
+        self.assertIsInstance(cancelled, asyncio.CancelledError)
+        self.assertEqual(leader, follower)
+        self.assertIsNot(leader, follower)
+        self.assertEqual(llm.calls, 1)
+
+    def test_cancelled_follower_is_not_charged(self):
+        for policy, expected in (("all", [21, 0, 21]), ("split", [11, 0, 10])):
+            coalescing = CoalescingLLM(SlowFakeLLM(), usage_policy=policy)
+            meters = [UsageMeter() for _ in range(3)]
+
+            async def run():
+                tasks = [
+                    asyncio.ensure_future(
+                        coalescing.async_send_message(MESSAGES, usage_meter=m)
+                    )
+                    for m in meters
+                ]
+                await asyncio.sleep(0.01)
+                tasks[1].cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+            asyncio.run(run())
+            self.assertEqual(
+                [m.get_usage()["total_tokens"] for m in meters], expected, policy
+            )
+
+    def test_different_requests_are_not_coalesced(self):
+        llm = SlowFakeLLM()
+        coalescing = CoalescingLLM(llm)
+
+        async def run():
+            await asyncio.gather(
+                coalescing.async_send_message(MESSAGES),
+                coalescing.async_send_message(MESSAGES, temperature=0.1),
+            )
+
+        asyncio.run(run())
+        self.assertEqual(llm.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import unittest
+import asyncio
+import time
+from agent_dingo.llm.fallback import (
+    CircuitBreaker,
+    FallbackLLM,
+    NoHealthyBackendError,
+)
+from agent_dingo.core.state import UsageMeter
+from agent_dingo.core.deadline import DeadlineExceededError
+from tests.fake_llm import FakeLLM
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class BadRequestError(Exception):
+    status_code = 400
+
+
+class Backend(FakeLLM):
+    def __init__(self, content, error=None, delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.content = content
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self.timeouts = []
+
+    def send_message(self, messages, functions=None, usage_meter=None, **kwargs):
+        self.calls += 1
+        self.timeouts.append(kwargs.get("timeout"))
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        FakeLLM.send_message(self, messages, functions, usage_meter, **kwargs)
+        return {"role": "assistant", "content": self.content}
+
+    async def async_send_message(self, *args, **kwargs):
+        return self.send_message(*args, **kwargs)
+
+    async def async_stream_message(self, messages, usage_meter=None, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        for word in self.content.split():
+            yield word
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_on_failure_rate(self):
+        breaker = CircuitBreaker(failure_rate_threshold=0.5, min_calls=4)
+        breaker.record_success()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow_request())
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker(min_calls=1, open_duration=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow_request())
+        # only one probe at a time
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(min_calls=1, open_duration=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertEqual(breaker.get_stats()["times_opened"], 2)
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker(slow_call_duration=1.0, min_calls=2)
+        breaker.record_success(latency=2.0)
+        breaker.record_success(latency=3.0)
+        self.assertEqual(breaker.state, "open")
+
+
+class TestFallbackLLM(unittest.TestCase):
+    def test_falls_back_to_next_backend(self):
+        primary = Backend("primary", error=ServerError())
+        secondary = Backend("secondary")
+        llm = FallbackLLM([primary, secondary])
+        meter = UsageMeter()
+        self.assertEqual(
+            llm.send_message(MESSAGES, usage_meter=meter)["content"], "secondary"
+        )
+        self.assertEqual(
+            asyncio.run(llm.async_send_message(MESSAGES))["content"], "secondary"
+        )
+        self.assertEqual(meter.get_usage()["total_tokens"], 21)
+        self.assertEqual(llm.get_stats()["failovers"], 2)
+
+    def test_open_breaker_skips_backend(self):
+        primary = Backend("primary", error=ServerError())
+        secondary = Backend("secondary")
+        llm = FallbackLLM(
+            [primary, secondary],
+            breakers=[CircuitBreaker(min_calls=2), CircuitBreaker()],
+        )
+        for _ in range(5):
+            llm.send_message(MESSAGES)
+        self.assertEqual(primary.calls, 2)
+        stats = llm.get_stats()
+        self.assertEqual(stats["backends"][0]["state"], "open")
+        self.assertEqual(stats["backends"][1]["served"], 5)
+
+    def test_client_errors_are_not_failed_over(self):
+        primary = Backend("primary", error=BadRequestError())
+        secondary = Backend("secondary")
+        llm = FallbackLLM([primary, secondary])
+        with self.assertRaises(BadRequestError):
+            llm.send_message(MESSAGES)
+        self.assertEqual(secondary.calls, 0)
+        self.assertEqual(llm.breakers[0].state, "closed")
+
+    def test_all_backends_unavailable(self):
+        llm = FallbackLLM(
+            [Backend("a", error=ServerError())], breakers=[CircuitBreaker(min_calls=1)]
+        )
+        with self.assertRaises(ServerError):
+            llm.send_message(MESSAGES)
+        with self.assertRaises(NoHealthyBackendError):
+            llm.send_message(MESSAGES)
+
+    def test_timeout_covers_all_attempts(self):
+        slow = Backend("a", error=ServerError(), delay=0.1)
+        llm = FallbackLLM(
+            [slow, Backend("b", error=ServerError(), delay=0.1), Backend("c")]
+        )
+        with self.assertRaises(DeadlineExceededError):
+            llm.send_message(MESSAGES, timeout=0.15)
+        self.assertAlmostEqual(slow.timeouts[0], 0.15, delta=0.01)
+        second = llm.llms[1].timeouts[0]
+        self.assertLess(second, 0.1)
+        self.assertEqual(llm.llms[2].calls, 0)
+
+    def test_interrupted_probe_is_released(self):
+        breaker = CircuitBreaker(min_calls=1, open_duration=0.0)
+        breaker.record_failure()
+        llm = FallbackLLM([Backend("a", error=KeyboardInterrupt())], breakers=[breaker])
+        with self.assertRaises(KeyboardInterrupt):
+            llm.send_message(MESSAGES)
+        self.assertTrue(breaker.allow_request())
+
+    def test_stream_falls_back_before_first_chunk(self):
+        llm = FallbackLLM([Backend("a", error=ServerError()), Backend("hello world")])
+
+        async def collect():
+            return [c async for c in llm.async_stream_message(MESSAGES)]
+
+        self.assertEqual(asyncio.run(collect()), ["hello", "world"])
+
+    def test_function_calls_support(self):
+        with_functions = FakeLLM()
+        without_functions = FakeLLM(base_url="http://localhost")
+        self.assertTrue(FallbackLLM([with_functions]).supports_function_calls)
+        self.assertFalse(
+            FallbackLLM([with_functions, without_functions]).supports_function_calls
+        )
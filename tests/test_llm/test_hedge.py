@@ -0,0 +1,120 @@
+import unittest
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from agent_dingo.llm.hedge import HedgedLLM
+from agent_dingo.core.state import UsageMeter
+from tests.fake_llm import FakeLLM
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class DelayedFakeLLM(FakeLLM):
+    def __init__(self, delays, content="Fake response", **kwargs):
+        super().__init__(**kwargs)
+        self.delays = list(delays)
+        self.content = content
+        self.calls = 0
+        self.cancelled = 0
+
+    def _next_delay(self):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        return delay
+
+    def send_message(self, messages, functions=None, usage_meter=None, **kwargs):
+        time.sleep(self._next_delay())
+        if usage_meter is not None:
+            usage_meter.increment(10, 5)
+        return {"role": "assistant", "content": self.content}
+
+    async def async_send_message(
+        self, messages, functions=None, usage_meter=None, **kwargs
+    ):
+        try:
+            await asyncio.sleep(self._next_delay())
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if usage_meter is not None:
+            usage_meter.increment(10, 5)
+        return {"role": "assistant", "content": self.content}
+
+
+class TestHedgedLLM(unittest.TestCase):
+    def test_async_hedge_wins_and_primary_is_cancelled(self):
+        primary = DelayedFakeLLM([1.0], content="primary")
+        secondary = DelayedFakeLLM([0.0], content="secondary")
+        llm = HedgedLLM(primary, secondary, delay=0.02, max_hedge_ratio=1.0)
+        meter = UsageMeter()
+        start = time.perf_counter()
+        response = asyncio.run(llm.async_send_message(MESSAGES, usage_meter=meter))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(response["content"], "secondary")
+        self.assertEqual(primary.cancelled, 1)
+        self.assertEqual(meter.get_usage()["total_tokens"], 15)
+        stats = llm.get_stats()
+        self.assertEqual(stats["hedged"], 1)
+        self.assertEqual(stats["hedge_wins"], 1)
+
+    def test_fast_primary_is_not_hedged(self):
+        primary = DelayedFakeLLM([0.0])
+        secondary = DelayedFakeLLM([0.0])
+        llm = HedgedLLM(primary, secondary, delay=0.5, max_hedge_ratio=1.0)
+        asyncio.run(llm.async_send_message(MESSAGES))
+        llm.send_message(MESSAGES)
+        self.assertEqual(secondary.calls, 0)
+        self.assertEqual(llm.get_stats()["hedged"], 0)
+
+    def test_sync_hedge_and_duplicate_usage(self):
+        primary = DelayedFakeLLM([0.2], content="primary")
+        secondary = DelayedFakeLLM([0.0], content="secondary")
+        llm = HedgedLLM(primary, secondary, delay=0.02, max_hedge_ratio=1.0)
+        meter = UsageMeter()
+        response = llm.send_message(MESSAGES, usage_meter=meter)
+        self.assertEqual(response["content"], "secondary")
+        self.assertEqual(meter.get_usage()["total_tokens"], 15)
+        # the primary request cannot be interrupted, its usage is recorded as duplicate
+        time.sleep(0.3)
+        self.assertEqual(llm.duplicate_usage.get_usage()["total_tokens"], 15)
+
+    def test_hedge_budget(self):
+        primary = DelayedFakeLLM([0.05])
+        secondary = DelayedFakeLLM([0.0])
+        llm = HedgedLLM(primary, secondary, delay=0.0, max_hedge_ratio=0.25)
+
+        async def run():
+            for _ in range(8):
+                await llm.async_send_message(MESSAGES)
+
+        asyncio.run(run())
+        self.assertEqual(llm.get_stats()["hedged"], 2)
+        self.assertEqual(secondary.calls, 2)
+
+    def test_sync_throughput_is_not_capped_by_the_pool(self):
+        primary = DelayedFakeLLM([0.1])
+        llm = HedgedLLM(primary, delay=1.0, max_hedge_ratio=1.0, max_workers=1)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda _: llm.send_message(MESSAGES), range(8)))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        # the recorded latencies do not include any queue wait
+        self.assertLess(max(llm._latencies), 0.3)
+
+    def test_delay_from_observed_latencies(self):
+        llm = HedgedLLM(DelayedFakeLLM([0.0]), percentile=0.5, min_samples=4, window=4)
+        self.assertIsNone(llm.get_hedge_delay())
+        for latency in [0.1, 0.2, 0.3, 0.4]:
+            llm._record_latency(latency)
+        self.assertEqual(llm.get_hedge_delay(), 0.2)
+
+    def test_failed_primary_falls_back_to_hedge(self):
+        class FailingLLM(DelayedFakeLLM):
+            async def async_send_message(self, *args, **kwargs):
+                await asyncio.sleep(0.05)
+                raise RuntimeError("boom")
+
+        secondary = DelayedFakeLLM([0.1], content="secondary")
+        llm = HedgedLLM(FailingLLM([0.0]), secondary, delay=0.0, max_hedge_ratio=1.0)
+        response = asyncio.run(llm.async_send_message(MESSAGES))
+        self.assertEqual(response["content"], "secondary")
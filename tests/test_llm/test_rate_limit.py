@@ -0,0 +1,101 @@
+import unittest
+import asyncio
+import time
+from agent_dingo.llm.rate_limit import (
+    RateLimiter,
+    RateLimitedLLM,
+    get_rate_limiter,
+    estimate_tokens,
+)
+from agent_dingo.core.state import UsageMeter
+from tests.fake_llm import FakeLLM
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_requests_within_limit_do_not_wait(self):
+        limiter = RateLimiter(rpm=60)
+        for _ in range(60):
+            self.assertEqual(limiter.reserve(), 0.0)
+        self.assertAlmostEqual(limiter.reserve(), 1.0, delta=0.05)
+        self.assertEqual(limiter.get_stats()["delayed"], 1)
+
+    def test_token_limit(self):
+        limiter = RateLimiter(tpm=600)
+        self.assertEqual(limiter.reserve(600), 0.0)
+        # 10 tokens per second are refilled
+        self.assertAlmostEqual(limiter.reserve(10), 1.0, delta=0.05)
+
+    def test_reconcile_refunds_overestimate(self):
+        limiter = RateLimiter(tpm=600)
+        limiter.reserve(600)
+        limiter.reconcile(600, 100)
+        self.assertEqual(limiter.reserve(400), 0.0)
+
+    def test_async_waiters_are_queued(self):
+        limiter = RateLimiter(rpm=600)
+        for _ in range(600):
+            limiter.reserve()
+
+        async def run():
+            return await asyncio.gather(*[limiter.async_acquire() for _ in range(3)])
+
+        start = time.perf_counter()
+        waits = asyncio.run(run())
+        self.assertGreaterEqual(time.perf_counter() - start, 0.25)
+        self.assertEqual(waits, sorted(waits))
+        self.assertEqual(limiter.get_stats()["waiting"], 0)
+
+    def test_cancelled_waiter_releases_reservation(self):
+        limiter = RateLimiter(rpm=60)
+        for _ in range(60):
+            limiter.reserve()
+
+        async def run():
+            task = asyncio.ensure_future(limiter.async_acquire())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.assertLess(limiter.reserve(), 1.1)
+
+    def test_shared_limiter(self):
+        a = get_rate_limiter("test-provider", "model-a", rpm=10)
+        b = get_rate_limiter("test-provider", "model-a")
+        c = get_rate_limiter("test-provider", "model-b", rpm=10)
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+
+    def test_setting_limits_keeps_the_used_quota(self):
+        limiter = RateLimiter(rpm=60)
+        for _ in range(60):
+            limiter.reserve()
+        limiter.set_limits(rpm=60)
+        self.assertGreater(limiter.reserve(), 0.5)
+        # a new limit scales the fill level instead of refilling the bucket
+        limiter.set_limits(rpm=120)
+        self.assertLess(limiter._requests.level, 0)
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens([{"role": "user", "content": "a" * 40}]), 14)
+
+
+class TestRateLimitedLLM(unittest.TestCase):
+    def test_usage_is_recorded_and_reconciled(self):
+        limiter = RateLimiter(tpm=10_000)
+        llm = RateLimitedLLM(FakeLLM(), limiter=limiter)
+        meter = UsageMeter()
+        llm.send_message(MESSAGES, usage_meter=meter)
+        asyncio.run(llm.async_send_message(MESSAGES, usage_meter=meter))
+        self.assertEqual(meter.get_usage()["total_tokens"], 42)
+        # the actual usage (21 tokens per call) replaces the estimates
+        self.assertAlmostEqual(limiter._tokens.level, 10_000 - 42, delta=1)
+
+    def test_instances_share_the_limiter(self):
+        a = RateLimitedLLM(FakeLLM(model="shared"), rpm=100)
+        b = RateLimitedLLM(FakeLLM(model="shared"))
+        self.assertIs(a.limiter, b.limiter)
+        self.assertEqual(b.limiter.rpm, 100)
@@ -0,0 +1,99 @@
+import unittest
+import asyncio
+from agent_dingo.llm.router import RouterLLM, threshold_rule, extract_features
+from agent_dingo.agent import Agent
+from agent_dingo.core.state import UsageMeter, ChatPrompt, Context, Store
+from agent_dingo.core.message import UserMessage
+from tests.fake_llm import FakeLLM
+
+SHORT = [{"role": "user", "content": "Hi"}]
+LONG = [{"role": "user", "content": "word " * 2000}]
+FUNCTIONS = [{"name": "f", "description": "f", "parameters": {}}]
+
+
+class NamedLLM(FakeLLM):
+    def __init__(self, name, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.calls = 0
+
+    def send_message(self, messages, functions=None, usage_meter=None, **kwargs):
+        self.calls += 1
+        FakeLLM.send_message(self, messages, functions, usage_meter, **kwargs)
+        return {"role": "assistant", "content": self.name}
+
+    async def async_send_message(self, *args, **kwargs):
+        return self.send_message(*args, **kwargs)
+
+
+class TestRouterLLM(unittest.TestCase):
+    def setUp(self):
+        self.small = NamedLLM("small")
+        self.large = NamedLLM("large")
+        self.router = RouterLLM(
+            {"small": self.small, "large": self.large},
+            threshold_rule("small", "large", max_prompt_tokens=100),
+        )
+
+    def test_routes_by_prompt_size(self):
+        self.assertEqual(self.router.send_message(SHORT)["content"], "small")
+        self.assertEqual(
+            asyncio.run(self.router.async_send_message(LONG))["content"], "large"
+        )
+
+    def test_routes_requests_with_tools(self):
+        self.assertEqual(
+            self.router.send_message(SHORT, functions=FUNCTIONS)["content"], "large"
+        )
+
+    def test_unsupported_function_calls_are_rerouted(self):
+        small = NamedLLM("small", base_url="http://localhost")
+        large = NamedLLM("large")
+        router = RouterLLM({"small": small, "large": large}, lambda f: "small")
+        self.assertEqual(router.send_message(SHORT)["content"], "small")
+        self.assertEqual(
+            router.send_message(SHORT, functions=FUNCTIONS)["content"], "large"
+        )
+
+    def test_no_route_supports_function_calls(self):
+        small = NamedLLM("small", base_url="http://localhost")
+        router = RouterLLM({"small": small}, lambda f: "small")
+        with self.assertRaises(ValueError):
+            router.send_message(SHORT, functions=FUNCTIONS)
+        with self.assertRaises(ValueError):
+            asyncio.run(router.async_send_message(SHORT, functions=FUNCTIONS))
+
+    def test_unknown_route_uses_default(self):
+        router = RouterLLM(
+            {"small": self.small, "large": self.large},
+            lambda f: "missing",
+            default="large",
+        )
+        self.assertEqual(router.send_message(SHORT)["content"], "large")
+
+    def test_stats(self):
+        meter = UsageMeter()
+        self.router.send_message(SHORT, usage_meter=meter)
+        self.router.send_message(SHORT, usage_meter=meter)
+        self.router.send_message(LONG, usage_meter=meter)
+        stats = self.router.get_stats()
+        self.assertEqual(stats["small"]["requests"], 2)
+        self.assertEqual(stats["large"]["requests"], 1)
+        self.assertEqual(stats["small"]["prompt_tokens"], 18)
+        self.assertGreater(stats["large"]["estimated_prompt_tokens"], 100)
+        self.assertEqual(meter.get_usage()["total_tokens"], 63)
+
+    def test_features(self):
+        features = extract_features(
+            SHORT + [{"role": "tool", "content": "42"}], FUNCTIONS
+        )
+        self.assertTrue(features.has_tools)
+        self.assertTrue(features.has_tool_results)
+        self.assertEqual(features.n_messages, 2)
+        self.assertEqual(features.last_message, "42")
+
+    def test_usable_with_agent(self):
+        agent = Agent(self.router, allow_codegen=False)
+        prompt = ChatPrompt([UserMessage("Hi")])
+        output = agent.forward(prompt, Context(), Store())
+        self.assertEqual(output["_out_0"], "small")
@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch
+from types import SimpleNamespace
+from agent_dingo.core.state import UsageMeter
+from agent_dingo.llm.openai import OpenAI
+import asyncio
+
+try:
+    import litellm
+except ImportError:
+    litellm = None
+
+
+def _chunk(content=None, usage=None):
+    choices = (
+        []
+        if content is None
+        else [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    )
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+async def _chunks():
+    yield _chunk("Fake")
+    yield _chunk(" response")
+    # with `include_usage`, the last chunk only carries the usage
+    yield _chunk(usage=SimpleNamespace(prompt_tokens=9, completion_tokens=12))
+
+
+async def _create(*args, **kwargs):
+    return _chunks()
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+class TestStreamingUsage(unittest.TestCase):
+    def test_openai(self):
+        llm = OpenAI("gpt-4o-mini")
+        meter = UsageMeter()
+        with patch.object(llm.async_client.chat.completions, "create", _create):
+            chunks = asyncio.run(
+                _collect(llm.async_stream_message([], usage_meter=meter))
+            )
+        self.assertEqual(chunks, ["Fake", " response"])
+        self.assertEqual(meter.get_usage()["total_tokens"], 21)
+
+    @unittest.skipIf(litellm is None, "litellm is not installed")
+    def test_litellm(self):
+        from agent_dingo.llm.litellm import LiteLLM
+
+        llm = LiteLLM("gpt-4o-mini")
+        meter = UsageMeter()
+        with patch("agent_dingo.llm.litellm.acompletion", _create):
+            chunks = asyncio.run(
+                _collect(llm.async_stream_message([], usage_meter=meter))
+            )
+        self.assertEqual(chunks, ["Fake", " response"])
+        self.assertEqual(meter.get_usage()["total_tokens"], 21)
+
+
+if __name__ == "__main__":
+    unittest.main()
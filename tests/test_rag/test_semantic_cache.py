@@ -0,0 +1,82 @@
+import unittest
+import asyncio
+from agent_dingo.rag.base import BaseEmbedder, Chunk, Document
+from agent_dingo.rag.semantic_cache import SemanticCache
+from agent_dingo.rag.vector_stores.in_memory import InMemoryVectorStore
+from agent_dingo.core.state import ChatPrompt, Context, Store
+from agent_dingo.core.message import SystemMessage, UserMessage
+from tests.fake_llm import FakeLLM
+
+_VECTORS = {
+    "What is the capital of France?": [1.0, 0.0, 0.0],
+    "Tell me the capital of France": [0.99, 0.05, 0.0],
+    "How tall is Everest?": [0.0, 1.0, 0.0],
+}
+
+
+class FakeEmbedder(BaseEmbedder):
+    def embed(self, texts):
+        if isinstance(texts, str):
+            texts = [texts]
+        return [_VECTORS[t] for t in texts]
+
+    async def async_embed(self, texts):
+        return self.embed(texts)
+
+
+def _prompt(query, system="You are helpful"):
+    return ChatPrompt([SystemMessage(system), UserMessage(query)])
+
+
+class TestInMemoryVectorStore(unittest.TestCase):
+    def test_retrieve(self):
+        store = InMemoryVectorStore(max_size=2)
+        for i, v in enumerate([[1, 0], [0, 1], [1, 1]]):
+            doc = Document(content=str(i), metadata={})
+            store.upsert_chunks([Chunk(content=str(i), parent=doc, embedding=v)])
+        self.assertEqual(len(store), 2)
+        top = store.retrieve(1, [0, 2])
+        self.assertEqual(top[0].content, "1")
+        self.assertAlmostEqual(top[0].score, 1.0)
+
+
+class TestSemanticCache(unittest.TestCase):
+    def test_hit_on_paraphrase(self):
+        cache = SemanticCache(FakeLLM(), FakeEmbedder(), threshold=0.95)
+        store = Store()
+        cache.forward(_prompt("What is the capital of France?"), Context(), store)
+        out = cache.forward(_prompt("Tell me the capital of France"), Context(), store)
+        self.assertEqual(out["_out_0"], "Fake response")
+        cache.forward(_prompt("How tall is Everest?"), Context(), store)
+        stats = cache.get_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(store.usage_meter.get_usage()["total_tokens"], 42)
+
+    def test_different_prefix_is_a_miss(self):
+        cache = SemanticCache(FakeLLM(), FakeEmbedder())
+        cache.forward(_prompt("What is the capital of France?"), Context(), Store())
+        cache.forward(
+            _prompt("What is the capital of France?", system="Be brief"),
+            Context(),
+            Store(),
+        )
+        self.assertEqual(cache.get_stats()["hits"], 0)
+
+    def test_async_forward(self):
+        cache = SemanticCache(FakeLLM(), FakeEmbedder())
+
+        async def run():
+            await cache.async_forward(
+                _prompt("What is the capital of France?"), Context(), Store()
+            )
+            return await cache.async_forward(
+                _prompt("What is the capital of France?"), Context(), Store()
+            )
+
+        self.assertEqual(asyncio.run(run())["_out_0"], "Fake response")
+        self.assertEqual(cache.get_stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from fastapi.testclient import TestClient
+from agent_dingo.core.blocks import Pipeline, PromptBuilder
+from agent_dingo.core.message import UserMessage
+from agent_dingo.serve import make_app
+from tests.fake_llm import FakeLLM
+import asyncio
+import json
+
+
+class StreamingFakeLLM(FakeLLM):
+    async def async_stream_message(self, messages, usage_meter=None, **kwargs):
+        for chunk in ["Fake", " response"]:
+            yield chunk
+        usage_meter.increment(9, 12)
+
+
+class StallingFakeLLM(FakeLLM):
+    async def async_stream_message(self, messages, usage_meter=None, **kwargs):
+        yield "Fake"
+        await asyncio.sleep(10)
+        yield " response"
+
+
+def _read_events(response):
+    events = [
+        line[len("data: ") :]
+        for line in response.text.split("\n\n")
+        if line.startswith("data: ")
+    ]
+    assert events[-1] == "[DONE]"
+    return [json.loads(e) for e in events[:-1]]
+
+
+class TestServe(unittest.TestCase):
+    def _make_client(self, llm, is_async, timeout=None):
+        pipeline = PromptBuilder([UserMessage("{query}")]) >> llm
+        return TestClient(make_app(pipeline, is_async=is_async, timeout=timeout))
+
+    def _request(self, client, stream):
+        return client.post(
+            "/chat/completions",
+            json={
+                "model": "dingo",
+                "messages": [{"role": "context_query", "content": "Hi"}],
+                "stream": stream,
+            },
+        )
+
+    def test_completion(self):
+        response = self._request(self._make_client(FakeLLM(), False), stream=False)
+        body = response.json()
+        self.assertEqual(body["choices"][0]["message"]["content"], "Fake response")
+        self.assertEqual(body["usage"]["total_tokens"], 21)
+
+    def test_stream(self):
+        for is_async in (True, False):
+            client = self._make_client(StreamingFakeLLM(), is_async)
+            response = self._request(client, stream=True)
+            self.assertTrue(
+                response.headers["content-type"].startswith("text/event-stream")
+            )
+            events = _read_events(response)
+            self.assertEqual(events[0]["choices"][0]["delta"]["role"], "assistant")
+            contents = [e["choices"][0]["delta"].get("content", "") for e in events]
+            self.assertEqual("".join(contents), "Fake response")
+            if is_async:
+                self.assertEqual(contents[1:3], ["Fake", " response"])
+            # only the final chunk carries the finish reason and the usage
+            self.assertEqual(events[-1]["choices"][0]["finish_reason"], "stop")
+            self.assertEqual(events[-1]["usage"]["total_tokens"], 21)
+            self.assertTrue(all("usage" not in e for e in events[:-1]))
+
+    def test_stream_timeout(self):
+        client = self._make_client(StallingFakeLLM(), True, timeout=0.2)
+        response = self._request(client, stream=True)
+        self.assertEqual(response.status_code, 200)
+        events = _read_events(response)
+        self.assertEqual(events[1]["choices"][0]["delta"]["content"], "Fake")
+        # the stream ends with an error chunk instead of a finish reason
+        self.assertEqual(events[-1]["error"]["type"], "timeout")
+        self.assertEqual(events[-1]["error"]["code"], 504)
+        self.assertTrue(all("error" not in e for e in events[:-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()